@@ -0,0 +1,135 @@
+import json
+import os
+
+from config import (
+    base_configs_folder,
+    data_root_folder,
+    input_root_folder,
+    io_decision_thresholds_path,
+    io_dense_retrieval_mode,
+    system_config,
+)
+from database.component_vector_index import ComponentVectorIndex
+from database.database import driver, get_all_components
+from database.lexical_index import ComponentLexicalIndex
+from graphs.io_decision import calibrate, get_decision_features, save_thresholds
+from graphs.io_processor import get_hybrid_candidates, get_io_text
+from inflow.base_config import get_server_circuits, load_base_configs
+from processors.io_mapping_processor import get_dense_results
+
+
+def get_excluded_components(ecu_system: str):
+    """
+    The components the inference masks for the ECU system, taken from the base
+    configurations of its latest inference version.
+    """
+    ecu_config = next(
+        (item for item in system_config if item.execution == ecu_system), None
+    )
+    ecu_folder = os.path.join(data_root_folder, ecu_system)
+    if ecu_config is None or not os.path.exists(ecu_folder):
+        return frozenset()
+
+    versions = [version for version in os.listdir(ecu_folder) if version.isdigit()]
+    if not versions:
+        return frozenset()
+
+    base_configs = load_base_configs(
+        os.path.join(
+            ecu_folder,
+            max(versions, key=int),
+            input_root_folder,
+            base_configs_folder,
+        ),
+        ecu_config.family,
+        ecu_system,
+    )
+    base_config_circuits, _, other_server_circuits = get_server_circuits(base_configs)
+    return base_config_circuits | other_server_circuits
+
+
+def load_samples(labelled_path: str):
+    """
+    Reads a JSON lines file with one labelled IO per line:
+    {"ecu_system": "APS2", "name": "...", "name_presentation": "...",
+     "description": "...", "component": "D60" or null}
+    and returns the decision features of each IO with its label.
+
+    The dense candidates are retrieved with the same io_dense_retrieval_mode
+    and excluded components as the IO mapping, so the thresholds fit the
+    scores seen in production.
+    """
+    labelled_ios = {}
+    with open(labelled_path, "r") as file:
+        for line in file:
+            if not line.strip():
+                continue
+            labelled_io = json.loads(line)
+            labelled_ios.setdefault(labelled_io["ecu_system"], []).append(labelled_io)
+
+    samples = []
+    for ecu_system, ecu_labelled_ios in labelled_ios.items():
+        with driver.session() as session:
+            components = session.execute_read(get_all_components, ecu_system)
+        lexical_index = ComponentLexicalIndex([dict(record) for record in components])
+        excluded_components = get_excluded_components(ecu_system)
+        vector_index = None
+        if io_dense_retrieval_mode == "matrix":
+            vector_index = ComponentVectorIndex(ecu_system, excluded_components)
+
+        io_items = [
+            {
+                "Name": labelled_io["name"],
+                "NamePresentation": {"#text": labelled_io.get("name_presentation") or ""},
+                "IOService": {"Description": {"#text": labelled_io.get("description") or ""}},
+            }
+            for labelled_io in ecu_labelled_ios
+        ]
+        dense_results = get_dense_results(vector_index, io_items)
+
+        for labelled_io, io_item, dense_candidates in zip(
+            ecu_labelled_ios, io_items, dense_results
+        ):
+            name, data, tokens = get_io_text(io_item)
+            if not tokens:
+                continue
+
+            candidates = get_hybrid_candidates(
+                {
+                    "io_item": io_item,
+                    "excluded_components": excluded_components,
+                    "ecu_system": ecu_system,
+                    "lexical_index": lexical_index,
+                    "dense_candidates": dense_candidates,
+                },
+                name + "\n" + data,
+                tokens,
+            )
+            if not candidates:
+                continue
+
+            samples.append(
+                (
+                    get_decision_features(candidates, tokens),
+                    candidates[0]["name"] == labelled_io["component"],
+                    labelled_io["component"] is not None,
+                )
+            )
+    return samples
+
+
+if __name__ == "__main__":
+    # take the labelled file and the optional output path from the command line
+    import sys
+
+    labelled_path = sys.argv[1]
+    output_path = sys.argv[2] if len(sys.argv) > 2 else io_decision_thresholds_path
+
+    samples = load_samples(labelled_path)
+    print(f"Loaded {len(samples)} labelled IOs")
+
+    thresholds, metrics = calibrate(samples)
+    save_thresholds(thresholds, metrics, output_path)
+    print(f"Thresholds: {thresholds}")
+    print(f"Metrics: {metrics}")
+    print(f"Saved the thresholds to {output_path}")
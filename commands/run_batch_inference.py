@@ -0,0 +1,306 @@
+import json
+import multiprocessing
+import os
+import queue
+import threading
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from config import (
+    batch_max_concurrent_ecus,
+    batch_reports_path,
+    base_configs_folder,
+    circuit_diagrams_folder,
+    data_root_folder,
+    diagnostic_files_folder,
+    dtc_specifications_folder,
+    input_root_folder,
+    io_lists_folder,
+    max_parallel_workers,
+    neo4j_max_pool_size,
+    system_config,
+    system_descriptions_folder,
+)
+from database.connection import pool_metrics
+from database.models import Inference
+from graphs.io_decision import io_decision_metrics
+from graphs.prompts import get_prompt_usage
+from inflow.blob_store import blob_store, save_input_manifest
+from processor import Processor
+from progress import ProgressRecorder
+
+# inputs outside these folders are function parameters, like an unpacked upload
+IO_INPUT_FOLDERS = {
+    system_descriptions_folder,
+    base_configs_folder,
+    dtc_specifications_folder,
+    circuit_diagrams_folder,
+    io_lists_folder,
+    diagnostic_files_folder,
+}
+
+
+def plan_batch(path: str):
+    """
+    Takes a folder with one input tree per ECU, laid out like the input folder
+    of an inference, and returns the ECUs to run with the size of their input.
+    The largest ECUs come first so they do not end up running alone at the end.
+    """
+    ecu_configs = {item.execution: item for item in system_config}
+    plan = []
+    skipped = []
+    for ecu in sorted(os.listdir(path)):
+        ecu_path = os.path.join(path, ecu)
+        if not os.path.isdir(ecu_path):
+            continue
+        if ecu not in ecu_configs:
+            skipped.append(ecu)
+            continue
+
+        files = []
+        input_bytes = 0
+        function_parameters = False
+        for root, _, filenames in os.walk(ecu_path):
+            for filename in filenames:
+                file_path = os.path.join(root, filename)
+                relative_path = os.path.relpath(file_path, ecu_path).replace(os.sep, "/")
+                files.append(relative_path)
+                input_bytes += os.path.getsize(file_path)
+                if relative_path.split("/")[0] not in IO_INPUT_FOLDERS:
+                    function_parameters = True
+
+        if not files:
+            skipped.append(ecu)
+            continue
+
+        plan.append(
+            {
+                "ecu": ecu,
+                "family": ecu_configs[ecu].family,
+                "server_can": ecu_configs[ecu].server_can,
+                "path": ecu_path,
+                "type": "FP" if function_parameters else "IO",
+                "files": files,
+                "input_bytes": input_bytes,
+            }
+        )
+
+    plan.sort(key=lambda item: item["input_bytes"], reverse=True)
+    return plan, skipped
+
+
+def create_batch_inference(item: dict):
+    """Creates the next inference version of the ECU and links its input files, like the upload endpoint."""
+    all_inferences = Inference.nodes.filter(ecu=item["ecu"])
+    version = 1
+    if all_inferences:
+        version = max([inference.version for inference in all_inferences]) + 1
+
+    inference = Inference(
+        ecu=item["ecu"],
+        version=version,
+        status="P",
+        type=item["type"],
+        # batch runs are not delivered to a webhook
+        webhook_url="",
+        messages=[],
+    ).save()
+
+    base_inference_folder = os.path.join(data_root_folder, item["ecu"], str(version))
+    data_folder = os.path.join(base_inference_folder, input_root_folder)
+    input_manifest = {}
+    for relative_path in item["files"]:
+        with open(os.path.join(item["path"], relative_path), "rb") as file:
+            entry = blob_store.put(file)
+        blob_store.link(entry["sha256"], os.path.join(data_folder, relative_path))
+        input_manifest[relative_path] = entry
+    save_input_manifest(base_inference_folder, input_manifest)
+
+    return inference
+
+
+def run_processor(processor: Processor, update_queue: queue.Queue):
+    try:
+        processor.inference.status = "R"
+        processor.inference.save()
+        processor.process()
+        processor.inference.status = "C"
+        processor.inference.save()
+    except Exception:
+        processor.inference.status = "F"
+        processor.inference.save()
+        update_queue.put("Error: There was an error processing the inference")
+        print(traceback.format_exc())
+    finally:
+        update_queue.put(None)
+
+
+def run_ecu(item: dict, queued_at: float):
+    """
+    Creates and runs the inference of one ECU in a worker process. The
+    inference is only created once a worker picks the ECU up, so an aborted
+    batch leaves no pending versions behind. The worker keeps its Neo4j pool,
+    llm and embedding clients and parsed base configurations between the ECUs it runs.
+    """
+    started_at = time.time()
+    decisions_before = io_decision_metrics.snapshot()
+    prompt_usage_before = get_prompt_usage()
+    inference = create_batch_inference(item)
+    update_queue = queue.Queue()
+
+    try:
+        processor = Processor(
+            ecu_system_execution=item["ecu"],
+            ecu_system_family=item["family"],
+            server_can=item["server_can"],
+            update_queue=update_queue,
+            inference=inference,
+        )
+    except Exception:
+        print(traceback.format_exc())
+        inference.status = "F"
+        inference.save()
+    else:
+        producer_thread = threading.Thread(
+            target=run_processor, args=(processor, update_queue)
+        )
+        producer_thread.start()
+        ProgressRecorder(inference).consume(update_queue)
+        producer_thread.join()
+
+    finished_at = time.time()
+    decisions = io_decision_metrics.snapshot()
+    return {
+        "ecu": item["ecu"],
+        "version": inference.version,
+        "type": item["type"],
+        "status": inference.STATUSES[str(inference.status)],
+        "files": len(item["files"]),
+        "input_bytes": item["input_bytes"],
+        "wait_seconds": started_at - queued_at,
+        "run_seconds": finished_at - started_at,
+        "worker": os.getpid(),
+        "io_decisions": {
+            decision: decisions[decision] - decisions_before[decision]
+            for decision in decisions
+        },
+        "prompt_usage": get_prompt_usage(since=prompt_usage_before),
+        # cumulative for the worker process
+        "worker_pool": pool_metrics.snapshot(),
+    }
+
+
+def run_batch(path: str, concurrent_ecus: int = batch_max_concurrent_ecus):
+    """
+    Runs every ECU found in the path, at most concurrent_ecus at the same time,
+    and returns the report of the batch.
+
+    Every ECU runs in a worker process because the loggers of an inference are
+    process wide. The worker threads and Neo4j connections of this process are
+    the global budget, they are split between the workers. Like the API, the
+    batch does not start while another inference is running, and the API
+    refuses to start one while an inference of the batch is running.
+    """
+    running_inferences = Inference.nodes.filter(status="R")
+    if running_inferences:
+        raise RuntimeError(
+            "Another inference is already running: "
+            + ", ".join(
+                f"{inference.ecu} version {inference.version}"
+                for inference in running_inferences
+            )
+        )
+
+    plan, skipped = plan_batch(path)
+    concurrent_ecus = max(1, min(concurrent_ecus, len(plan) or 1))
+    print(f"Planned {len(plan)} ECUs, {concurrent_ecus} at a time, skipped {skipped}")
+
+    # the spawned workers read the split budget from the environment
+    os.environ["MAX_PARALLEL_WORKERS"] = str(max(1, max_parallel_workers // concurrent_ecus))
+    os.environ["NEO4J_MAX_POOL_SIZE"] = str(max(1, neo4j_max_pool_size // concurrent_ecus))
+
+    results = []
+    started_at = time.time()
+    with ProcessPoolExecutor(
+        max_workers=concurrent_ecus,
+        mp_context=multiprocessing.get_context("spawn"),
+    ) as executor:
+        futures = {
+            executor.submit(run_ecu, item, time.time()): item for item in plan
+        }
+
+        for future in as_completed(futures):
+            item = futures[future]
+            try:
+                result = future.result()
+            except Exception:
+                # the worker died before it could report the inference
+                print(traceback.format_exc())
+                result = {
+                    "ecu": item["ecu"],
+                    "version": None,
+                    "type": item["type"],
+                    "status": Inference.STATUSES["F"],
+                    "files": len(item["files"]),
+                    "input_bytes": item["input_bytes"],
+                }
+            results.append(result)
+            print(
+                f"{result['ecu']} version {result['version']}: {result['status']}"
+                f" in {result.get('run_seconds', 0):.0f}s"
+            )
+    wall_seconds = time.time() - started_at
+
+    workers = {}
+    for result in results:
+        if "worker" in result:
+            workers[result["worker"]] = {"pool": result.pop("worker_pool")}
+
+    run_seconds = sum(result.get("run_seconds", 0) for result in results)
+    input_bytes = sum(result["input_bytes"] for result in results)
+    completed = [result for result in results if result["status"] == Inference.STATUSES["C"]]
+    return {
+        "path": os.path.abspath(path),
+        "started_at": started_at,
+        "wall_seconds": wall_seconds,
+        "concurrent_ecus": concurrent_ecus,
+        "budget": {
+            "max_parallel_workers": max_parallel_workers,
+            "neo4j_max_pool_size": neo4j_max_pool_size,
+        },
+        "ecus": len(results),
+        "completed": len(completed),
+        "failed": len(results) - len(completed),
+        "skipped": skipped,
+        "ecu_seconds": run_seconds,
+        # how much of the concurrent capacity was used, 1.0 means no idle worker
+        "utilization": run_seconds / max(wall_seconds * concurrent_ecus, 1e-9),
+        "ecus_per_hour": len(results) / max(wall_seconds, 1e-9) * 3600,
+        "input_megabytes_per_minute": input_bytes / 1024 / 1024 / max(wall_seconds, 1e-9) * 60,
+        "results": sorted(results, key=lambda result: result["ecu"]),
+        "workers": workers,
+    }
+
+
+if __name__ == "__main__":
+    # take the input folder, the optional number of concurrent ECUs and the report path
+    import sys
+
+    path = sys.argv[1]
+    concurrent_ecus = int(sys.argv[2]) if len(sys.argv) > 2 else batch_max_concurrent_ecus
+    report_path = (
+        sys.argv[3]
+        if len(sys.argv) > 3
+        else os.path.join(batch_reports_path, f"batch-{int(time.time())}.json")
+    )
+
+    report = run_batch(path, concurrent_ecus)
+
+    os.makedirs(os.path.dirname(report_path) or ".", exist_ok=True)
+    with open(report_path, "w") as file:
+        json.dump(report, file, indent=2)
+    print(
+        f"{report['completed']} of {report['ecus']} ECUs completed in {report['wall_seconds']:.0f}s, "
+        f"report saved to {report_path}"
+    )
@@ -12,9 +12,24 @@ qdrant_port = os.environ.get("QDRANT_PORT", "6333")
 neo4j_connection = os.environ.get("NEO4J_CONNECTION", "bolt://localhost:7687")
 neo4j_user = os.environ.get("NEO4J_USER", "neo4j")
 neo4j_password = os.environ.get("NEO4J_PASSWORD", "password")
+neo4j_max_pool_size = int(os.environ.get("NEO4J_MAX_POOL_SIZE", 50))
+neo4j_acquisition_timeout = float(os.environ.get("NEO4J_ACQUISITION_TIMEOUT", 60))
+neo4j_max_connection_lifetime = float(
+    os.environ.get("NEO4J_MAX_CONNECTION_LIFETIME", 3600)
+)
 webhook_secret = os.environ.get("WEBHOOK_SECRET", "secret")
 
 data_root_folder = os.environ.get("DATA_ROOT_FOLDER", "\\var\\tmp\\vme")
+
+# webhook delivery specific environment variables
+webhook_outbox_path = os.path.join(
+    data_root_folder, os.environ.get("WEBHOOK_OUTBOX_FOLDER", "outbox")
+)
+webhook_max_attempts = int(os.environ.get("WEBHOOK_MAX_ATTEMPTS", 8))
+webhook_backoff_base = float(os.environ.get("WEBHOOK_BACKOFF_BASE", 5))
+webhook_backoff_max = float(os.environ.get("WEBHOOK_BACKOFF_MAX", 600))
+webhook_connect_timeout = float(os.environ.get("WEBHOOK_CONNECT_TIMEOUT", 10))
+webhook_read_timeout = float(os.environ.get("WEBHOOK_READ_TIMEOUT", 300))
 # new environment variables
 input_root_folder = os.environ.get("INPUT_ROOT_FOLDER", "input")
 circuit_diagrams_folder = os.environ.get("CIRCUIT_DIAGRAMS_FOLDER", "circuit_diagrams")
@@ -51,10 +66,26 @@ diagnostics_output_folder = os.environ.get(
     "PROCESSED_IO_OUTPUT_FOLDER", "processed_ios"
 )
 logs_output_folder = os.environ.get("LOGS_OUTPUT_FOLDER", "logs")
+audit_log_max_bytes = int(os.environ.get("AUDIT_LOG_MAX_BYTES", 50 * 1024 * 1024))
+audit_log_backup_count = int(os.environ.get("AUDIT_LOG_BACKUP_COUNT", 20))
+
+# inference progress specific environment variables
+progress_flush_interval = float(os.environ.get("PROGRESS_FLUSH_INTERVAL", 2))
+progress_batch_size = int(os.environ.get("PROGRESS_BATCH_SIZE", 200))
+progress_max_messages = int(os.environ.get("PROGRESS_MAX_MESSAGES", 10000))
+progress_page_size = int(os.environ.get("PROGRESS_PAGE_SIZE", 100))
+progress_event_buffer_size = int(os.environ.get("PROGRESS_EVENT_BUFFER_SIZE", 1000))
+progress_keepalive_interval = float(os.environ.get("PROGRESS_KEEPALIVE_INTERVAL", 15))
 
 root_archive_folder = os.environ.get("ROOT_ARCHIVE_FOLDER", "archive")
 output_archive_name = os.environ.get("OUTPUT_ARCHIVE_NAME", "output")
 input_archive_name = os.environ.get("INPUT_ARCHIVE_NAME", "input")
+archive_manifests_folder = os.environ.get("ARCHIVE_MANIFESTS_FOLDER", "manifests")
+input_manifest_name = os.environ.get("INPUT_MANIFEST_NAME", "input_files.json")
+change_manifest_name = os.environ.get("CHANGE_MANIFEST_NAME", "changes.json")
+blob_store_path = os.path.join(
+    data_root_folder, os.environ.get("BLOB_STORE_FOLDER", "blob_store")
+)
 
 # llm specific environment variables
 openai_api_key = os.environ.get("OPENAI_API_KEY", "EMPTY")
@@ -62,6 +93,51 @@ openai_api_base = os.environ.get("OPENAI_API_BASE", "http://localhost:9000/v1")
 print(f"openai_api_key: {openai_api_key}")
 print(f"openai_api_base: {openai_api_base}")
 max_parallel_workers = int(os.environ.get("MAX_PARALLEL_WORKERS", 8))
+io_item_max_attempts = int(os.environ.get("IO_ITEM_MAX_ATTEMPTS", 3))
+io_item_retry_backoff = float(os.environ.get("IO_ITEM_RETRY_BACKOFF", 2))
+
+# batch inference specific environment variables, the worker and connection
+# budgets above are shared by all the ECUs running at the same time
+batch_max_concurrent_ecus = int(os.environ.get("BATCH_MAX_CONCURRENT_ECUS", 2))
+batch_reports_path = os.path.join(
+    data_root_folder, os.environ.get("BATCH_REPORTS_FOLDER", "batch_reports")
+)
+
+# io to component matching specific environment variables
+io_dense_score_threshold = float(os.environ.get("IO_DENSE_SCORE_THRESHOLD", 0.55))
+io_dense_weight = float(os.environ.get("IO_DENSE_WEIGHT", 0.6))
+io_sparse_weight = float(os.environ.get("IO_SPARSE_WEIGHT", 0.4))
+io_exact_match_bonus = float(os.environ.get("IO_EXACT_MATCH_BONUS", 0.3))
+io_auto_accept_score = float(os.environ.get("IO_AUTO_ACCEPT_SCORE", 0.6))
+# the llm only verifies IOs which are neither accepted nor rejected by these thresholds,
+# until commands.calibrate_io_decisions has set a margin only exact designators are accepted
+io_accept_margin = float(os.environ.get("IO_ACCEPT_MARGIN", "inf"))
+io_accept_lexical_overlap = float(os.environ.get("IO_ACCEPT_LEXICAL_OVERLAP", 0.3))
+# the fused score of a dense only hit is below any useful reject score, so
+# nothing is rejected until commands.calibrate_io_decisions has set one
+io_reject_score = float(os.environ.get("IO_REJECT_SCORE", 0.0))
+io_decision_thresholds_path = os.path.join(
+    data_root_folder,
+    os.environ.get("IO_DECISION_THRESHOLDS_FILE", "io_decision_thresholds.json"),
+)
+# matrix: score all IOs against the component vectors in process, qdrant: one query per IO
+io_dense_retrieval_mode = os.environ.get("IO_DENSE_RETRIEVAL_MODE", "matrix")
+io_embedding_batch_size = int(os.environ.get("IO_EMBEDDING_BATCH_SIZE", 64))
+io_dense_candidate_limit = int(os.environ.get("IO_DENSE_CANDIDATE_LIMIT", 10))
+
+# circuit diagram legends are split into token windows for the component extraction
+circuit_chunk_encoding = os.environ.get("CIRCUIT_CHUNK_ENCODING", "cl100k_base")
+circuit_chunk_max_tokens = int(os.environ.get("CIRCUIT_CHUNK_MAX_TOKENS", 3000))
+circuit_chunk_overlap_tokens = int(os.environ.get("CIRCUIT_CHUNK_OVERLAP_TOKENS", 200))
+# pages whose parsed legend has fewer valid rows than this share go to the llm
+circuit_legend_min_valid_ratio = float(
+    os.environ.get("CIRCUIT_LEGEND_MIN_VALID_RATIO", 0.9)
+)
+
+# page: all components of a page in one call, component: one call per component
+system_information_extraction_mode = os.environ.get(
+    "SYSTEM_INFORMATION_EXTRACTION_MODE", "page"
+)
 
 # print all the environment variables in the config file for reference
 print(f"export_template_path: {export_template_path}")
@@ -1,16 +1,82 @@
+from threading import Lock
+
+FILE_KINDS = (
+    "circuit_diagrams",
+    "system_descriptions",
+    "dtc_specifications",
+    "io_list_files",
+)
+
+
 class AppState:
     def __init__(self, circuit_diagrams=None, system_descriptions=None, dtc_specifications=None, io_list_files=None):
         """
-        Each field contains a list of dictionaries:
-        - { "hash": "computed_hash", "file_name": "original_file_name" }
+        Each field is given as a list of dictionaries:
+        - { "hash": "computed_hash", "file_name": "original_file_name", "ecu_system": "ecu_system" }
+
+        The entries are kept in dictionaries keyed by (hash, ecu_system) so the
+        processed checks are O(1), and the entries added since the last write
+        are tracked so only those have to be saved.
         """
-        self.circuit_diagrams = circuit_diagrams or []
-        self.system_descriptions = system_descriptions or []
-        self.dtc_specifications = dtc_specifications or []
-        self.io_list_files = io_list_files or []
+        self.lock = Lock()
+        self.files = {kind: {} for kind in FILE_KINDS}
+        self.pending = {kind: {} for kind in FILE_KINDS}
+
+        initial_files = {
+            "circuit_diagrams": circuit_diagrams,
+            "system_descriptions": system_descriptions,
+            "dtc_specifications": dtc_specifications,
+            "io_list_files": io_list_files,
+        }
+        for kind, entries in initial_files.items():
+            for entry in entries or []:
+                self.files[kind][(entry["hash"], entry.get("ecu_system"))] = dict(entry)
+
+    def has_file(self, kind, file_hash, ecu_system):
+        """Whether the file with the given hash was processed for the ECU system."""
+        return (file_hash, ecu_system) in self.files[kind]
+
+    def add_file(self, kind, file_hash, file_name, ecu_system):
+        entry = {"hash": file_hash, "file_name": file_name, "ecu_system": ecu_system}
+        with self.lock:
+            self.files[kind][(file_hash, ecu_system)] = entry
+            self.pending[kind][(file_hash, ecu_system)] = entry
+
+    def clear_files(self, kind):
+        """Forgets the processed files of a kind for this run, nothing is deleted in the database."""
+        with self.lock:
+            self.files[kind] = {}
+            self.pending[kind] = {}
+
+    def get_pending(self):
+        """Returns the entries added since the last write, per file kind."""
+        with self.lock:
+            return {kind: list(entries.values()) for kind, entries in self.pending.items()}
+
+    def mark_saved(self, saved):
+        with self.lock:
+            for kind, entries in saved.items():
+                for entry in entries:
+                    self.pending[kind].pop((entry["hash"], entry["ecu_system"]), None)
+
+    @property
+    def circuit_diagrams(self):
+        return list(self.files["circuit_diagrams"].values())
+
+    @property
+    def system_descriptions(self):
+        return list(self.files["system_descriptions"].values())
+
+    @property
+    def dtc_specifications(self):
+        return list(self.files["dtc_specifications"].values())
+
+    @property
+    def io_list_files(self):
+        return list(self.files["io_list_files"].values())
 
     def __repr__(self):
         return (f"AppState(circuit_diagrams={self.circuit_diagrams}, "
                 f"system_descriptions={self.system_descriptions}, "
                 f"dtc_specifications={self.dtc_specifications}, "
-                f"io_list_files={self.io_list_files})")
\ No newline at end of file
+                f"io_list_files={self.io_list_files})")
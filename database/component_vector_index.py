@@ -0,0 +1,102 @@
+import numpy as np
+from qdrant_client import models
+
+from database.database import oclient, qclient, COLLECTION_NAME
+
+EMBEDDING_MODEL = "nomic-embed-text"
+
+
+def normalize_rows(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def embed_texts(texts: list[str], batch_size: int):
+    """Embeds the texts with one ollama request per batch, returns normalized rows."""
+    embeddings = []
+    for start in range(0, len(texts), batch_size):
+        response = oclient.embed(
+            model=EMBEDDING_MODEL, input=texts[start : start + batch_size]
+        )
+        embeddings.extend(response["embeddings"])
+    return normalize_rows(np.asarray(embeddings, dtype=np.float32))
+
+
+class ComponentVectorIndex:
+    """
+    In-process copy of the component vectors of one ECU system.
+
+    An ECU system only has a few hundred components, so scoring a whole IO
+    list against them is a single matrix product. The excluded components are
+    masked once instead of being sent to Qdrant with every query.
+    """
+
+    def __init__(self, ecu_system: str, excluded_components):
+        excluded_components = frozenset(excluded_components)
+        self.names = []
+        self.descriptions = {}
+        vectors = []
+
+        offset = None
+        while True:
+            points, offset = qclient.scroll(
+                collection_name=COLLECTION_NAME,
+                scroll_filter=models.Filter(
+                    must=[
+                        models.FieldCondition(
+                            key="ecu_system",
+                            match=models.MatchValue(value=ecu_system),
+                        )
+                    ]
+                ),
+                limit=256,
+                offset=offset,
+                with_vectors=True,
+            )
+            for point in points:
+                name = point.payload["name"]
+                if name in excluded_components or name in self.descriptions:
+                    continue
+                self.names.append(name)
+                self.descriptions[name] = point.payload["description"]
+                vectors.append(point.vector)
+            if not offset:
+                break
+
+        self.matrix = (
+            normalize_rows(np.asarray(vectors, dtype=np.float32))
+            if vectors
+            else np.zeros((0, 0), dtype=np.float32)
+        )
+
+    def __len__(self):
+        return len(self.names)
+
+    def search(self, query_vectors, score_threshold: float, limit: int = 10):
+        """
+        Returns the dense candidates for every query row, a list of
+        {name, description, score} dictionaries sorted by cosine similarity.
+        """
+        if len(self.names) == 0:
+            return [[] for _ in range(len(query_vectors))]
+
+        scores = query_vectors @ self.matrix.T
+        limit = min(limit, len(self.names))
+        top = np.argpartition(-scores, limit - 1, axis=1)[:, :limit]
+
+        results = []
+        for row, indices in enumerate(top):
+            indices = indices[np.argsort(-scores[row, indices])]
+            results.append(
+                [
+                    {
+                        "name": self.names[index],
+                        "description": self.descriptions[self.names[index]],
+                        "score": float(scores[row, index]),
+                    }
+                    for index in indices
+                    if scores[row, index] >= score_threshold
+                ]
+            )
+        return results
@@ -0,0 +1,125 @@
+import time
+from contextlib import contextmanager
+from threading import Lock
+
+from neo4j import AsyncGraphDatabase, GraphDatabase
+from neomodel import db
+
+from config import (
+    neo4j_connection,
+    neo4j_user,
+    neo4j_password,
+    neo4j_max_pool_size,
+    neo4j_acquisition_timeout,
+    neo4j_max_connection_lifetime,
+)
+from logger import system_logger
+
+DRIVER_OPTIONS = {
+    "auth": (neo4j_user, neo4j_password),
+    "encrypted": False,
+    "max_connection_pool_size": neo4j_max_pool_size,
+    "connection_acquisition_timeout": neo4j_acquisition_timeout,
+    "max_connection_lifetime": neo4j_max_connection_lifetime,
+}
+
+
+class PoolMetrics:
+    """Open sessions of the shared driver, the peak shows how much of the pool is used."""
+
+    def __init__(self, pool_size: int):
+        self.lock = Lock()
+        self.pool_size = pool_size
+        self.open_sessions = 0
+        self.peak_sessions = 0
+        self.sessions = 0
+        self.session_seconds = 0.0
+
+    def session_opened(self):
+        with self.lock:
+            self.open_sessions += 1
+            self.sessions += 1
+            self.peak_sessions = max(self.peak_sessions, self.open_sessions)
+
+    def session_closed(self, seconds: float):
+        with self.lock:
+            self.open_sessions -= 1
+            self.session_seconds += seconds
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "pool_size": self.pool_size,
+                "open_sessions": self.open_sessions,
+                "peak_sessions": self.peak_sessions,
+                "peak_utilization": self.peak_sessions / self.pool_size,
+                "sessions": self.sessions,
+                "average_session_seconds": self.session_seconds / max(self.sessions, 1),
+            }
+
+    def log(self):
+        metrics = self.snapshot()
+        system_logger.info(
+            f"Neo4j pool: {metrics['sessions']} sessions, peak {metrics['peak_sessions']} of "
+            f"{metrics['pool_size']} connections ({metrics['peak_utilization']:.0%}), "
+            f"{metrics['average_session_seconds'] * 1000:.1f}ms per session"
+        )
+
+
+class PooledDriver:
+    """
+    The process-wide Neo4j driver. Sessions are counted for the pool metrics,
+    everything else is passed through to the neo4j driver.
+    """
+
+    def __init__(self, driver, metrics: PoolMetrics):
+        self.driver = driver
+        self.metrics = metrics
+
+    @contextmanager
+    def session(self, **kwargs):
+        started_at = time.perf_counter()
+        self.metrics.session_opened()
+        try:
+            with self.driver.session(**kwargs) as session:
+                yield session
+        finally:
+            self.metrics.session_closed(time.perf_counter() - started_at)
+
+    def __getattr__(self, name):
+        return getattr(self.driver, name)
+
+
+pool_metrics = PoolMetrics(neo4j_max_pool_size)
+driver = PooledDriver(
+    GraphDatabase.driver(neo4j_connection, **DRIVER_OPTIONS), pool_metrics
+)
+
+# neomodel uses the same driver and pool instead of its own connection
+db.set_connection(driver=driver.driver)
+
+async_driver = None
+
+
+def get_async_driver():
+    """
+    The async driver of the /health endpoint, created on first use so it is
+    bound to the running event loop. The pipeline stages use the sync driver.
+    """
+    global async_driver
+    if async_driver is None:
+        async_driver = AsyncGraphDatabase.driver(neo4j_connection, **DRIVER_OPTIONS)
+    return async_driver
+
+
+def unit_of_work(*operations):
+    """
+    Runs several transaction functions in one write transaction, every
+    operation is a (function, *args) tuple. A retried transaction runs them all again.
+    """
+
+    def work(tx):
+        return [operation(tx, *args) for operation, *args in operations]
+
+    with driver.session() as session:
+        return session.execute_write(work)
@@ -1,14 +1,12 @@
+import json
 from typing import List
-from neo4j import GraphDatabase
 import uuid
 from qdrant_client import QdrantClient, models
 import ollama
 
 from database.app_state import AppState
+from database.connection import driver as shared_driver
 from config import (
-    neo4j_connection,
-    neo4j_user,
-    neo4j_password,
     qdrant_host,
     qdrant_port,
 )
@@ -87,6 +85,29 @@ def get_matching_components(name, ecu_system, data):
     return response.points
 
 
+def get_component_filter(ecu_system, excluded_components):
+    """
+    The Qdrant filter for the components of the ECU system which are not
+    excluded, built once per inference and reused for every query.
+    """
+    return models.Filter(
+        must=[
+            models.FieldCondition(
+                key="ecu_system",
+                match=models.MatchValue(
+                    value=ecu_system,
+                ),
+            ),
+            models.FieldCondition(
+                key="name",
+                match=models.MatchExcept(
+                    **{"except": sorted(excluded_components)},
+                ),
+            ),
+        ],
+    )
+
+
 def delete_component_vector(name, ecu_system):
     points, _ = qclient.scroll(
         collection_name=COLLECTION_NAME,
@@ -138,9 +159,8 @@ def create_component_vector(name, description, ecu_system):
     )
 
 
-driver = GraphDatabase.driver(
-    neo4j_connection, auth=(neo4j_user, neo4j_password), encrypted=False
-)
+# the shared driver, all the helpers and neomodel use its connection pool
+driver = shared_driver
 
 with driver.session() as session:
     result = session.run("RETURN 'Neo4j Connection Successful' AS message")
@@ -242,6 +262,31 @@ def get_component_meta(tx, name, ecu_system):
     return [record for record in result]
 
 
+def get_component_metas(tx, names, ecu_system):
+    """
+    Fetches the meta descriptions of all the given components in one query.
+    """
+    query = """
+    UNWIND $names AS name
+    MATCH (c:Component {name: name, ecu_system: $ecu_system})-[:HAS_META]->(cm:ComponentMeta)
+    RETURN c.name AS name, collect(cm.meta_description) AS meta_description
+    """
+    return [record for record in tx.run(query, names=names, ecu_system=ecu_system)]
+
+
+def add_components_fields(tx, rows, ecu_system):
+    """
+    Bulk version of add_component_fields, rows contain name, more_description
+    and purpose.
+    """
+    query = """
+    UNWIND $rows AS row
+    MERGE (c:Component {name: row.name, ecu_system: $ecu_system})
+    SET c.purpose = row.purpose, c.more_description = row.more_description, c.exported = false
+    """
+    tx.run(query, rows=rows, ecu_system=ecu_system)
+
+
 def get_dtc_with_components(tx, ecu_system, excluded_components):
     query = """
     MATCH (d:DTC {ecu_system: $ecu_system})-[:AFFECTS]->(c:Component {ecu_system: $ecu_system})
@@ -311,64 +356,147 @@ def create_relationship_if_component_exists(
     )
 
 
-def save_app_state(tx, app_state: AppState):
+def create_dtcs(tx, rows, ecu_system):
+    """
+    Bulk version of create_dtc and create_relationship_if_component_exists,
+    every row holds the DTC fields and the stripped component_names it affects.
+    """
+    query = """
+    UNWIND $rows AS row
+    MERGE (d:DTC {dtc_code: row.error_code, heading: row.heading, components: row.components, detection: row.detection, cause: row.cause, system_reaction: row.system_reaction, symptom: row.symptom, ecu_system: $ecu_system})
+    WITH d, row
+    UNWIND row.component_names AS component_name
+    MATCH (c:Component {name: component_name, ecu_system: $ecu_system})
+    MERGE (d)-[:AFFECTS]->(c)
+    """
+    tx.run(query, rows=rows, ecu_system=ecu_system)
+
+
+def get_existing_dtc_codes(tx, dtc_codes, ecu_system):
+    query = """
+    MATCH (d:DTC {ecu_system: $ecu_system})
+    WHERE d.dtc_code IN $dtc_codes
+    RETURN DISTINCT d.dtc_code AS dtc_code
+    """
+    return {
+        record["dtc_code"]
+        for record in tx.run(query, dtc_codes=dtc_codes, ecu_system=ecu_system)
+    }
+
+
+def get_dtc_page_extractions(tx, page_hashes):
+    """
+    Returns the ledger entries of the given DTC page hashes, keyed by hash.
+    The specification is stored as a JSON string, it is null for pages
+    without a DTC.
     """
-    Saves an AppState instance to Neo4j:
+    query = """
+    UNWIND $page_hashes AS page_hash
+    MATCH (p:DTCPageExtraction {hash: page_hash})
+    RETURN p.hash AS hash, p.has_dtc AS has_dtc, p.specification AS specification
+    """
+    return {
+        record["hash"]: {
+            "has_dtc": record["has_dtc"],
+            "specification": (
+                json.loads(record["specification"])
+                if record["specification"]
+                else None
+            ),
+        }
+        for record in tx.run(query, page_hashes=page_hashes)
+    }
+
+
+def save_dtc_page_extraction(tx, page_hash, specification):
+    query = """
+    MERGE (p:DTCPageExtraction {hash: $page_hash})
+    SET p.has_dtc = $has_dtc, p.specification = $specification, p.updated_at = datetime()
+    """
+    tx.run(
+        query,
+        page_hash=page_hash,
+        has_dtc=specification is not None,
+        specification=json.dumps(specification) if specification else None,
+    )
+
+
+# file kinds of the AppState and the node and relationship they are stored as
+APP_STATE_FILE_NODES = {
+    "circuit_diagrams": ("CircuitDiagram", "HAS_CIRCUIT"),
+    "system_descriptions": ("SystemInformation", "HAS_SYSTEM_DESCRIPTION"),
+    "dtc_specifications": ("DTCSpecification", "HAS_DTC_SPECIFICATION"),
+    "io_list_files": ("IOList", "HAS_IO_LIST"),
+}
+
+
+def save_app_state(tx, pending_files: dict):
+    """
+    Saves AppState file entries to Neo4j:
     - Uses 'hash' as the unique key.
     - Stores 'file_name' as metadata.
     - Stores 'ecu_system' as metadata.
     - Links files to AppState.
+
+    :param pending_files: the entries per file kind, see AppState.get_pending
     """
 
     # Ensure AppState node exists
     tx.run("MERGE (:AppState)")
 
-    # Helper function to save and link file nodes
-    def save_files(file_list, node_type, relationship):
-        if file_list:
-            # Separate creation (MERGE) and setting of optional properties
-            query = f"""
-            UNWIND $file_list AS file_entry
-            MERGE (f:{node_type} {{hash: file_entry.hash}})
-            SET f.file_name = file_entry.file_name
-            FOREACH (_ IN CASE WHEN file_entry.ecu_system IS NOT NULL THEN [1] ELSE [] END |
-                SET f.ecu_system = file_entry.ecu_system
-            )
-            MERGE (a:AppState)
-            MERGE (a)-[:{relationship}]->(f)
-            """
-            tx.run(query, file_list=file_list)
-
-    # Save different file types
-    save_files(app_state.circuit_diagrams, "CircuitDiagram", "HAS_CIRCUIT")
-    save_files(
-        app_state.system_descriptions, "SystemInformation", "HAS_SYSTEM_DESCRIPTION"
-    )
-    save_files(
-        app_state.dtc_specifications, "DTCSpecification", "HAS_DTC_SPECIFICATION"
-    )
-    save_files(app_state.io_list_files, "IOList", "HAS_IO_LIST")
+    for kind, file_list in pending_files.items():
+        if not file_list:
+            continue
+        node_type, relationship = APP_STATE_FILE_NODES[kind]
+        # Separate creation (MERGE) and setting of optional properties
+        query = f"""
+        MATCH (a:AppState)
+        WITH a LIMIT 1
+        UNWIND $file_list AS file_entry
+        MERGE (f:{node_type} {{hash: file_entry.hash}})
+        SET f.file_name = file_entry.file_name
+        FOREACH (_ IN CASE WHEN file_entry.ecu_system IS NOT NULL THEN [1] ELSE [] END |
+            SET f.ecu_system = file_entry.ecu_system
+        )
+        MERGE (a)-[:{relationship}]->(f)
+        """
+        tx.run(query, file_list=file_list)
+
+
+def write_app_state(app_state: AppState):
+    """
+    Writes only the AppState entries added since the last write.
+    """
+    pending_files = app_state.get_pending()
+    if not any(pending_files.values()):
+        return
+
+    with driver.session() as session:
+        session.execute_write(save_app_state, pending_files)
+    # cleared after the commit so a retried transaction still sees all entries
+    app_state.mark_saved(pending_files)
 
 
 def get_app_state(tx) -> AppState:
     """
     Fetches AppState from Neo4j and returns an AppState object.
-    Filters out NULL values to prevent None entries.
+    Every file list is collected with its own pattern comprehension so the
+    lists never multiply with each other.
     """
     query = """
     MATCH (a:AppState)
-    OPTIONAL MATCH (a)-[:HAS_CIRCUIT]->(c:CircuitDiagram)
-    OPTIONAL MATCH (a)-[:HAS_SYSTEM_DESCRIPTION]->(s:SystemInformation)
-    OPTIONAL MATCH (a)-[:HAS_DTC_SPECIFICATION]->(d:DTCSpecification)
-    OPTIONAL MATCH (a)-[:HAS_IO_LIST]->(i:IOList)
-    RETURN 
-        [entry IN COLLECT(DISTINCT {hash: c.hash, file_name: c.file_name, ecu_system: c.ecu_system }) WHERE entry.hash IS NOT NULL] AS circuit_diagrams,
-        [entry IN COLLECT(DISTINCT {hash: s.hash, file_name: s.file_name, ecu_system: c.ecu_system }) WHERE entry.hash IS NOT NULL] AS system_descriptions,
-        [entry IN COLLECT(DISTINCT {hash: d.hash, file_name: d.file_name, ecu_system: c.ecu_system }) WHERE entry.hash IS NOT NULL] AS dtc_specifications,
-        [entry IN COLLECT(DISTINCT {hash: i.hash, file_name: i.file_name, ecu_system: c.ecu_system }) WHERE entry.hash IS NOT NULL] AS io_list_files
+    WITH a LIMIT 1
+    RETURN
+        [(a)-[:HAS_CIRCUIT]->(c:CircuitDiagram) WHERE c.hash IS NOT NULL | {hash: c.hash, file_name: c.file_name, ecu_system: c.ecu_system}] AS circuit_diagrams,
+        [(a)-[:HAS_SYSTEM_DESCRIPTION]->(s:SystemInformation) WHERE s.hash IS NOT NULL | {hash: s.hash, file_name: s.file_name, ecu_system: s.ecu_system}] AS system_descriptions,
+        [(a)-[:HAS_DTC_SPECIFICATION]->(d:DTCSpecification) WHERE d.hash IS NOT NULL | {hash: d.hash, file_name: d.file_name, ecu_system: d.ecu_system}] AS dtc_specifications,
+        [(a)-[:HAS_IO_LIST]->(i:IOList) WHERE i.hash IS NOT NULL | {hash: i.hash, file_name: i.file_name, ecu_system: i.ecu_system}] AS io_list_files
     """
     result = tx.run(query).single()
 
+    if result is None:
+        return AppState()
+
     return AppState(
         circuit_diagrams=result["circuit_diagrams"],
         system_descriptions=result["system_descriptions"],
@@ -465,6 +593,47 @@ def create_io(tx, name, description, name_representation, ecu_system):
     )
 
 
+def map_io_to_component(tx, io_name, component_name, ecu_system):
+    """
+    Maps the IO to the component, the component is only flagged for re-export
+    when the mapping is new. Returns whether the mapping was created.
+    """
+    query = """
+    MATCH (io:IO {name: $io_name, ecu_system: $ecu_system})
+    MATCH (c:Component {name: $component_name, ecu_system: $ecu_system})
+    OPTIONAL MATCH (io)-[existing:MAPPED_TO]->(c)
+    WITH io, c, existing IS NULL AS created
+    MERGE (io)-[:MAPPED_TO]->(c)
+    FOREACH (_ IN CASE WHEN created THEN [1] ELSE [] END | SET c.exported = false)
+    RETURN created
+    """
+    record = tx.run(
+        query, io_name=io_name, component_name=component_name, ecu_system=ecu_system
+    ).single()
+    return bool(record and record["created"])
+
+
+def get_artifact_fingerprints(tx, ecu_system):
+    query = """
+    MATCH (a:ExportedArtifact {ecu_system: $ecu_system})
+    RETURN a.path AS path, a.fingerprint AS fingerprint
+    """
+    return {
+        record["path"]: record["fingerprint"]
+        for record in tx.run(query, ecu_system=ecu_system)
+    }
+
+
+def save_artifact_fingerprints(tx, rows, ecu_system):
+    """rows contain the path of the artifact relative to the output folder and its fingerprint"""
+    query = """
+    UNWIND $rows AS row
+    MERGE (a:ExportedArtifact {path: row.path, ecu_system: $ecu_system})
+    SET a.fingerprint = row.fingerprint, a.updated_at = datetime()
+    """
+    tx.run(query, rows=rows, ecu_system=ecu_system)
+
+
 def create_io_mapping_with_component(tx, io_name, component_name, ecu_system):
     query = """
     MATCH (io:IO {name: $io_name, ecu_system: $ecu_system})
@@ -0,0 +1,117 @@
+import re
+
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from utils import get_tokens_batch
+
+# component designators look like M59, E186, C8623 or R142
+DESIGNATOR_REGEX = re.compile(r"\b([A-Z]{1,3}\d{1,5}[A-Z]?)\b")
+
+
+def get_designators(text):
+    """
+    Returns the set of component designators (M59, E186, ...) found in the text.
+    """
+    return set(DESIGNATOR_REGEX.findall(text or ""))
+
+
+class ComponentLexicalIndex:
+    """
+    In-process TF-IDF index over the component name, description and purpose.
+
+    Dense embeddings handle exact designators like M59 or E186 poorly, so the
+    lexical score is fused with the Qdrant score when matching IOs to components.
+    """
+
+    def __init__(self, components: list[dict]):
+        self.components = {
+            component["name"]: component
+            for component in components
+            if component.get("name")
+        }
+        self.names = list(self.components.keys())
+        # the tokens of the name and description, for the lexical overlap of an IO decision
+        self.tokens = {
+            name: frozenset(tokens)
+            for name, tokens in zip(
+                self.names,
+                get_tokens_batch(
+                    [
+                        name + "\n" + (self.components[name].get("description") or "")
+                        for name in self.names
+                    ]
+                ),
+            )
+        }
+        self.vectorizer = None
+        self.matrix = None
+
+        if len(self.names) == 0:
+            return
+
+        documents = [
+            self.get_component_document(self.components[name]) for name in self.names
+        ]
+        self.vectorizer = TfidfVectorizer(
+            lowercase=True,
+            token_pattern=r"(?u)\b\w+\b",
+            sublinear_tf=True,
+        )
+        self.matrix = self.vectorizer.fit_transform(documents)
+
+    @staticmethod
+    def get_component_document(component: dict):
+        # the name is repeated so an exact designator hit outweighs the free text
+        return "\n".join(
+            [
+                component["name"],
+                component["name"],
+                component.get("description") or "",
+                component.get("more_description") or "",
+                component.get("purpose") or "",
+            ]
+        )
+
+    def search(self, text, limit=10, excluded_components=None):
+        """
+        Returns a dictionary of component name to the cosine similarity between
+        the text and the component document, limited to the best matches.
+        """
+        if self.vectorizer is None or self.matrix is None:
+            return {}
+
+        query = self.vectorizer.transform([text])
+        # tf-idf rows are l2 normalized, so the dot product is the cosine similarity
+        scores = (self.matrix @ query.T).toarray().ravel()
+
+        excluded_components = excluded_components or frozenset()
+        results = {}
+        for index in scores.argsort()[::-1]:
+            if scores[index] <= 0 or len(results) >= limit:
+                break
+            name = self.names[index]
+            if name in excluded_components:
+                continue
+            results[name] = float(scores[index])
+
+        return results
+
+    def get_exact_matches(self, text, excluded_components=None):
+        """
+        Returns the component names which appear verbatim as designators in the text.
+        """
+        excluded_components = excluded_components or frozenset()
+        return {
+            designator
+            for designator in get_designators(text)
+            if designator in self.components and designator not in excluded_components
+        }
+
+    def get_tokens(self, name):
+        return self.tokens.get(name)
+
+    def get_description(self, name):
+        component = self.components.get(name)
+        if component is None:
+            return ""
+        return component.get("description") or ""
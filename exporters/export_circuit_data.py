@@ -1,6 +1,6 @@
 import os
 from outflow.exporter import DataExporter
-from state import State
+from state import ComponentRecord, State
 
 from database.database import (
     driver,
@@ -18,7 +18,8 @@ def export_circuit_data(state: State):
         os.path.join(
             state.inference_base_folder,
             output_root_folder,
-        )
+        ),
+        change_tracker=state.change_tracker,
     )
     meta_conf = {
         "ecu_system_family": state.ecu_system_family,
@@ -42,6 +43,8 @@ def export_circuit_data(state: State):
 
 
 def load_processable_components(state: State):
+    # the IOs matched earlier in this inference are kept for the reloaded components
+    previous_components = state.processable_components
     state.processable_components = {}  # Dictionary for uniqueness
 
     # Fetch components from the database
@@ -53,4 +56,7 @@ def load_processable_components(state: State):
     # Identify components not in base_config_circuits
     for component in all_components:
         if component["name"] not in state.all_base_config_circuits:
-            state.processable_components[component["name"]] = dict(component)
+            record = ComponentRecord.from_record(component)
+            if component["name"] in previous_components:
+                record.ios = previous_components[component["name"]].ios
+            state.processable_components[component["name"]] = record
@@ -17,7 +17,8 @@ def export_dtc_data(state: State):
         os.path.join(
             state.inference_base_folder,
             output_root_folder,
-        )
+        ),
+        change_tracker=state.change_tracker,
     )
 
     meta_conf = {
@@ -30,7 +31,7 @@ def export_dtc_data(state: State):
         dtc_with_components = session.execute_read(
             get_dtc_with_components,
             state.ecu_system_execution,
-            state.all_base_config_circuits + state.all_other_server_circuits,
+            list(state.excluded_components),
         )
         for record in dtc_with_components:
             data_exporter.export_dtc_relation(
@@ -4,6 +4,7 @@ from langgraph.graph import StateGraph, START, END
 from openai import OpenAI
 from rich import print
 from config import openai_api_key, openai_api_base
+from graphs.prompts import PromptTemplate
 
 client = OpenAI(
     api_key=openai_api_key,
@@ -27,61 +28,63 @@ class State(TypedDict):
 # load markdown_table.md
 
 
+extract_all_components_prompt = PromptTemplate(
+    "circuit.extract_all_components",
+    """
+    You are a highly skilled technician. You have been given a list of components that are used in the circuit board.
+    based on the given input, extract all component name and description,
+
+    component has a name, position and a description
+
+    component description is a string with electrical component description
+    """,
+    examples=[
+        (
+            """
+            Des.
+            Pos.
+            Description
+            C9
+            E 3
+            Connector, 15-pole
+            C14
+            E 5
+            Connector, 18-pole
+            C26
+            E 6
+            Connector 16-pole
+            C8623
+            E 2
+            Connector, 1-pole
+            C8636
+            G 2
+            Connector, 1-pole
+            """,
+            """
+            name: C9
+            description: Connector, 15-pole
+
+            name: C14
+            description: Connector, 18-pole
+
+            name: C26
+            description: Connector 16-pole
+
+            name: C8623
+            description: Connector, 1-pole
+
+            name: C8636
+            description: Connector, 1-pole
+            """,
+        )
+    ],
+)
+
+
 def extract_all_components(state: State):
-    response = client.chat.completions.create(
-        messages=[
-            {
-                "role": "system",
-                "content": """
-                        You are a highly skilled technician. You have been given a list of components that are used in the circuit board.
-                        based on the given input, extract all component name and description,
-                        
-                        component has a name, position and a description
-                        
-                        component description is a string with electrical component description
-                        
-                        Example Input:
-                        Des.
-                        Pos.
-                        Description
-                        C9
-                        E 3
-                        Connector, 15-pole
-                        C14
-                        E 5
-                        Connector, 18-pole
-                        C26
-                        E 6
-                        Connector 16-pole
-                        C8623
-                        E 2
-                        Connector, 1-pole
-                        C8636
-                        G 2
-                        Connector, 1-pole
-
-                        Example Output:
-                        name: C9
-                        description: Connector, 15-pole
-
-                        name: C14
-                        description: Connector, 18-pole
-
-                        name: C26
-                        description: Connector 16-pole
-
-                        name: C8623
-                        description: Connector, 1-pole
-
-                        name: C8636
-                        description: Connector, 1-pole
-                        """,
-            },
-            {
-                "role": "user",
-                "content": state["diagram_content"],
-            },
-        ],
+    response = extract_all_components_prompt.complete(
+        client,
+        state["diagram_content"],
         model="NovaSky-AI/Sky-T1-32B-Flash",
         extra_body={
             "guided_json": CircuitComponents.model_json_schema(),
@@ -4,6 +4,7 @@ from pydantic import BaseModel, Field
 from typing import TypedDict
 from langgraph.graph import StateGraph, START, END
 from config import openai_api_key, openai_api_base
+from graphs.prompts import PromptTemplate
 
 client = OpenAI(
     api_key=openai_api_key,
@@ -40,50 +41,47 @@ class State(TypedDict):
     extra_information: str
 
 
+extract_component_details_prompt = PromptTemplate(
+    "component_details.extract",
+    """
+    You are an expert in electrical device details. Very carefully and slowly check the extra information extracted about a component. Based on the extra information, extract the purpose and description of the component. Also provide a reason for the extraction. The accuracy of the extraction is very important.
+
+    EXAMPLE INPUT:
+    component: T47
+    basic_description: Connector, 1-pole
+    extra_information: Front side left head lamp, Lamp connector
+
+    EXAMPLE OUTPUT:
+    description: This is a front side left head lamp connector
+    purpose: This connector is used to connect the front side left head lamp
+    has_description: yes
+    has_purpose: yes
+    reason: The information is accurate as per the given extra information
+
+
+    EXAMPLE INPUT:
+    component: T72
+    basic_description: Connector, 2-pole
+    extra_information: Prep/Not connected
+
+    EXAMPLE OUTPUT:
+    description:
+    purpose:
+    has_description: no
+    has_purpose: no
+    reason: There is not enough information to extract the description and purpose
+    """,
+)
+
+
 def extract_component_details(state: State):
-    response = client.chat.completions.create(
-        messages=[
-            {
-                "role": "system",
-                "content": """
-                You are an expert in electrical device details. Very carefully and slowly check the extra information extracted about a component. Based on the extra information, extract the purpose and description of the component. Also provide a reason for the extraction. The accuracy of the extraction is very important.
-
-                EXAMPLE INPUT:
-                component: T47
-                basic_description: Connector, 1-pole
-                extra_information: Front side left head lamp, Lamp connector
-                
-                EXAMPLE OUTPUT: 
-                description: This is a front side left head lamp connector
-                purpose: This connector is used to connect the front side left head lamp
-                has_description: yes
-                has_purpose: yes
-                reason: The information is accurate as per the given extra information
-
-
-                EXAMPLE INPUT:
-                component: T72
-                basic_description: Connector, 2-pole
-                extra_information: Prep/Not connected
-
-                EXAMPLE OUTPUT:
-                description: 
-                purpose:
-                has_description: no
-                has_purpose: no
-                reason: There is not enough information to extract the description and purpose
-
-                """,
-            },
-            {
-                "role": "user",
-                "content": f"""
+    response = extract_component_details_prompt.complete(
+        client,
+        f"""
             component: "{state["component"]}"
             basic_description: "{state["short_description"]}"
             extra information: "{state["extra_information"]}"
             """,
-            },
-        ],
         model="NovaSky-AI/Sky-T1-32B-Flash",
         temperature=0.5,
         extra_body={
@@ -98,34 +96,34 @@ def extract_component_details(state: State):
     return {"component_extraction_details": component_extraction_details}
 
 
+verify_component_details_prompt = PromptTemplate(
+    "component_details.verify",
+    """
+    You are an expert in electrical device details. Very carefully and slowly analyze the extracted information about a component. Based on the extracted information, verify if the extracted description and purpose of the component are correct. Also provide a reason for your decision.
+
+    Your job is to verify that all the component description and purpose details are correct are correct and provide more information about the component. Provide a reason for your decision.
+
+    Respond with verified_description and verified_purpose as yes or no and provide a reason for your decision.
+
+    EXAMPLE INPUT
+    component: T72
+    short_description: Connector, 2-pole
+    extra_information: Prep/Not connected
+    description: Prep/Not connected
+    purpose: Prep/Not connected
+
+    Example output:
+    verified_description: no
+    verified_purpose: no
+    reason= the information is not helpful and does not provide any additional information about the component
+    """,
+)
+
+
 def verify_component_details(state: State):
-    response = client.chat.completions.create(
-        messages=[
-            {
-                "role": "system",
-                "content": """
-                You are an expert in electrical device details. Very carefully and slowly analyze the extracted information about a component. Based on the extracted information, verify if the extracted description and purpose of the component are correct. Also provide a reason for your decision.
-
-                Your job is to verify that all the component description and purpose details are correct are correct and provide more information about the component. Provide a reason for your decision.
-
-                Respond with verified_description and verified_purpose as yes or no and provide a reason for your decision.
-
-                EXAMPLE INPUT
-                component: T72
-                short_description: Connector, 2-pole
-                extra_information: Prep/Not connected
-                description: Prep/Not connected
-                purpose: Prep/Not connected
-
-                Example output:
-                verified_description: no
-                verified_purpose: no
-                reason= the information is not helpful and does not provide any additional information about the component
-                """,
-            },
-            {
-                "role": "user",
-                "content": f"""
+    response = verify_component_details_prompt.complete(
+        client,
+        f"""
             component: "{state["component"]}"
             short_description: "{state["short_description"]}"
             extra_information: "{state["extra_information"]}"
@@ -133,8 +131,6 @@ def verify_component_details(state: State):
             purpose: "{state["component_extraction_details"].purpose}"
             
             """,
-            },
-        ],
         model="NovaSky-AI/Sky-T1-32B-Flash",
         temperature=0.5,
         extra_body={
@@ -146,7 +146,7 @@ extraction_example_bad_input = """
 {"error_code":"4.85 0296","components":"Invalidation","heading":"","cause":"Redetected degradation","system_reaction":"CMS: 0 - Erasable (can be erased, unconditional","symptom":""}
 """
 
-extraction_example_good_output = """
+extraction_example_bad_output = """
 approved = no
 reason = The error_code should be a single string
 """
@@ -157,6 +157,7 @@ from pydantic import BaseModel, Field
 from typing import TypedDict
 from langgraph.graph import StateGraph, START, END
 from config import openai_api_key, openai_api_base
+from graphs.prompts import PromptTemplate
 
 client = OpenAI(
     api_key=openai_api_key,
@@ -204,34 +205,60 @@ class State(TypedDict):
     attempt: int
 
 
+extract_error_codes_prompt = PromptTemplate(
+    "dtc.extract_error_codes",
+    """
+    You are a error code expert, give a page text data please extract the error code information.
+    The error code has the following structure:
+
+    error_code: The error code of the component
+    components: The component(s) of the error code
+    heading: The heading of the error code
+    detection: The detection of the error code
+    cause: The cause of the error code
+    system_reaction: The system reaction of the error code
+    symptom: The symptom of the error code
+    """,
+    examples=[(example_errorcode_input, example_errorcode_output)],
+)
+
+verify_error_presence_prompt = PromptTemplate(
+    "dtc.verify_error_presence",
+    """
+    You are a error code expert, you will receive text from a page and you have to classify if the page has an error data and if it has, you have to say yes or no and provide a reason for your decision.
+
+    Make sure to check if the input has the following fields:
+    error_code, components, heading, detection, cause, system_reaction, symptom.
+
+    You can safely ignore a page which just has a list of error codes without all the fields, it's very likely that it's a listing page.
+    """,
+    examples=[(negative_input, negative_output), (positive_input, positive_output)],
+)
+
+verify_error_extraction_prompt = PromptTemplate(
+    "dtc.verify_error_extraction",
+    """
+    You are a error code expert, you will receive some details about an error extracted. You have to evaluate if the extraction is good or not and provide a reason for your decision.
+
+    RULES:
+    1. Focus mainly on the affected components and the error code.
+    2. If some other fields are missing, you can ignore them.
+
+    OUTPUT:
+    1. description can only be yes or no
+    2. reason should be a very short reason for the classification
+    """,
+    examples=[
+        (extraction_example_good_input, extraction_example_good_output),
+        (extraction_example_bad_input, extraction_example_bad_output),
+    ],
+)
+
+
 def extract_error_codes(state: State):
-    response = client.chat.completions.create(
-        messages=[
-            {
-                "role": "system",
-                "content": f"""You are a error code expert, give a page text data please extract the error code information.
-                The error code has the following structure:
-                
-                error_code: The error code of the component
-                components: The component(s) of the error code
-                heading: The heading of the error code
-                detection: The detection of the error code
-                cause: The cause of the error code
-                system_reaction: The system reaction of the error code
-                symptom: The symptom of the error code
-
-                Example Input:
-                {example_errorcode_input}
-
-                Example Output:
-                {example_errorcode_output}""",
-            },
-            {
-                "role": "user",
-                "content": f"""
-                "page_text": {state["page_text"]}""",
-            },
-        ],
+    response = extract_error_codes_prompt.complete(
+        client,
+        f""""page_text": {state["page_text"]}""",
         model="NovaSky-AI/Sky-T1-32B-Flash",
         temperature=0.5,
         extra_body={"guided_json": DTCSpecification.model_json_schema(), "top_p": 0.9},
@@ -244,33 +271,9 @@ def extract_error_codes(state: State):
 
 
 def verify_error_presence(state: State):
-    response = client.chat.completions.create(
-        messages=[
-            {
-                "role": "system",
-                "content": """You are a error code expert, you will receive text from a page and you have to classify if the page has an error data and if it has, you have to say yes or no and provide a reason for your decision.
-
-                Make sure to check if the input has the following fields:
-                error_code, components, heading, detection, cause, system_reaction, symptom.
-
-                You can safely ignore a page which just has a list of error codes without all the fields, it's very likely that it's a listing page.
-
-                Example Input:
-                {negative_input}
-                Example Output:
-                {negative_output}
-
-                Example Input:
-                {positive_input}
-                Example Output:
-                {positive_output}""",
-            },
-            {
-                "role": "user",
-                "content": f""" "page_text": {state["page_text"]}
-                """,
-            },
-        ],
+    response = verify_error_presence_prompt.complete(
+        client,
+        f""""page_text": {state["page_text"]}""",
         model="NovaSky-AI/Sky-T1-32B-Flash",
         temperature=0.5,
         extra_body={
@@ -302,38 +305,9 @@ def route_error_code_extraction(state: State):
 
 
 def verify_error_extraction(state: State):
-    response = client.chat.completions.create(
-        messages=[
-            {
-                "role": "system",
-                "content": """
-                You are a error code expert, you will receive some details about an error extracted. You have to evaluate if the extraction is good or not and provide a reason for your decision.
-                Example Input:
-                {extraction_example_good_input}
-                Example Output:
-                {extraction_example_good_output}
-
-                Example Input:
-                {extraction_example_bad_input}
-                Example Output:
-                {extraction_example_good_output}
-
-                RULES:
-                1. Focus mainly on the affected components and the error code.
-                2. If some other fields are missing, you can ignore them.
-
-                OUTPUT:
-                1. description can only be yes or no
-                2. reason should be a very short reason for the classification
-                """,
-            },
-            {
-                "role": "user",
-                "content": f""" "page_text": {
-                    state["dtc_specification"].model_dump_json()
-                }""",
-            },
-        ],
+    response = verify_error_extraction_prompt.complete(
+        client,
+        f""""page_text": {state["dtc_specification"].model_dump_json()}""",
         model="NovaSky-AI/Sky-T1-32B-Flash",
         temperature=0.5,
         extra_body={
@@ -0,0 +1,183 @@
+import itertools
+import json
+import os
+from dataclasses import asdict, dataclass
+from threading import Lock
+
+from config import (
+    io_decision_thresholds_path,
+    io_auto_accept_score,
+    io_accept_margin,
+    io_accept_lexical_overlap,
+    io_reject_score,
+)
+from logger import system_logger
+from utils import get_tokens
+
+ACCEPT = "accept"
+REJECT = "reject"
+VERIFY = "verify"
+
+
+@dataclass(slots=True)
+class IODecisionThresholds:
+    # fused score and lead over the runner-up needed to accept without the llm
+    accept_score: float = io_auto_accept_score
+    accept_margin: float = io_accept_margin
+    # share of the component tokens found in the IO text needed to accept
+    accept_lexical_overlap: float = io_accept_lexical_overlap
+    # below this fused score the IO is rejected without the llm
+    reject_score: float = io_reject_score
+
+
+@dataclass(slots=True)
+class IODecisionFeatures:
+    top_score: float
+    margin: float
+    lexical_overlap: float
+    exact: bool
+
+
+def load_thresholds(path: str = io_decision_thresholds_path):
+    """Thresholds calibrated with commands.calibrate_io_decisions, or the configured defaults."""
+    if path and os.path.exists(path):
+        with open(path, "r") as file:
+            return IODecisionThresholds(**json.load(file)["thresholds"])
+    return IODecisionThresholds()
+
+
+def get_lexical_overlap(tokens, candidate):
+    component_tokens = candidate.get("tokens")
+    if component_tokens is None:
+        component_tokens = set(get_tokens(candidate["name"] + "\n" + candidate["description"]))
+    if not component_tokens:
+        return 0.0
+    return len(component_tokens & set(tokens)) / len(component_tokens)
+
+
+def get_decision_features(candidates: list[dict], tokens) -> IODecisionFeatures:
+    """Features of the best candidate, the candidates are sorted by fused score."""
+    top = candidates[0]
+    runner_up_score = candidates[1]["score"] if len(candidates) > 1 else 0.0
+    exact_candidates = [candidate for candidate in candidates if candidate["exact"]]
+    return IODecisionFeatures(
+        top_score=top["score"],
+        margin=top["score"] - runner_up_score,
+        lexical_overlap=get_lexical_overlap(tokens, top),
+        exact=len(exact_candidates) == 1 and exact_candidates[0] is top,
+    )
+
+
+def decide(features: IODecisionFeatures, thresholds: IODecisionThresholds):
+    if features.top_score < thresholds.reject_score and not features.exact:
+        return REJECT
+
+    if features.top_score >= thresholds.accept_score and (
+        features.exact
+        or (
+            features.margin >= thresholds.accept_margin
+            and features.lexical_overlap >= thresholds.accept_lexical_overlap
+        )
+    ):
+        return ACCEPT
+
+    return VERIFY
+
+
+class IODecisionMetrics:
+    """Counts the decisions so the share of IOs sent to the llm can be followed."""
+
+    def __init__(self):
+        self.lock = Lock()
+        self.counts = {ACCEPT: 0, REJECT: 0, VERIFY: 0}
+
+    def record(self, decision: str):
+        with self.lock:
+            self.counts[decision] += 1
+
+    def snapshot(self):
+        with self.lock:
+            return dict(self.counts)
+
+    def log(self, since: dict | None = None):
+        """Logs the decisions, since an earlier snapshot when one is given."""
+        counts = self.snapshot()
+        if since is not None:
+            counts = {decision: counts[decision] - since[decision] for decision in counts}
+        total = sum(counts.values())
+        system_logger.info(
+            f"IO decisions: {counts[ACCEPT]} accepted, {counts[REJECT]} rejected, "
+            f"{counts[VERIFY]} sent to the llm ({counts[VERIFY] / max(total, 1):.0%} of {total})"
+        )
+
+
+io_decision_thresholds = load_thresholds()
+io_decision_metrics = IODecisionMetrics()
+
+
+def calibrate(samples, target_precision: float = 0.98):
+    """
+    Searches the thresholds which decide the most samples without the llm while
+    the automatic accepts and rejects keep the target precision.
+
+    Every sample is a (features, top_is_correct, has_match) tuple: whether the
+    best candidate is the labelled component and whether the IO has one at all.
+    """
+    score_grid = [round(0.3 + step * 0.05, 2) for step in range(15)]
+    # an infinite margin accepts exact designator matches only
+    margin_grid = [0.0, 0.05, 0.1, 0.15, 0.2, 0.3, float("inf")]
+    overlap_grid = [0.0, 0.2, 0.4, 0.6]
+    # a reject score of 0 rejects nothing
+    reject_grid = [0.0] + score_grid
+
+    best = None
+    for accept_score, accept_margin, accept_lexical_overlap, reject_score in itertools.product(
+        score_grid, margin_grid, overlap_grid, reject_grid
+    ):
+        if reject_score > accept_score:
+            continue
+        thresholds = IODecisionThresholds(
+            accept_score=accept_score,
+            accept_margin=accept_margin,
+            accept_lexical_overlap=accept_lexical_overlap,
+            reject_score=reject_score,
+        )
+
+        accepted = correct_accepts = rejected = correct_rejects = 0
+        for features, top_is_correct, has_match in samples:
+            decision = decide(features, thresholds)
+            if decision == ACCEPT:
+                accepted += 1
+                correct_accepts += top_is_correct
+            elif decision == REJECT:
+                rejected += 1
+                correct_rejects += not has_match
+
+        if accepted and correct_accepts / accepted < target_precision:
+            continue
+        if rejected and correct_rejects / rejected < target_precision:
+            continue
+
+        decided = accepted + rejected
+        if best is None or decided > best[0]:
+            best = (decided, thresholds, correct_accepts, accepted, correct_rejects, rejected)
+
+    if best is None:
+        return IODecisionThresholds(), {}
+
+    decided, thresholds, correct_accepts, accepted, correct_rejects, rejected = best
+    metrics = {
+        "samples": len(samples),
+        "decided_without_llm": decided,
+        "accepted": accepted,
+        "accept_precision": correct_accepts / accepted if accepted else None,
+        "rejected": rejected,
+        "reject_precision": correct_rejects / rejected if rejected else None,
+    }
+    return thresholds, metrics
+
+
+def save_thresholds(thresholds: IODecisionThresholds, metrics: dict, path: str):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w") as file:
+        json.dump({"thresholds": asdict(thresholds), "metrics": metrics}, file, indent=2)
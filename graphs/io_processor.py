@@ -1,12 +1,29 @@
 from openai import OpenAI
 from pydantic import BaseModel, Field
-from typing import TypedDict
+from typing import Optional, TypedDict
 from langgraph.graph import StateGraph, START, END
-from database.database import oclient, qclient, COLLECTION_NAME
+from database.database import oclient, qclient, COLLECTION_NAME, get_component_filter
+from database.lexical_index import ComponentLexicalIndex
+from graphs.prompts import PromptTemplate
+from graphs.io_decision import (
+    ACCEPT,
+    REJECT,
+    decide,
+    get_decision_features,
+    io_decision_metrics,
+    io_decision_thresholds,
+)
 from utils import get_tokens, get_clean_io_name
 from qdrant_client import models
 from logger import system_logger
-from config import openai_api_key, openai_api_base
+from config import (
+    openai_api_key,
+    openai_api_base,
+    io_dense_score_threshold,
+    io_dense_weight,
+    io_sparse_weight,
+    io_exact_match_bonus,
+)
 
 client = OpenAI(
     api_key=openai_api_key,
@@ -24,159 +41,241 @@ class IOVerification(BaseModel):
 
 class State(TypedDict):
     io_item: dict
-    excluded_components: list[str]
+    excluded_components: frozenset[str]
     ecu_system: str
+    # the qdrant filter of the inference, built from the excluded components when missing
+    component_filter: Optional[models.Filter]
+    lexical_index: Optional[ComponentLexicalIndex]
+    # precomputed dense candidates, when given Qdrant is not queried
+    dense_candidates: Optional[list[dict]]
     matched: str
     component: str
 
 
-def process_io_item(state: State):
-    system_logger.info(f"Processing IO item {state['io_item']}")
+def get_io_data(io_item: dict):
+    """Returns the IO name and the text describing the IO."""
     description = ""
     name_presentation = ""
-    name = state["io_item"]["Name"]
-    if (
-        "NamePresentation" in state["io_item"]
-        and "#text" in state["io_item"]["NamePresentation"]
-    ):
-        name_presentation = state["io_item"]["NamePresentation"]["#text"]
+    name = io_item["Name"]
+    if "NamePresentation" in io_item and "#text" in io_item["NamePresentation"]:
+        name_presentation = io_item["NamePresentation"]["#text"]
 
     if (
-        "Description" in state["io_item"]["IOService"]
-        and "#text" in state["io_item"]["IOService"]["Description"]
+        "Description" in io_item["IOService"]
+        and "#text" in io_item["IOService"]["Description"]
     ):
-        description = state["io_item"]["IOService"]["Description"]["#text"]
+        description = io_item["IOService"]["Description"]["#text"]
 
     if name == name_presentation:
         name_presentation = ""  # if name and name_presentation are the same, we don't need to repeat the name_presentation
 
     data = get_clean_io_name(name) + "\n" + name_presentation + "\n" + description
+    return name, data
 
-    system_logger.info(f"Processing IO: {name} {name_presentation} {description}")
-    system_logger.info(f"IO data: {data}")
-    system_logger.info(f"Generated tokens: {get_tokens(data)}")
 
-    tokens = get_tokens(data)
+def get_io_text(io_item: dict):
+    """
+    Returns the IO name, the text describing the IO and its unique tokens,
+    the tokens joined by spaces are what gets embedded.
+    """
+    name, data = get_io_data(io_item)
 
     # make tokens unique
-    tokens = list(set(tokens))
+    tokens = list(dict.fromkeys(get_tokens(data)))
+    return name, data, tokens
+
+
+def query_dense_candidates(component_filter, tokens):
+    embeddings_response = oclient.embeddings(
+        model="nomic-embed-text", prompt=" ".join(tokens)
+    )
+    embeddings = embeddings_response["embedding"]
+    response = qclient.query_points(
+        collection_name=COLLECTION_NAME,
+        query=embeddings,
+        score_threshold=io_dense_score_threshold,
+        query_filter=component_filter,
+    )
+    return [
+        {
+            "name": point.payload["name"],
+            "description": point.payload["description"],
+            "score": point.score,
+        }
+        for point in response.points
+    ]
+
+
+def get_hybrid_candidates(state: State, data, tokens):
+    """
+    Fuses the dense Qdrant score with the lexical TF-IDF score and exact
+    designator matches, returns the candidates sorted by the fused score.
+    """
+    excluded_components = state["excluded_components"]
+    lexical_index = state.get("lexical_index")
+
+    dense_candidates = state.get("dense_candidates")
+    if dense_candidates is None:
+        component_filter = state.get("component_filter") or get_component_filter(
+            state["ecu_system"], excluded_components
+        )
+        dense_candidates = query_dense_candidates(component_filter, tokens)
+
+    candidates = {}
+    for dense_candidate in dense_candidates:
+        candidates[dense_candidate["name"]] = {
+            "name": dense_candidate["name"],
+            "description": dense_candidate["description"],
+            "dense": dense_candidate["score"],
+            "sparse": 0.0,
+            "exact": False,
+        }
+
+    if lexical_index is not None:
+        sparse_scores = lexical_index.search(
+            data + "\n" + " ".join(tokens),
+            excluded_components=excluded_components,
+        )
+        exact_matches = lexical_index.get_exact_matches(
+            data, excluded_components=excluded_components
+        )
+        for name in set(sparse_scores) | exact_matches:
+            if name not in candidates:
+                candidates[name] = {
+                    "name": name,
+                    "description": lexical_index.get_description(name),
+                    "dense": 0.0,
+                    "sparse": 0.0,
+                    "exact": False,
+                }
+            candidates[name]["sparse"] = sparse_scores.get(name, 0.0)
+            candidates[name]["exact"] = name in exact_matches
+        # the component tokens are tokenized once when the index is built
+        for candidate in candidates.values():
+            candidate["tokens"] = lexical_index.get_tokens(candidate["name"])
+
+    for candidate in candidates.values():
+        candidate["score"] = (
+            io_dense_weight * candidate["dense"]
+            + io_sparse_weight * candidate["sparse"]
+            + (io_exact_match_bonus if candidate["exact"] else 0.0)
+        )
+
+    return sorted(candidates.values(), key=lambda c: c["score"], reverse=True)
+
+
+io_verification_prompt = PromptTemplate(
+    "io.verify_component",
+    """
+    You are an expert in error diagnosis and detection for vehicle electrical components. Based on an IO event decide if the IO event blongs to a given component or not.
+    Example 1:
+    Example Input:
+    IO EVENT: Cabin fan PWM duty cycle
+
+    COMPONENTS:
+    Component Name: L32/L33
+    Component Description: Lamp, boarding step, driver/passenger
+
+    Component Name: L34
+    Component Description: Lamp, boarding step, driver/passenger
+
+    Component Name: E107
+    Component Description: Fuel level sensor
+
+    Example Output:
+    matched: no
+    component: None
+    reason: The IO event does not belong to any of the components because it's related to cabin fan and none of the components are related to cabin fan
+
+    EXAMPLE 2:
+    Example Input:
+    IO EVENT: pin el position voltage clutch sensor
+
+    Component Name: T20
+    Component Description: Sensor, tachograph
+
+    Component Name: R142
+    Component Description: Relay, coolant level sensor
+
+    COMPONENT:
+    Component Name: D60
+    Component Description: Sensor, clutch pedal
+
+    Example Output:
+    matched: yes
+    component: D60
+    reason: The IO event belongs to the component because it's related to clutch sensor and D60 is related to clutch sensor
+
+    Be critical and provide a reason for your decision, match only when you are fully confident.
+    """,
+)
+
+
+def process_io_item(state: State):
+    system_logger.info(f"Processing IO item {state['io_item']}")
+    name, data, tokens = get_io_text(state["io_item"])
+
+    system_logger.info(f"IO data: {data}")
     system_logger.info(f"Unique tokens: {tokens}")
 
     if len(tokens) == 0:
         system_logger.info(f"No tokens found for IO event {name}")
         return {"matched": "no", "component": "No component found"}
 
-    points = []
+    candidates = []
     try:
-        embeddings_response = oclient.embeddings(
-            model="nomic-embed-text", prompt=" ".join(tokens)
-        )
-        embeddings = embeddings_response["embedding"]
-        response = qclient.query_points(
-            collection_name=COLLECTION_NAME,
-            query=embeddings,
-            score_threshold=0.55,
-            query_filter=models.Filter(
-                must=[
-                    models.FieldCondition(
-                        key="ecu_system",
-                        match=models.MatchValue(
-                            value=state["ecu_system"],
-                        ),
-                    ),
-                    models.FieldCondition(
-                        key="name",
-                        match=models.MatchExcept(
-                            **{"except": state["excluded_components"]},
-                        ),
-                    ),
-                ],
-            ),
-        )
-
-        points = response.points
+        # the raw name keeps designators which get_clean_io_name strips off
+        candidates = get_hybrid_candidates(state, name + "\n" + data, tokens)
 
     except Exception as e:
         system_logger.error(f"Error querying Qdrant: {e}")
         return {"matched": "no", "component": "No component found"}
 
-    if len(points) == 0:
+    if len(candidates) == 0:
         system_logger.info(f"No component found for IO event {name}")
         return {"matched": "no", "component": "No component found"}
 
-    # take the first three points and run it via LLM
-    selected_points = points[:3]
+    # only the ambiguous IOs are confirmed by the LLM
+    features = get_decision_features(candidates, tokens)
+    decision = decide(features, io_decision_thresholds)
+    io_decision_metrics.record(decision)
+    if decision == ACCEPT:
+        system_logger.info(
+            f"Accepted {candidates[0]['name']} for {name} without LLM: {features}"
+        )
+        return {
+            "matched": "yes",
+            "reason": "Confident retrieval match",
+            "component": candidates[0]["name"],
+        }
+    if decision == REJECT:
+        system_logger.info(f"Rejected the candidates for {name} without LLM: {features}")
+        return {"matched": "no", "component": "No component found"}
+
+    # take the first three candidates and run it via LLM
+    selected_candidates = candidates[:3]
 
     system_logger.info(
-        f"""Queried qdrant for embeddings for: {data} - proceeding to LLM confirmation \n
+        f"""Queried hybrid retrieval for: {data} - proceeding to LLM confirmation \n
         The top 3 components are: {
-             [(point.payload["name"], point.payload["description"], point.score) for point in selected_points]
+             [(candidate["name"], candidate["description"], candidate["score"]) for candidate in selected_candidates]
         }
         """
     )
     component_descriptions = "\n".join(
         [
-            f"Component Name: {point.payload['name']}\nComponent Description: {point.payload['description']}"
-            for point in selected_points
+            f"Component Name: {candidate['name']}\nComponent Description: {candidate['description']}"
+            for candidate in selected_candidates
         ]
     )
-    response = client.chat.completions.create(
-        messages=[
-            {
-                "role": "system",
-                "content": """
-                You are an expert in error diagnosis and detection for vehicle electrical components. Based on an IO event decide if the IO event blongs to a given component or not.
-                Example 1:
-                Example Input:
-                IO EVENT: Cabin fan PWM duty cycle
-
-                COMPONENTS:
-                Component Name: L32/L33
-                Component Description: Lamp, boarding step, driver/passenger
-
-                Component Name: L34
-                Component Description: Lamp, boarding step, driver/passenger
-
-                Component Name: E107
-                Component Description: Fuel level sensor
-
-                Example Output:
-                matched: no
-                component: None
-                reason: The IO event does not belong to any of the components because it's related to cabin fan and none of the components are related to cabin fan
-
-                EXAMPLE 2:
-                Example Input:
-                IO EVENT: pin el position voltage clutch sensor
-                
-                Component Name: T20
-                Component Description: Sensor, tachograph
-
-                Component Name: R142
-                Component Description: Relay, coolant level sensor
-
-                COMPONENT:
-                Component Name: D60
-                Component Description: Sensor, clutch pedal
-
-                Example Output:
-                matched: yes
-                component: D60
-                reason: The IO event belongs to the component because it's related to clutch sensor and D60 is related to clutch sensor
-
-                Be critical and provide a reason for your decision, match only when you are fully confident.
-                """,
-            },
-            {
-                "role": "user",
-                "content": f"""
+    response = io_verification_prompt.complete(
+        client,
+        f"""
             IO EVENT: {" ".join(tokens)}
             
             COMPONENT:
             {component_descriptions}
             """,
-            },
-        ],
         model="NovaSky-AI/Sky-T1-32B-Flash",
         temperature=0.45,
         extra_body={
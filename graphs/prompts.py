@@ -0,0 +1,87 @@
+import textwrap
+from threading import Lock
+
+from logger import system_logger
+
+# token usage per prompt, used to follow the vLLM prefix cache hit rate
+prompt_usage: dict[str, dict] = {}
+prompt_usage_lock = Lock()
+
+
+def record_usage(name: str, response):
+    """Records the prompt, cached and completion tokens reported in the usage field."""
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        return
+
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached_tokens = (getattr(details, "cached_tokens", None) or 0) if details else 0
+
+    with prompt_usage_lock:
+        stats = prompt_usage.setdefault(
+            name,
+            {"calls": 0, "prompt_tokens": 0, "cached_tokens": 0, "completion_tokens": 0},
+        )
+        stats["calls"] += 1
+        stats["prompt_tokens"] += usage.prompt_tokens or 0
+        stats["cached_tokens"] += cached_tokens
+        stats["completion_tokens"] += usage.completion_tokens or 0
+
+
+def get_prompt_usage(since: dict | None = None):
+    """The usage per prompt, since an earlier snapshot when one is given."""
+    with prompt_usage_lock:
+        usage = {name: dict(stats) for name, stats in prompt_usage.items()}
+    if since is not None:
+        for name, stats in usage.items():
+            previous = since.get(name, {})
+            for key in stats:
+                stats[key] -= previous.get(key, 0)
+        usage = {name: stats for name, stats in usage.items() if stats["calls"]}
+    return usage
+
+
+def log_prompt_usage(since: dict | None = None):
+    """Logs the usage per prompt, since an earlier snapshot when one is given."""
+    for name, stats in sorted(get_prompt_usage(since).items()):
+        hit_rate = stats["cached_tokens"] / max(stats["prompt_tokens"], 1)
+        system_logger.info(
+            f"Prompt {name}: {stats['calls']} calls, {stats['prompt_tokens']} prompt tokens, "
+            f"{stats['cached_tokens']} cached ({hit_rate:.0%}), {stats['completion_tokens']} completion tokens"
+        )
+
+
+class PromptTemplate:
+    """
+    Prompt with a static prefix and the variable content at the end.
+
+    The instructions and few-shot examples are assembled once into the system
+    message, so every call of the prompt starts with an identical prefix that
+    vLLM automatic prefix caching can reuse. Only the user message at the end
+    differs between calls.
+    """
+
+    def __init__(self, name: str, instructions: str, examples=()):
+        self.name = name
+        parts = [textwrap.dedent(instructions).strip()]
+        for example_input, example_output in examples:
+            parts.append(
+                "Example Input:\n"
+                + textwrap.dedent(example_input).strip()
+                + "\n\nExample Output:\n"
+                + textwrap.dedent(example_output).strip()
+            )
+        self.prefix = "\n\n".join(parts)
+
+    def messages(self, content: str):
+        return [
+            {"role": "system", "content": self.prefix},
+            {"role": "user", "content": textwrap.dedent(content).strip()},
+        ]
+
+    def complete(self, client, content: str, **kwargs):
+        response = client.chat.completions.create(
+            messages=self.messages(content), **kwargs
+        )
+        record_usage(self.name, response)
+        return response
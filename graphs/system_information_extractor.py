@@ -4,6 +4,7 @@ from pydantic import BaseModel, Field
 from typing import TypedDict
 from langgraph.graph import StateGraph, START, END
 from config import openai_api_key, openai_api_base
+from graphs.prompts import PromptTemplate
 
 client = OpenAI(
     api_key=openai_api_key,
@@ -27,6 +28,29 @@ class ComponentExtractionVerification(BaseModel):
     reason: str = Field(..., description="The reason for the verification")
 
 
+class PageComponentDescription(BaseModel):
+    component: str = Field(..., description="The component name as given")
+    description: str = Field(..., description="The description of the component")
+
+
+class PageComponentDescriptions(BaseModel):
+    components: list[PageComponentDescription] = Field(
+        ..., description="The components described on the page, empty if none"
+    )
+
+
+class PageComponentVerification(BaseModel):
+    component: str = Field(..., description="The component name as given")
+    verified: str = Field(
+        ..., description="yes or no, Whether the component details are correct"
+    )
+    reason: str = Field(..., description="The reason for the verification")
+
+
+class PageComponentVerifications(BaseModel):
+    verifications: list[PageComponentVerification]
+
+
 class State(TypedDict):
     component_extraction_details: ComponentExtractionDetails
     component_extraction_verification: ComponentExtractionVerification
@@ -34,53 +58,51 @@ class State(TypedDict):
     page_text: str
 
 
+extract_component_details_prompt = PromptTemplate(
+    "system_information.extract_component",
+    """
+    You are an expert in electrical device details. Very carefully and slowly check the page content and component name. If the component does not exist in the text, just say no information found. If the component exists in the text, only respond with the any information and the reason for the extraction.
+
+    Keep the information as short as possible and only include the relevant information found as close to the component as possible thus enusuring the information is relevant to the component.
+
+    The document is very unstructured and the information is not always in the same format. Sometimes the information is above or below the mentioned component.
+
+    Example given component: E160
+    Example Page Text: The E160 component is a type of electrical device that is used to control the flow of electricity in a circuit. It is commonly used in power supplies and other electronic devices.
+
+    Example output:
+    component= E160
+    description= Control the flow of electricity in a circuit
+    has_description= yes
+
+    Example given component: C74
+    Example Page Text: The B74 component is a type of electrical device that is used to control the flow of electricity in a circuit. It is commonly used in power supplies and other electronic devices.
+
+    Example output:
+    component= C74
+    description= no information found
+    has_description= no
+    reason= The component does not exist in the text there is another component B74 but we are looking for C74
+
+    output format: A valid JSON object
+    {
+        "component": "",
+        "description": "",
+        "has_description": "yes/no",
+        "reason": ""
+    }
+    """,
+)
+
+
 def extract_component_details(state: State):
-    response = client.chat.completions.create(
-        messages=[
-            {
-                "role": "system",
-                "content": """
-                You are an expert in electrical device details. Very carefully and slowly check the page content and component name. If the component does not exist in the text, just say no information found. If the component exists in the text, only respond with the any information and the reason for the extraction.
-
-                Keep the information as short as possible and only include the relevant information found as close to the component as possible thus enusuring the information is relevant to the component.
-
-                The document is very unstructured and the information is not always in the same format. Sometimes the information is above or below the mentioned component.
-
-                Example given component: E160
-                Example Page Text: The E160 component is a type of electrical device that is used to control the flow of electricity in a circuit. It is commonly used in power supplies and other electronic devices.
-
-                Example output:
-                component= E160
-                description= Control the flow of electricity in a circuit
-                has_description= yes
-
-                Example given component: C74
-                Example Page Text: The B74 component is a type of electrical device that is used to control the flow of electricity in a circuit. It is commonly used in power supplies and other electronic devices.
-
-                Example output:
-                component= C74
-                description= no information found
-                has_description= no
-                reason= The component does not exist in the text there is another component B74 but we are looking for C74
-
-                output format: A valid JSON object
-                {
-                    "component": "",
-                    "description": "",
-                    "has_description": "yes/no",
-                    "reason": ""
-                }
-                """,
-            },
-            {
-                "role": "user",
-                "content": f"""
+    response = extract_component_details_prompt.complete(
+        client,
+        f"""
             given component: "{state["component"]}"
             here is the actual page text
             Page Text: {state["page_text"]}
             """,
-            },
-        ],
         model="NovaSky-AI/Sky-T1-32B-Flash",
         temperature=0.45,
         extra_body={
@@ -94,45 +116,43 @@ def extract_component_details(state: State):
     return {"component_extraction_details": component_extraction_details}
 
 
+verify_component_details_prompt = PromptTemplate(
+    "system_information.verify_component",
+    """
+    You are an expert in electrical device details. Very carefully and slowly check the page content and component details.
+
+    Your job is to verify that all the component details are correct and present in the page text.
+
+    Respond with yes/no and provide a reason for your decision.
+
+    Example given component: E160
+    Example given details: Control the flow of electricity in a circuit
+    Example Page Text: The E155 component is a type of electrical device that is used to control the flow of electricity in a circuit. It is commonly used in power supplies and other electronic devices.
+
+    Example output:
+    verified= no
+    reason= the information is not accurate as per the page text
+
+    If in doubt, always say no.
+
+    Output format: A valid JSON object
+    {
+        "verified": "yes/no",
+        "reason": ""
+    }
+    """,
+)
+
+
 def verify_component_details(state: State):
-    response = client.chat.completions.create(
-        messages=[
-            {
-                "role": "system",
-                "content": """
-                You are an expert in electrical device details. Very carefully and slowly check the page content and component details.
-
-                Your job is to verify that all the component details are correct and present in the page text.
-
-                Respond with yes/no and provide a reason for your decision.
-
-                Example given component: E160
-                Example given details: Control the flow of electricity in a circuit
-                Example Page Text: The E155 component is a type of electrical device that is used to control the flow of electricity in a circuit. It is commonly used in power supplies and other electronic devices.
-
-                Example output:
-                verified= no
-                reason= the information is not accurate as per the page text
-
-                If in doubt, always say no.
-
-                Output format: A valid JSON object
-                {
-                    "verified": "yes/no",
-                    "reason": ""
-                }
-                """,
-            },
-            {
-                "role": "user",
-                "content": f"""
+    response = verify_component_details_prompt.complete(
+        client,
+        f"""
             given component: "{state["component"]}"
             given description: "{state["component_extraction_details"].description}"
             here is the actual page text
             Page Text: {state["page_text"]}
             """,
-            },
-        ],
         model="NovaSky-AI/Sky-T1-32B-Flash",
         temperature=0.45,
         extra_body={
@@ -155,6 +175,122 @@ def route_component_verification(state: State):
         return "No Extraction"
 
 
+class PageState(TypedDict):
+    components: list[str]
+    page_text: str
+    page_component_descriptions: PageComponentDescriptions
+    page_component_verifications: PageComponentVerifications
+
+
+extract_page_components_prompt = PromptTemplate(
+    "system_information.extract_page_components",
+    """
+    You are an expert in electrical device details. Very carefully and slowly check the page content and the list of given components. For every given component that is described in the text, respond with the information found about it. Leave out the components which are not described in the text.
+
+    Keep the information as short as possible and only include the relevant information found as close to the component as possible thus enusuring the information is relevant to the component.
+
+    The document is very unstructured and the information is not always in the same format. Sometimes the information is above or below the mentioned component.
+
+    Example given components: E160, C74
+    Example Page Text: The E160 component is a type of electrical device that is used to control the flow of electricity in a circuit. The B74 component is commonly used in power supplies and other electronic devices.
+
+    Example output:
+    {
+        "components": [
+            {"component": "E160", "description": "Control the flow of electricity in a circuit"}
+        ]
+    }
+    C74 is left out, the text only mentions another component B74.
+    """,
+)
+
+
+def extract_page_components(state: PageState):
+    response = extract_page_components_prompt.complete(
+        client,
+        f"""
+            given components: {", ".join(state["components"])}
+            here is the actual page text
+            Page Text: {state["page_text"]}
+            """,
+        model="NovaSky-AI/Sky-T1-32B-Flash",
+        temperature=0.45,
+        extra_body={
+            "guided_json": PageComponentDescriptions.model_json_schema(),
+            "top_p": 0.95,
+        },
+    )
+    page_component_descriptions = PageComponentDescriptions.model_validate_json(
+        response.choices[0].message.content or '{"components": []}'
+    )
+    # the model may answer with components that were not asked for
+    page_component_descriptions.components = [
+        extraction
+        for extraction in page_component_descriptions.components
+        if extraction.component in state["components"]
+    ]
+    return {"page_component_descriptions": page_component_descriptions}
+
+
+verify_page_components_prompt = PromptTemplate(
+    "system_information.verify_page_components",
+    """
+    You are an expert in electrical device details. Very carefully and slowly check the page content and the details of every given component.
+
+    Your job is to verify for each component that its details are correct and present in the page text.
+
+    Respond with yes/no and provide a reason for your decision for every given component.
+
+    Example given component: E160
+    Example given details: Control the flow of electricity in a circuit
+    Example Page Text: The E155 component is a type of electrical device that is used to control the flow of electricity in a circuit. It is commonly used in power supplies and other electronic devices.
+
+    Example output:
+    {
+        "verifications": [
+            {"component": "E160", "verified": "no", "reason": "the information is not accurate as per the page text"}
+        ]
+    }
+
+    If in doubt, always say no.
+    """,
+)
+
+
+def verify_page_components(state: PageState):
+    component_details = "\n".join(
+        [
+            f'given component: "{extraction.component}"\ngiven description: "{extraction.description}"'
+            for extraction in state["page_component_descriptions"].components
+        ]
+    )
+    response = verify_page_components_prompt.complete(
+        client,
+        f"""
+            {component_details}
+            here is the actual page text
+            Page Text: {state["page_text"]}
+            """,
+        model="NovaSky-AI/Sky-T1-32B-Flash",
+        temperature=0.45,
+        extra_body={
+            "guided_json": PageComponentVerifications.model_json_schema(),
+            "top_p": 0.95,
+        },
+    )
+    page_component_verifications = PageComponentVerifications.model_validate_json(
+        response.choices[0].message.content or '{"verifications": []}'
+    )
+    return {"page_component_verifications": page_component_verifications}
+
+
+def route_page_verification(state: PageState):
+    if len(state["page_component_descriptions"].components) > 0:
+        return "Has Extraction"
+    else:
+        return "No Extraction"
+
+
 components_builder = StateGraph(State)
 
 # Add the nodes
@@ -171,3 +307,20 @@ components_builder.add_edge("verify_component_details", END)
 
 # compile the workflow
 graph = components_builder.compile()
+
+
+# multi component mode, one extraction and one verification call per page
+page_builder = StateGraph(PageState)
+
+page_builder.add_node("extract_page_components", extract_page_components)
+page_builder.add_node("verify_page_components", verify_page_components)
+
+page_builder.add_edge(START, "extract_page_components")
+page_builder.add_conditional_edges(
+    "extract_page_components",
+    route_page_verification,
+    {"Has Extraction": "verify_page_components", "No Extraction": END},
+)
+page_builder.add_edge("verify_page_components", END)
+
+page_graph = page_builder.compile()
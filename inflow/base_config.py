@@ -1,100 +1,180 @@
 import hashlib
 import os
 import re
+from collections import OrderedDict
+from dataclasses import dataclass
+from io import BytesIO
+from threading import Lock
+
+from lxml import etree
 from xmltodict import parse
 
+from logger import audit_logger as logger
+from utils import get_system_config_using_server_can
 
-class BaseConfig:
-    base_config_circuits: list[str] = []
-    base_config: None | dict = None
-    other_server_circuits: list[str] = []
-    hero_circuits: list[str] = []
-    server_can: None | str = None
-    id: None | str = None
-    filename: None | str = None
-    file_hash: None | str = None
+# parsed base configurations are shared across inferences by content hash
+PARSED_CACHE_SIZE = 128
+
+
+@dataclass(frozen=True, slots=True)
+class ParsedBaseConfig:
+    raw: bytes
+    base_config_circuits: frozenset[str]
+    hero_circuits: frozenset[str]
+    other_server_circuits: frozenset[str]
+    server_can: None | str
+
+
+def parse_base_config(raw: bytes) -> ParsedBaseConfig:
+    """
+    Collects the circuit refs of the base configuration and of the hero and
+    other server configurations in one streaming pass over the xml.
+    """
+    base_config_circuits = set()
+    hero_circuits = set()
+    other_server_circuits = set()
+    server_can = None
+
+    path = []
+    display_name = ""
+    server_circuits = []
+    for event, element in etree.iterparse(BytesIO(raw), events=("start", "end")):
+        tag = etree.QName(element).localname
+        if event == "start":
+            path.append(tag)
+            if tag == "ServerConfiguration":
+                display_name = ""
+                server_circuits = []
+            continue
+
+        parent = path[-2] if len(path) > 1 else None
+        if tag == "CircuitRef":
+            circuit = (element.text or "").strip()
+            if parent == "BaseConfiguration":
+                base_config_circuits.add(circuit)
+            elif parent == "ServerConfiguration":
+                server_circuits.append(circuit)
+        elif tag == "DisplayName" and parent == "ServerConfiguration":
+            display_name = element.text or ""
+        elif tag == "Server" and parent == "PtConfigSet":
+            server_can = element.text
+        elif tag == "ServerConfiguration":
+            if "Hero" in display_name:
+                hero_circuits.update(server_circuits)
+            else:
+                other_server_circuits.update(server_circuits)
+
+        path.pop()
+        element.clear()
+
+    return ParsedBaseConfig(
+        raw=raw,
+        base_config_circuits=frozenset(base_config_circuits),
+        hero_circuits=frozenset(hero_circuits),
+        other_server_circuits=frozenset(other_server_circuits),
+        server_can=server_can,
+    )
+
+
+parsed_cache: OrderedDict[str, ParsedBaseConfig] = OrderedDict()
+parsed_cache_lock = Lock()
+
+
+def get_parsed_base_config(raw: bytes, file_hash: str) -> ParsedBaseConfig:
+    with parsed_cache_lock:
+        if file_hash in parsed_cache:
+            parsed_cache.move_to_end(file_hash)
+            return parsed_cache[file_hash]
+
+    parsed = parse_base_config(raw)
 
+    with parsed_cache_lock:
+        parsed_cache[file_hash] = parsed
+        while len(parsed_cache) > PARSED_CACHE_SIZE:
+            parsed_cache.popitem(last=False)
+    return parsed
+
+
+class BaseConfig:
     """
     Class Representing the Base Configuration loaded from the xml file.
+
+    The circuit lists are immutable and belong to this configuration only,
+    the parsed content is cached by the md5 of the file bytes.
     """
 
     def __init__(self, filename: str):
-        with open(filename, "r") as file:
-            self.filename = os.path.basename(filename)
-            file_content = file.read()
-            self.base_config = parse(file_content)
-            self.file_hash = hashlib.md5(file_content.encode()).hexdigest()
-
-            match = re.search(r"_(\d+)-", filename)
-            if match:
-                self.id = match.group(1)
-
-            if "BaseConfiguration" in self.base_config["PtConfigSet"]:
-                if "CircuitRef" in self.base_config["PtConfigSet"]["BaseConfiguration"]:
-                    for circuit in self.base_config["PtConfigSet"]["BaseConfiguration"][
-                        "CircuitRef"
-                    ]:
-                        self.base_config_circuits.append(circuit["#text"])
-
-            if (
-                "ServerConfiguration" in self.base_config["PtConfigSet"]
-                and type(self.base_config["PtConfigSet"]["ServerConfiguration"]) == list
-            ):
-                for server_config in self.base_config["PtConfigSet"][
-                    "ServerConfiguration"
-                ]:
-                    if "Hero" in server_config["DisplayName"]:
-                        if (
-                            "CircuitRef" in server_config
-                            and type(server_config["CircuitRef"]) == list
-                        ):
-                            for circuit in server_config["CircuitRef"]:
-                                self.hero_circuits.append(circuit["#text"])
-                        elif "CircuitRef" in server_config:
-                            self.hero_circuits.append(
-                                server_config["CircuitRef"]["#text"]
-                            )
-
-                        if (
-                            "CircuitRef" in server_config
-                            and type(server_config["CircuitRef"]) == list
-                        ):
-                            for circuit in server_config["CircuitRef"]:
-                                self.other_server_circuits.append(circuit["#text"])
-                        elif "CircuitRef" in server_config:
-                            self.other_server_circuits.append(
-                                server_config["CircuitRef"]["#text"]
-                            )
-
-            elif "ServerConfiguration" in self.base_config["PtConfigSet"]:
-                if (
-                    "Hero"
-                    in self.base_config["PtConfigSet"]["ServerConfiguration"][
-                        "DisplayName"
-                    ]
-                ):
-                    if (
-                        "CircuitRef"
-                        in self.base_config["PtConfigSet"]["ServerConfiguration"]
-                    ):
-                        for cicuit in self.base_config["PtConfigSet"][
-                            "ServerConfiguration"
-                        ]["CircuitRef"]:
-                            self.hero_circuits.append(cicuit["#text"])
-
-                else:
-                    if (
-                        "CircuitRef"
-                        in self.base_config["PtConfigSet"]["ServerConfiguration"]
-                    ):
-                        for cicuit in self.base_config["PtConfigSet"][
-                            "ServerConfiguration"
-                        ]["CircuitRef"]:
-                            self.other_server_circuits.append(cicuit["#text"])
-
-            if "Server" in self.base_config["PtConfigSet"]:
-                self.server_can = self.base_config["PtConfigSet"]["Server"]["#text"]
-        # remove duplicates
-        self.base_config_circuits = list(set(self.base_config_circuits))
-        self.other_server_circuits = list(set(self.other_server_circuits))
-        self.hero_circuits = list(set(self.hero_circuits))
+        with open(filename, "rb") as file:
+            raw = file.read()
+
+        self.filename = os.path.basename(filename)
+        self.file_hash = hashlib.md5(raw).hexdigest()
+        self.id = None
+        match = re.search(r"_(\d+)-", filename)
+        if match:
+            self.id = match.group(1)
+
+        self.parsed = get_parsed_base_config(raw, self.file_hash)
+        self.base_config_circuits = self.parsed.base_config_circuits
+        self.hero_circuits = self.parsed.hero_circuits
+        self.other_server_circuits = self.parsed.other_server_circuits
+        self.server_can = self.parsed.server_can
+
+    @property
+    def base_config(self) -> dict:
+        """A fresh dictionary of the xml, the exporter adds the new circuits to it."""
+        return parse(self.parsed.raw)
+
+
+def load_base_configs(
+    base_config_path: str, ecu_system_family: str, ecu_system_execution: str
+) -> list[BaseConfig]:
+    """Loads the base configurations in the folder which belong to the ECU system."""
+    base_configs = []
+    if not os.path.exists(base_config_path):
+        logger.info(
+            f"Could not find the specified path for base configurations: {base_config_path}"
+        )
+        return base_configs
+
+    for filename in os.listdir(base_config_path):
+        base_config = BaseConfig(f"{base_config_path}/{filename}")
+        current_server_config = get_system_config_using_server_can(
+            base_config.server_can
+        )
+
+        if current_server_config is not None:
+            if current_server_config.family != ecu_system_family:
+                logger.info(
+                    f"Skipping {filename} as it does not belong to the {ecu_system_family} family"
+                )
+                continue
+
+            if current_server_config.execution != ecu_system_execution:
+                logger.info(
+                    f"Skipping {filename} as it does not belong to the {ecu_system_execution} system"
+                )
+                continue
+
+        base_configs.append(base_config)
+    return base_configs
+
+
+def get_server_circuits(base_configs: list[BaseConfig]):
+    """
+    Returns the base configuration, hero and other server circuits of the
+    configurations, a circuit of a hero server is never an other server circuit.
+    """
+    base_config_circuits = frozenset().union(
+        *(base_config.base_config_circuits for base_config in base_configs)
+    )
+    hero_circuits = frozenset().union(
+        *(base_config.hero_circuits for base_config in base_configs)
+    )
+    other_server_circuits = (
+        frozenset().union(
+            *(base_config.other_server_circuits for base_config in base_configs)
+        )
+        - hero_circuits
+    )
+    return base_config_circuits, hero_circuits, other_server_circuits
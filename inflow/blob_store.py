@@ -0,0 +1,108 @@
+import hashlib
+import json
+import os
+import shutil
+import uuid
+
+from config import blob_store_path, archive_manifests_folder, input_manifest_name
+
+CHUNK_SIZE = 1024 * 1024
+
+
+class BlobStore:
+    """
+    Content addressed store for the uploaded input files.
+
+    Every file is stored once under its sha256 and linked into the input tree
+    of each inference version, so identical files uploaded for several
+    versions cost no extra disk space.
+    """
+
+    def __init__(self, root_path: str):
+        self.blobs_path = os.path.join(root_path, "blobs")
+        self.temporary_path = os.path.join(root_path, "tmp")
+
+    def get_blob_path(self, sha256: str):
+        return os.path.join(self.blobs_path, sha256[:2], sha256)
+
+    def put(self, fileobj):
+        """
+        Streams the file object into the store, returns its sha256, md5 and size.
+        Both hashes are computed in the same pass over the data.
+        """
+        sha256 = hashlib.sha256()
+        md5 = hashlib.md5()
+        size = 0
+
+        # the folders are created on first use, not when the module is imported
+        os.makedirs(self.temporary_path, exist_ok=True)
+        temporary_blob_path = os.path.join(self.temporary_path, str(uuid.uuid4()))
+        with open(temporary_blob_path, "wb") as file:
+            for chunk in iter(lambda: fileobj.read(CHUNK_SIZE), b""):
+                sha256.update(chunk)
+                md5.update(chunk)
+                size += len(chunk)
+                file.write(chunk)
+
+        blob_path = self.get_blob_path(sha256.hexdigest())
+        if os.path.exists(blob_path):
+            os.remove(temporary_blob_path)
+        else:
+            os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+            os.replace(temporary_blob_path, blob_path)
+
+        return {"sha256": sha256.hexdigest(), "md5": md5.hexdigest(), "size": size}
+
+    def link(self, sha256: str, destination: str):
+        """Hardlinks the blob to the destination, falls back to a copy across devices."""
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        if os.path.exists(destination):
+            os.remove(destination)
+        try:
+            os.link(self.get_blob_path(sha256), destination)
+        except OSError:
+            shutil.copy2(self.get_blob_path(sha256), destination)
+
+
+blob_store = BlobStore(blob_store_path)
+
+
+def get_input_manifest_path(inference_base_folder: str):
+    return os.path.join(
+        inference_base_folder, archive_manifests_folder, input_manifest_name
+    )
+
+
+def save_input_manifest(inference_base_folder: str, manifest: dict):
+    manifest_path = get_input_manifest_path(inference_base_folder)
+    os.makedirs(os.path.dirname(manifest_path), exist_ok=True)
+    with open(manifest_path, "w") as file:
+        json.dump(dict(sorted(manifest.items())), file, indent=2)
+
+
+def load_input_manifest(inference_base_folder: str):
+    """
+    Returns the manifest of the uploaded input files, keyed by the path
+    relative to the input folder, or an empty dictionary.
+    """
+    manifest_path = get_input_manifest_path(inference_base_folder)
+    if not os.path.exists(manifest_path):
+        return {}
+    with open(manifest_path, "r") as file:
+        return json.load(file)
+
+
+def get_input_file_hash(input_manifest: dict, folder: str, filename: str, path: str):
+    """
+    Returns the md5 of an input file from the manifest, the file is only read
+    when it was not uploaded through the blob store.
+    """
+    entry = input_manifest.get(f"{folder}/{filename}")
+    if entry is not None:
+        return entry["md5"]
+
+    md5 = hashlib.md5()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(CHUNK_SIZE), b""):
+            md5.update(chunk)
+    return md5.hexdigest()
@@ -0,0 +1,245 @@
+import re
+from functools import lru_cache
+
+import tiktoken
+
+from config import (
+    circuit_chunk_encoding,
+    circuit_chunk_max_tokens,
+    circuit_chunk_overlap_tokens,
+    circuit_legend_min_valid_ratio,
+)
+from graphs.circuit_extractor import Component
+
+# a legend designator, optionally several joined with a slash (C9, M59A, C14/C15)
+LEGEND_DESIGNATOR_REGEX = re.compile(r"^[A-Z]{1,3}\d{1,5}[A-Z]?(/[A-Z]{1,3}\d{1,5}[A-Z]?)*$")
+# the grid position of the component on the drawing (E 3, G2)
+LEGEND_POSITION_REGEX = re.compile(r"^[A-Z]\s?\d{1,2}$")
+# words on the same line differ by less than this many points in height
+ROW_TOLERANCE = 3
+# a larger vertical gap between two rows ends the legend
+LEGEND_MAX_ROW_GAP = 30
+
+
+@lru_cache(maxsize=None)
+def get_encoding(name: str = circuit_chunk_encoding):
+    return tiktoken.get_encoding(name)
+
+
+def count_tokens(text: str):
+    return len(get_encoding().encode(text, disallowed_special=()))
+
+
+def chunk_text(
+    text: str,
+    max_tokens: int = circuit_chunk_max_tokens,
+    overlap_tokens: int = circuit_chunk_overlap_tokens,
+):
+    """
+    Splits the text into overlapping windows of whole lines within the token budget.
+
+    A legend row spans several lines (designator, position, description), the
+    overlap makes sure a row cut at the end of a window is complete at the
+    start of the next one. A single line longer than the budget becomes a
+    window of its own.
+    """
+    lines = [line for line in text.splitlines() if line.strip()]
+    line_tokens = [count_tokens(line + "\n") for line in lines]
+
+    chunks = []
+    start = 0
+    while start < len(lines):
+        end = start
+        tokens = 0
+        while end < len(lines) and (end == start or tokens + line_tokens[end] <= max_tokens):
+            tokens += line_tokens[end]
+            end += 1
+
+        chunks.append("\n".join(lines[start:end]))
+        if end >= len(lines):
+            break
+
+        # step back over the last lines until the overlap budget is used
+        next_start = end
+        overlap = 0
+        while next_start - 1 > start and overlap + line_tokens[next_start - 1] <= overlap_tokens:
+            next_start -= 1
+            overlap += line_tokens[next_start]
+        start = next_start
+
+    return chunks
+
+
+def get_diagram_text(pages):
+    """Returns the text of the given pages of the circuit diagram."""
+    return "\n".join(page.get_text() or "" for page in pages)  # type: ignore
+
+
+def get_diagram_chunks(pages):
+    return chunk_text(get_diagram_text(pages))
+
+
+def is_legend_header(cells):
+    cells = [(cell or "").strip().lower() for cell in cells]
+    return (
+        any(cell.startswith("des") and cell != "description" for cell in cells)
+        and "description" in cells
+    )
+
+
+def get_legend_confidence(rows):
+    """Share of the legend rows with a valid designator and position."""
+    if not rows:
+        return 0.0
+    valid = sum(
+        1
+        for designator, position, _ in rows
+        if LEGEND_DESIGNATOR_REGEX.match(designator)
+        and LEGEND_POSITION_REGEX.match(position)
+    )
+    return valid / len(rows)
+
+
+def parse_tables(page):
+    """Legend rows of the tables PyMuPDF detects on the page."""
+    rows = []
+    for table in page.find_tables().tables:
+        cells = table.extract()
+        header_index = next(
+            (index for index, row in enumerate(cells) if is_legend_header(row)), None
+        )
+        if header_index is None:
+            continue
+
+        header = [(cell or "").strip().lower() for cell in cells[header_index]]
+        designator_column = next(
+            index
+            for index, cell in enumerate(header)
+            if cell.startswith("des") and cell != "description"
+        )
+        description_column = header.index("description")
+        position_column = next(
+            (index for index, cell in enumerate(header) if cell.startswith("pos")),
+            None,
+        )
+
+        for row in cells[header_index + 1 :]:
+            designator = (row[designator_column] or "").strip()
+            description = " ".join((row[description_column] or "").split())
+            position = (
+                (row[position_column] or "").strip()
+                if position_column is not None
+                else ""
+            )
+            if not designator and rows and description:
+                # the description continues on the next row of the table
+                rows[-1] = (rows[-1][0], rows[-1][1], f"{rows[-1][2]} {description}")
+            elif designator:
+                rows.append((designator, position, description))
+    return rows
+
+
+def group_words_by_line(words):
+    lines = []
+    for word in sorted(words, key=lambda word: (word[1], word[0])):
+        if lines and abs(lines[-1][0] - word[1]) <= ROW_TOLERANCE:
+            lines[-1][1].append(word)
+        else:
+            lines.append((word[1], [word]))
+    return [sorted(line, key=lambda word: word[0]) for _, line in lines]
+
+
+def parse_words(page):
+    """
+    Legend rows built from the word positions on the page.
+
+    Every "Des." header starts a legend, the x positions of the "Pos." and
+    "Description" headers split the words below it into columns. The legend
+    ends at the next header to the right.
+    """
+    words = page.get_text("words")
+    lines = group_words_by_line(words)
+
+    headers = []
+    for line in lines:
+        texts = [word[4].lower() for word in line]
+        for index, text in enumerate(texts):
+            if not text.startswith("des") or text.startswith("description"):
+                continue
+            following = line[index + 1 : index + 3]
+            if (
+                len(following) == 2
+                and following[0][4].lower().startswith("pos")
+                and following[1][4].lower().startswith("description")
+            ):
+                headers.append((line[index], following[0], following[1]))
+
+    rows = []
+    headers.sort(key=lambda header: header[0][0])
+    for header_index, (designator_word, position_word, description_word) in enumerate(headers):
+        left = designator_word[0] - ROW_TOLERANCE
+        right = (
+            headers[header_index + 1][0][0] - ROW_TOLERANCE
+            if header_index + 1 < len(headers)
+            else page.rect.width
+        )
+        legend_rows = []
+        last_row_top = designator_word[1]
+        for line in lines:
+            line = [
+                word
+                for word in line
+                if word[1] > designator_word[3] and left <= word[0] < right
+            ]
+            if not line:
+                continue
+            if line[0][1] - last_row_top > LEGEND_MAX_ROW_GAP:
+                break
+            last_row_top = line[0][1]
+
+            designator = " ".join(
+                word[4] for word in line if word[0] < position_word[0] - ROW_TOLERANCE
+            )
+            position = " ".join(
+                word[4]
+                for word in line
+                if position_word[0] - ROW_TOLERANCE <= word[0] < description_word[0] - ROW_TOLERANCE
+            )
+            description = " ".join(
+                word[4] for word in line if word[0] >= description_word[0] - ROW_TOLERANCE
+            )
+            if not designator and legend_rows and description:
+                legend_rows[-1] = (
+                    legend_rows[-1][0],
+                    legend_rows[-1][1],
+                    f"{legend_rows[-1][2]} {description}",
+                )
+            elif designator:
+                legend_rows.append((designator, position, description))
+        rows.extend(legend_rows)
+    return rows
+
+
+def parse_legend(page):
+    """
+    Returns the legend components of the page and whether the parse can be
+    trusted. The detected tables are tried first, then the word positions.
+    A parse is trusted when nearly every row has a valid designator and position.
+    """
+    best_rows = []
+    best_confidence = 0.0
+    for parser in (parse_tables, parse_words):
+        rows = parser(page)
+        confidence = get_legend_confidence(rows)
+        if confidence > best_confidence:
+            best_rows, best_confidence = rows, confidence
+        if best_rows and best_confidence >= circuit_legend_min_valid_ratio:
+            break
+
+    components = [
+        Component(name=designator, description=description)
+        for designator, _, description in best_rows
+        if LEGEND_DESIGNATOR_REGEX.match(designator)
+    ]
+    confident = bool(components) and best_confidence >= circuit_legend_min_valid_ratio
+    return components, confident
@@ -1,11 +1,17 @@
+import gzip
 import logging
-import io
 import os
+import queue
+import shutil
 import sys
-from logging.handlers import SysLogHandler
+from logging.handlers import (
+    QueueHandler,
+    QueueListener,
+    RotatingFileHandler,
+    SysLogHandler,
+)
 
-# Create a log capture buffer for audit logs
-log_capture = io.StringIO()
+from config import audit_log_max_bytes, audit_log_backup_count
 
 # Setup audit_logger
 audit_logger = logging.getLogger("audit_logger")
@@ -17,8 +23,10 @@ system_logger = logging.getLogger("system_logger")
 system_logger.setLevel(logging.DEBUG)
 system_logger.propagate = False  # Don't send logs to root logger
 
+# Formatter for audit logs
+audit_formatter = logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
+
 # Handlers for audit_logger
-audit_buffer_handler = None
 audit_console_handler = None
 
 
@@ -28,28 +36,20 @@ def setup_loggers(system_log_filename):
 
     :param system_log_filename: Path to the file where system logs should be written.
     """
-    global audit_buffer_handler, audit_console_handler
+    global audit_console_handler
 
     # === Audit Logger (like your original logger) ===
-    # Remove existing handlers to avoid duplicates
-    for handler in audit_logger.handlers[:]:
-        audit_logger.removeHandler(handler)
-
-    # Capture logs to in-memory buffer
-    audit_buffer_handler = logging.StreamHandler(log_capture)
-    audit_buffer_handler.setLevel(logging.DEBUG)
+    # Remove the console handler to avoid duplicates, the per inference
+    # sinks manage their own handlers
+    if audit_console_handler is not None:
+        audit_logger.removeHandler(audit_console_handler)
 
     # Print logs to stdout
     audit_console_handler = logging.StreamHandler(sys.stdout)
     audit_console_handler.setLevel(logging.DEBUG)
-
-    # Formatter for audit logs
-    formatter = logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
-    audit_buffer_handler.setFormatter(formatter)
-    audit_console_handler.setFormatter(formatter)
+    audit_console_handler.setFormatter(audit_formatter)
 
     # Add handlers to audit_logger
-    audit_logger.addHandler(audit_buffer_handler)
     audit_logger.addHandler(audit_console_handler)
 
     # === System Logger (logs to stdout and file) ===
@@ -83,22 +83,58 @@ def setup_loggers(system_log_filename):
     logging.getLogger("some_external_library").setLevel(logging.WARNING)
 
 
-def get_audit_log_messages():
-    """Retrieve logs from the audit capture buffer."""
-    return log_capture.getvalue()
-
+def compress_rotated_log(source, dest):
+    """Rotator for the audit log file, gzips the rotated file."""
+    with open(source, "rb") as source_file:
+        with gzip.open(dest, "wb") as dest_file:
+            shutil.copyfileobj(source_file, dest_file)
+    os.remove(source)
 
-def clear_audit_log_buffer():
-    """Clear the audit log buffer."""
-    log_capture.truncate(0)
-    log_capture.seek(0)
 
+class AuditLogSink:
+    """
+    Streams the audit log of a single inference to the output logs folder.
 
-def remove_audit_log_handlers():
-    """Remove audit log handlers to avoid duplicates."""
-    global audit_buffer_handler, audit_console_handler
-
-    for handler in audit_logger.handlers[:]:
-        audit_logger.removeHandler(handler)
+    Records are handed over to a QueueListener so worker threads never block on
+    file I/O, and the log file is rotated by size and compressed.
+    """
 
-    clear_audit_log_buffer()
+    def __init__(self, logs_output_path: str, filename: str = "process.log"):
+        os.makedirs(logs_output_path, exist_ok=True)
+        self.log_filename = os.path.join(logs_output_path, filename)
+
+        self.file_handler = RotatingFileHandler(
+            self.log_filename,
+            maxBytes=audit_log_max_bytes,
+            backupCount=audit_log_backup_count,
+            encoding="utf-8",
+        )
+        self.file_handler.setLevel(logging.DEBUG)
+        self.file_handler.setFormatter(audit_formatter)
+        self.file_handler.rotator = compress_rotated_log
+        self.file_handler.namer = lambda name: name + ".gz"
+
+        self.queue = queue.SimpleQueue()
+        self.queue_handler = QueueHandler(self.queue)
+        self.queue_handler.setLevel(logging.DEBUG)
+        self.listener = QueueListener(
+            self.queue, self.file_handler, respect_handler_level=True
+        )
+        self.started = False
+
+    def start(self):
+        """Attach the sink to the audit logger."""
+        if self.started:
+            return
+        self.listener.start()
+        audit_logger.addHandler(self.queue_handler)
+        self.started = True
+
+    def stop(self):
+        """Detach the sink, flush the pending records and close the log file."""
+        if not self.started:
+            return
+        audit_logger.removeHandler(self.queue_handler)
+        self.listener.stop()  # processes everything left in the queue
+        self.file_handler.close()
+        self.started = False
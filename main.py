@@ -1,23 +1,36 @@
-import hashlib
-import hmac
 import json
 import os
 import queue
 import shutil
 import threading
 import time
-from typing import List, Optional, Tuple, Union
+from typing import List, Optional, Union
 import traceback
 
-from fastapi import BackgroundTasks, FastAPI, HTTPException, Path, UploadFile, File
-from fastapi.responses import FileResponse
+from fastapi import (
+    BackgroundTasks,
+    FastAPI,
+    HTTPException,
+    Path,
+    Query,
+    UploadFile,
+    File,
+    Header,
+)
+from fastapi.responses import FileResponse, StreamingResponse
 from pydantic import BaseModel
-import requests
+from database.connection import get_async_driver, pool_metrics
 from database.models import Inference
 from models.input.physical_quantity import PhysicalQuantity
 from processor import Processor
+from progress import (
+    ProgressRecorder,
+    format_sse_event,
+    get_inference_messages,
+    get_message_count,
+    progress_broker,
+)
 from config import (
-    webhook_secret,
     data_root_folder,
     input_root_folder,
     circuit_diagrams_folder,
@@ -27,6 +40,8 @@ from config import (
     diagnostic_files_folder,
     base_configs_folder,
     root_archive_folder,
+    progress_page_size,
+    progress_keepalive_interval,
     system_config,
 )
 from database.database import (
@@ -34,11 +49,19 @@ from database.database import (
     save_ecu_family,
     store_physical_quantity
 )
+from inflow.blob_store import blob_store, save_input_manifest
+from outflow.webhook_outbox import webhook_outbox
 from processors.physical_quantity_writer import load_physical_quantities_from_folder
 # from processors.diagnostic_processor import build_ptiolist_from_files
 app = FastAPI()
 
 
+@app.on_event("startup")
+def start_webhook_outbox():
+    """Start delivering the queued webhooks, including the ones of a previous run."""
+    webhook_outbox.start()
+
+
 class Payload(BaseModel):
     ecu: str
 
@@ -56,57 +79,22 @@ class InferenceModel(BaseModel):
     version: int
     status: str
     messages: List[str] = []
+    message_count: int = 0
+    progress: dict = {}
 
 
-def send_signed_webhook(
-    url: str,
-    data: dict,
-    files: Optional[List[Tuple[str, Tuple[str, bytes, str]]]] = None,
-):
-    payload_bytes = json.dumps(data).encode()
-    signature = hmac.new(
-        webhook_secret.encode(), payload_bytes, hashlib.sha256
-    ).hexdigest()
-
-    if files:
-        multipart_data = []
-
-        # Add JSON fields as form fields
-        for key, value in data.items():
-            multipart_data.append((key, (None, str(value), "text/plain")))
-
-        # Add files - all under "files"
-        for field_name, file_tuple in files:
-            multipart_data.append(
-                ("files", file_tuple)
-            )  # Key must match FastAPI expectation
-
-        headers = {
-            "X-Signature": signature,
-        }
-
-        print(
-            f"Sending webhook (multipart) to {url} with data {data} and signature {signature}"
-        )
-        return requests.post(url, headers=headers, files=multipart_data)
+class InferenceMessagesModel(BaseModel):
+    """a page of the messages of an inference."""
 
-    else:
-        headers = {
-            "Content-Type": "application/json",
-            "X-Signature": signature,
-        }
-        return requests.post(url, headers=headers, data=payload_bytes)
+    total: int
+    offset: int
+    limit: int
+    messages: List[str] = []
 
 
 def event_generator(queue: queue.Queue, inference: Inference):
-    """Generator that yields events from the queue in SSE format."""
-    while True:
-        data = queue.get()  # Wait for an update from the queue
-        if data is not None:
-            inference.messages.append(data)  # type: ignore
-            inference.save()  # Call directly, no need for await
-        if data is None:
-            break
+    """Consumes the update queue and persists the messages in batches."""
+    ProgressRecorder(inference).consume(queue)
 
 
 def producer(processor: Processor, queue: queue.Queue):
@@ -137,15 +125,22 @@ def perform_inference(inference: Inference):
         (item for item in system_config if item.execution == inference.ecu), None
     )
     if not ecu_config:
+        progress_broker.close(str(inference.uid))
         raise HTTPException(status_code=400, detail="ECU not found")
 
-    processor = Processor(
-        ecu_system_execution=str(inference.ecu),
-        ecu_system_family=ecu_config.family,
-        server_can=ecu_config.server_can,
-        update_queue=update_queue,
-        inference=inference,
-    )
+    # subscribers can follow the inference while the processor is being built
+    progress_broker.open(str(inference.uid))
+    try:
+        processor = Processor(
+            ecu_system_execution=str(inference.ecu),
+            ecu_system_family=ecu_config.family,
+            server_can=ecu_config.server_can,
+            update_queue=update_queue,
+            inference=inference,
+        )
+    except Exception:
+        progress_broker.close(str(inference.uid))
+        raise
 
     # Start producer in background thread
     producer_thread = threading.Thread(target=producer, args=(processor, update_queue))
@@ -154,8 +149,12 @@ def perform_inference(inference: Inference):
     # Process events in the main thread
     event_generator(update_queue, inference)
 
-    # read the input and output zip files and send them to the webhook
-    files = []
+    # Ensure producer thread has finished before the archives are collected
+    producer_thread.join()
+
+    # queue the input and output zip files for the webhook, the outbox
+    # streams them to the receiver in the background
+    file_paths = []
     for root, _, filenames in os.walk(
         os.path.join(
             data_root_folder,
@@ -165,29 +164,18 @@ def perform_inference(inference: Inference):
         )
     ):
         for filename in filenames:
-            file_path = os.path.join(root, filename)
-            files.append(
-                (
-                    # use output form output.zip and input from input.zip
-                    filename,
-                    (filename, open(file_path, "rb"), "application/octet-stream"),
-                )
-            )
-
-    response = send_signed_webhook(
+            file_paths.append(os.path.join(root, filename))
+
+    webhook_outbox.enqueue(
         str(inference.webhook_url),
         data={
             "ecu": inference.ecu,
             "version": inference.version,
             "status": inference.STATUSES[str(inference.status)],
         },
-        files=files,
+        file_paths=file_paths,
     )
 
-    print(response.status_code, response.text)
-    # Ensure producer thread has finished
-    producer_thread.join()
-
 
 @app.post("/{ecu}/inferences/", response_model=InferenceModel)
 def create_inference(
@@ -261,22 +249,26 @@ def upload_inference_files(
             shutil.rmtree(base_inference_folder)
 
         os.makedirs(data_folder, exist_ok=True)
+        input_manifest = {}
 
         def save_uploaded(files: Optional[List[UploadFile]], subdir: str):
             if not files:
                 return
             for f in files:
                 if f.filename:
-                    dst = os.path.join(data_folder, subdir, f.filename)
-                    os.makedirs(os.path.dirname(dst), exist_ok=True)
-                    with open(dst, "wb") as fh:
-                        fh.write(f.file.read())
+                    # store the content once and link it into this version
+                    entry = blob_store.put(f.file)
+                    blob_store.link(
+                        entry["sha256"], os.path.join(data_folder, subdir, f.filename)
+                    )
+                    input_manifest[f"{subdir}/{f.filename}"] = entry
         save_uploaded(system_descriptions, system_descriptions_folder)
         save_uploaded(configuration_files, base_configs_folder)
         save_uploaded(dtc_specifications, dtc_specifications_folder)
         save_uploaded(circuit_diagrams, circuit_diagrams_folder)
         save_uploaded(ios, io_lists_folder)
-        save_uploaded(diagnostic_files, diagnostic_files_folder)                   
+        save_uploaded(diagnostic_files, diagnostic_files_folder)
+        save_input_manifest(base_inference_folder, input_manifest)
      
         if function_parameters:
             for file in function_parameters:
@@ -325,6 +317,8 @@ def run_inference(ecu: str, version: int, background_tasks: BackgroundTasks):
     if not inference:
         return {"message": "Inference not found"}
 
+    # open the progress channel now, the background task may start later
+    progress_broker.open(str(inference.uid))
     # start the inference in the background
     background_tasks.add_task(perform_inference, inference)
 
@@ -355,13 +349,102 @@ def get_inference(ecu: str, version: int):
     inference = Inference.nodes.get_or_none(ecu=ecu, version=version)
     if not inference:
         return {"message": "Inference not found"}
+
+    # only the latest page of messages, the full log is served by /messages
+    message_count = get_message_count(inference)
+    messages = get_inference_messages(
+        inference, max(0, message_count - progress_page_size), progress_page_size
+    )
     return {
         "ecu": inference.ecu,
         "version": inference.version,
         "status": inference.STATUSES[inference.status],
-        "messages": inference.messages,
+        "messages": [message["message"] for message in messages],
+        "message_count": message_count,
+        "progress": inference.progress or {},
+    }
+
+
+@app.get(
+    "/{ecu}/inferences/{version}/messages",
+    response_model=Union[InferenceMessagesModel, dict],
+)
+def get_inference_messages_page(
+    ecu: str,
+    version: int,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(progress_page_size, ge=1, le=1000),
+):
+    """Get a page of the messages of a specific inference."""
+
+    inference = Inference.nodes.get_or_none(ecu=ecu, version=version)
+    if not inference:
+        return {"message": "Inference not found"}
+    messages = get_inference_messages(inference, offset, limit)
+    return {
+        "total": get_message_count(inference),
+        "offset": offset,
+        "limit": limit,
+        "messages": [message["message"] for message in messages],
     }
 
+@app.get("/{ecu}/inferences/{version}/events")
+def stream_inference_events(
+    ecu: str,
+    version: int,
+    last_event_id: Optional[str] = Header(None),
+):
+    """Stream the progress events of a specific inference as Server-Sent Events."""
+
+    inference = Inference.nodes.get_or_none(ecu=ecu, version=version)
+    if not inference:
+        raise HTTPException(status_code=404, detail="Inference not found")
+
+    resume_from = None
+    if last_event_id is not None and last_event_id.isdigit():
+        resume_from = int(last_event_id)
+
+    subscription = progress_broker.subscribe(str(inference.uid), resume_from)
+
+    def end_event():
+        inference.refresh()
+        data = {
+            "status": inference.STATUSES[inference.status],
+            "progress": inference.progress or {},
+        }
+        return f"event: end\ndata: {json.dumps(data)}\n\n"
+
+    def event_stream():
+        # the inference is not running in this process, send its final state
+        if subscription is None:
+            yield end_event()
+            return
+
+        backlog, subscriber = subscription
+        try:
+            for event in backlog:
+                yield format_sse_event(event)
+            while True:
+                try:
+                    event = subscriber.get(timeout=progress_keepalive_interval)
+                except queue.Empty:
+                    yield ": keep-alive\n\n"
+                    continue
+                if event is None:
+                    break
+                yield format_sse_event(event)
+        finally:
+            progress_broker.unsubscribe(str(inference.uid), subscriber)
+
+        yield end_event()
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @app.post("/upload-physical-quantities-knowledgebase/")
 def bulk_upload():
     quantities = load_physical_quantities_from_folder()
@@ -422,8 +505,15 @@ async def download_inference_result(ecu: str, version: str):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 @app.get("/health")
-def health():
-    return {"status": "ok"}
+async def health():
+    try:
+        async with get_async_driver().session() as session:
+            result = await session.run("RETURN 1 AS ok")
+            await result.consume()
+        neo4j_status = "ok"
+    except Exception as e:
+        neo4j_status = f"unavailable: {e}"
+    return {"status": "ok", "neo4j": neo4j_status, "neo4j_pool": pool_metrics.snapshot()}
 
 
 if __name__ == "__main__":
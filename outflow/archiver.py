@@ -0,0 +1,128 @@
+import json
+import os
+import shutil
+import zipfile
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import xxhash
+
+from logger import system_logger
+
+# members with these extensions are already compressed, deflating them again
+# costs a lot of time for next to no size reduction
+STORED_EXTENSIONS = {
+    ".pdf",
+    ".zip",
+    ".gz",
+    ".zst",
+    ".png",
+    ".jpg",
+    ".jpeg",
+    ".xlsx",
+    ".docx",
+}
+
+archive_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="archiver")
+
+
+def hash_file(path: str):
+    hasher = xxhash.xxh3_128()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(1024 * 1024), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def build_manifest(source_folder: str):
+    """
+    Returns a dictionary of archive member name to content hash and size for
+    every file below the source folder.
+    """
+    manifest = {}
+    for root, _, filenames in os.walk(source_folder):
+        for filename in sorted(filenames):
+            path = os.path.join(root, filename)
+            name = os.path.relpath(path, source_folder).replace(os.sep, "/")
+            manifest[name] = {
+                "hash": hash_file(path),
+                "size": os.path.getsize(path),
+            }
+    return dict(sorted(manifest.items()))
+
+
+def load_manifest(manifest_path: str):
+    if not os.path.exists(manifest_path):
+        return None
+    with open(manifest_path, "r") as file:
+        return json.load(file)
+
+
+def get_compress_type(name: str):
+    if os.path.splitext(name)[1].lower() in STORED_EXTENSIONS:
+        return zipfile.ZIP_STORED
+    return zipfile.ZIP_DEFLATED
+
+
+def archive_folder(
+    source_folder: str,
+    archive_path: str,
+    manifest_path: str,
+    previous_archives: list[tuple[str, str]] | None = None,
+):
+    """
+    Zips the source folder into archive_path and writes its manifest.
+
+    If one of the previous (archive, manifest) pairs has the same manifest the
+    previous archive is linked instead of compressing the files again.
+    Already compressed files are stored, everything else is deflated.
+    """
+    os.makedirs(os.path.dirname(archive_path), exist_ok=True)
+    os.makedirs(os.path.dirname(manifest_path), exist_ok=True)
+
+    manifest = build_manifest(source_folder)
+
+    for previous_archive_path, previous_manifest_path in previous_archives or []:
+        if not os.path.exists(previous_archive_path):
+            continue
+        if load_manifest(previous_manifest_path) != manifest:
+            continue
+
+        system_logger.info(
+            f"Reusing {previous_archive_path} for {archive_path}, the content is unchanged"
+        )
+        if os.path.exists(archive_path):
+            os.remove(archive_path)
+        try:
+            os.link(previous_archive_path, archive_path)
+        except OSError:
+            shutil.copy2(previous_archive_path, archive_path)
+        break
+    else:
+        temporary_archive_path = f"{archive_path}.tmp"
+        with zipfile.ZipFile(
+            temporary_archive_path, "w", compresslevel=1, allowZip64=True
+        ) as archive:
+            for name in manifest:
+                archive.write(
+                    os.path.join(source_folder, name),
+                    name,
+                    compress_type=get_compress_type(name),
+                )
+        os.replace(temporary_archive_path, archive_path)
+
+    with open(manifest_path, "w") as file:
+        json.dump(manifest, file, indent=2)
+
+    return archive_path
+
+
+def archive_folder_async(
+    source_folder: str,
+    archive_path: str,
+    manifest_path: str,
+    previous_archives: list[tuple[str, str]] | None = None,
+) -> Future:
+    """Runs archive_folder in the background archiver thread pool."""
+    return archive_executor.submit(
+        archive_folder, source_folder, archive_path, manifest_path, previous_archives
+    )
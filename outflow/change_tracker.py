@@ -0,0 +1,103 @@
+import json
+import os
+from threading import Lock
+
+import xxhash
+
+from database.database import (
+    driver,
+    get_artifact_fingerprints,
+    save_artifact_fingerprints,
+)
+from logger import audit_logger as logger
+
+ADDED = "added"
+CHANGED = "changed"
+UNCHANGED = "unchanged"
+
+
+class ChangeTracker:
+    """
+    Writes exported artifacts only when their content changed.
+
+    The fingerprint of every written artifact is stored in Neo4j per ECU
+    system and path relative to the output folder. A rendered artifact with
+    the fingerprint of the last export is not written again when it is
+    already in the output folder, and every decision is listed in the change
+    manifest of the inference.
+    """
+
+    def __init__(self, base_output_path: str, ecu_system: str):
+        self.base_output_path = base_output_path
+        self.ecu_system = ecu_system
+        self.lock = Lock()
+        self.fingerprints = None
+        self.pending = {}
+        self.changes = {ADDED: [], CHANGED: [], UNCHANGED: []}
+
+    def load(self):
+        with self.lock:
+            if self.fingerprints is None:
+                with driver.session() as session:
+                    self.fingerprints = session.execute_read(
+                        get_artifact_fingerprints, self.ecu_system
+                    )
+            return self.fingerprints
+
+    def write(self, path: str, content: str | bytes):
+        """Writes the artifact unless it is unchanged and already written, returns whether it was written."""
+        data = content.encode() if isinstance(content, str) else content
+        fingerprint = xxhash.xxh3_128_hexdigest(data)
+        relative_path = os.path.relpath(path, self.base_output_path).replace(os.sep, "/")
+        previous_fingerprint = self.load().get(relative_path)
+
+        unchanged = previous_fingerprint == fingerprint
+        if unchanged and os.path.exists(path):
+            with self.lock:
+                self.changes[UNCHANGED].append(relative_path)
+            logger.info(f"{relative_path} is unchanged since the last export, skipping")
+            return False
+
+        # a new version starts with an empty output folder, unchanged artifacts
+        # are still written there so the delivered output is complete
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as file:
+            file.write(data)
+
+        with self.lock:
+            if unchanged:
+                self.changes[UNCHANGED].append(relative_path)
+                return True
+            self.fingerprints[relative_path] = fingerprint
+            self.pending[relative_path] = fingerprint
+            self.changes[ADDED if previous_fingerprint is None else CHANGED].append(
+                relative_path
+            )
+        return True
+
+    def flush(self):
+        """Stores the fingerprints of the artifacts written since the last flush."""
+        with self.lock:
+            rows = [
+                {"path": path, "fingerprint": fingerprint}
+                for path, fingerprint in self.pending.items()
+            ]
+        if not rows:
+            return
+
+        with driver.session() as session:
+            session.execute_write(save_artifact_fingerprints, rows, self.ecu_system)
+        with self.lock:
+            for row in rows:
+                if self.pending.get(row["path"]) == row["fingerprint"]:
+                    del self.pending[row["path"]]
+
+    def write_manifest(self, manifest_path: str):
+        with self.lock:
+            changes = {kind: sorted(paths) for kind, paths in self.changes.items()}
+        os.makedirs(os.path.dirname(manifest_path), exist_ok=True)
+        with open(manifest_path, "w") as file:
+            json.dump(changes, file, indent=2)
+        logger.info(
+            f"Export changes: {len(changes[ADDED])} added, {len(changes[CHANGED])} changed, {len(changes[UNCHANGED])} unchanged"
+        )
@@ -16,14 +16,17 @@ from logger import audit_logger as logger
 from database.database import get_component, mark_component_as_exported, driver
 from database.models import PtComponentNode, Inference
 from models.output.pt_component import PtComponent, NamePresentation
+from outflow.change_tracker import ChangeTracker
+from state import ComponentRecord
 from pydantic_xml import BaseXmlModel, attr, element
 
 
 class DataExporter:
     """Class to export the data to the xml files."""
 
-    def __init__(self, base_output_path):
+    def __init__(self, base_output_path, change_tracker: ChangeTracker | None = None):
         self.base_output_path = base_output_path
+        self.change_tracker = change_tracker
         self.circuit_config_output_path = os.path.join(
             base_output_path, circuit_configs_output_folder
         )
@@ -43,8 +46,24 @@ class DataExporter:
         os.makedirs(self.base_config_output_path, exist_ok=True)
         os.makedirs(self.logs_output_path, exist_ok=True)
 
+    def write_artifact(self, path: str, content: str | bytes) -> bool:
+        """
+        Writes an exported file, through the change tracker when there is one
+        so unchanged artifacts are not written again. Returns whether it was written.
+        """
+        if self.change_tracker is not None:
+            return self.change_tracker.write(path, content)
+
+        with open(path, "wb" if isinstance(content, bytes) else "w") as file:
+            file.write(content)
+        return True
+
     def export_component_config(
-        self, component: str, details: dict, meta_config: dict, inference: Inference
+        self,
+        component: str,
+        details: ComponentRecord,
+        meta_config: dict,
+        inference: Inference,
     ) -> None:
         """
         Export the component configuration to the xml file.
@@ -95,7 +114,7 @@ class DataExporter:
             pt_component_model = PtComponent(
                 name=component,
                 namePresentation=NamePresentation(
-                    value=details["description"],
+                    value=details.description,
                     edt="nfTxt",
                 ),
             )
@@ -117,15 +136,15 @@ class DataExporter:
             # create the pt_component folder if it does not exist
             os.makedirs(os.path.dirname(pt_component_path), exist_ok=True)
 
-            with open(pt_component_path, "wb") as file:
-                file.write(
-                    pt_component_model.to_xml(
-                        pretty_print=True, encoding="UTF-8", xml_declaration=True
-                    )  # type: ignore
-                )
+            self.write_artifact(
+                pt_component_path,
+                pt_component_model.to_xml(
+                    pretty_print=True, encoding="UTF-8", xml_declaration=True
+                ),  # type: ignore
+            )
 
     def export_connector_component_config(
-        self, component: str, details: dict, meta_config: dict
+        self, component: str, details: ComponentRecord, meta_config: dict
     ) -> None:
         """
         Export the connector component configuration to the xml file.
@@ -147,33 +166,33 @@ class DataExporter:
         ]
         base_config["PtCircuit"]["ServerExecution"]["#text"] = meta_config["server_can"]
 
-        if "more_description" in details and details["more_description"] != "":
+        if details.more_description:
             base_config["PtCircuit"]["ShortFunctionDescription"] = {
-                "#text": details["more_description"],
+                "#text": details.more_description,
                 "@edt": "nfTxt",
             }
 
-        if "purpose" in details and details["purpose"] != "":
+        if details.purpose:
             base_config["PtCircuit"]["Purpose"] = {
-                "#text": details["purpose"],
+                "#text": details.purpose,
                 "@edt": "fTxt",
             }
 
         base_config["PtCircuit"]["NamePresentation"][
             "#text"
-        ] = f"{component}, {details['description']}"
+        ] = f"{component}, {details.description}"
 
         base_config["PtCircuit"]["MainComponent"]["Connector"]["#text"] = component
 
         # Add the IO Mapping
-        if "io" in details:
+        if details.ios:
             if "IO" not in base_config["PtCircuit"]:
                 base_config["PtCircuit"]["IO"] = []
-            for io_mapping in details["io"]:
+            for io_mapping in details.ios:
                 base_config["PtCircuit"]["IO"].append(
                     {
                         "@ref": "IO",
-                        "#text": io_mapping["Name"],
+                        "#text": io_mapping.name,
                     }
                 )
 
@@ -212,16 +231,16 @@ class DataExporter:
                     base_config = existing_config
 
         # write the updated template to the xml file
-        with open(
-            f"{self.circuit_config_output_path}/PtCircuit_{component}.xml", "w"
-        ) as file:
-            file.write(unparse(base_config, pretty=True))
+        if self.write_artifact(
+            f"{self.circuit_config_output_path}/PtCircuit_{component}.xml",
+            unparse(base_config, pretty=True),
+        ):
             logger.info(
                 f"Exported the configuration for the connector component {component}"
             )
 
     def export_normal_component_config(
-        self, component: str, details: dict, meta_config: dict
+        self, component: str, details: ComponentRecord, meta_config: dict
     ) -> None:
         """
         Export the normal component configuration to the xml file.
@@ -235,7 +254,7 @@ class DataExporter:
 
         # update the template with the component details
         base_config["PtCircuit"]["Name"] = component
-        base_config["PtCircuit"]["NamePresentation"]["#text"] = details["description"]
+        base_config["PtCircuit"]["NamePresentation"]["#text"] = details.description
 
         base_config["PtCircuit"]["EcuSystemFamily"]["#text"] = meta_config[
             "ecu_system_family"
@@ -247,27 +266,27 @@ class DataExporter:
 
         base_config["PtCircuit"]["MainComponent"]["Component"]["#text"] = component
 
-        if "more_description" in details and details["more_description"] != "":
+        if details.more_description:
             base_config["PtCircuit"]["ShortFunctionDescription"] = {
-                "#text": details["more_description"],
+                "#text": details.more_description,
                 "@edt": "nfTxt",
             }
 
-        if "purpose" in details and details["purpose"] != "":
+        if details.purpose:
             base_config["PtCircuit"]["Purpose"] = {
-                "#text": details["purpose"],
+                "#text": details.purpose,
                 "@edt": "fTxt",
             }
         # Add the IO Mapping
-        if "io" in details:
-            for io_mapping in details["io"]:
+        if details.ios:
+            for io_mapping in details.ios:
                 if "IO" not in base_config["PtCircuit"]:
                     base_config["PtCircuit"]["IO"] = []
 
                 base_config["PtCircuit"]["IO"].append(
                     {
                         "@ref": "IO",
-                        "#text": io_mapping["Name"],
+                        "#text": io_mapping.name,
                     }
                 )
 
@@ -305,10 +324,10 @@ class DataExporter:
                     base_config = existing_config
 
         # write the updated template to the xml file
-        with open(
-            f"{self.circuit_config_output_path}/PtCircuit_{component}.xml", "w"
-        ) as file:
-            file.write(unparse(base_config, pretty=True))
+        if self.write_artifact(
+            f"{self.circuit_config_output_path}/PtCircuit_{component}.xml",
+            unparse(base_config, pretty=True),
+        ):
             logger.info(
                 f"Exported the configuration for the normal component {component}"
             )
@@ -352,10 +371,10 @@ class DataExporter:
         ]
 
         # write the updated template to the xml file
-        with open(
-            f"{self.dtc_relation_output_path}/PtDtcRelation_{dtc}.xml", "w"
-        ) as file:
-            file.write(unparse(base_config, pretty=True))
+        if self.write_artifact(
+            f"{self.dtc_relation_output_path}/PtDtcRelation_{dtc}.xml",
+            unparse(base_config, pretty=True),
+        ):
             logger.info(f"Exported the DTC relation for the DTC {dtc}")
 
     def export_base_config(self, base_config: BaseConfig, components: dict) -> None:
@@ -482,8 +501,8 @@ class DataExporter:
             os.makedirs(self.base_config_output_path)
 
         # write the updated template to the xml file
-        with open(
-            f"{self.base_config_output_path}/{base_config.filename}", "w"
-        ) as file:
-            file.write(unparse(base_config_new, pretty=True))
+        if self.write_artifact(
+            f"{self.base_config_output_path}/{base_config.filename}",
+            unparse(base_config_new, pretty=True),
+        ):
             logger.info("Exported the base configuration")
@@ -0,0 +1,201 @@
+import hashlib
+import hmac
+import json
+import os
+import random
+import threading
+import time
+import uuid
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests_toolbelt.multipart.encoder import MultipartEncoder
+
+from config import (
+    webhook_secret,
+    webhook_outbox_path,
+    webhook_max_attempts,
+    webhook_backoff_base,
+    webhook_backoff_max,
+    webhook_connect_timeout,
+    webhook_read_timeout,
+)
+from logger import system_logger
+
+PENDING_FOLDER = "pending"
+DELIVERED_FOLDER = "delivered"
+FAILED_FOLDER = "failed"
+
+
+class WebhookOutbox:
+    """
+    Durable outbox for the signed inference webhooks.
+
+    Deliveries are written to disk when they are enqueued and sent by a
+    background worker, the archives are streamed from disk with a multipart
+    encoder. Failed deliveries are retried with exponential backoff and
+    pending deliveries survive a restart of the service.
+    """
+
+    def __init__(self, outbox_path: str, secret: str):
+        self.outbox_path = outbox_path
+        self.secret = secret
+        self.wakeup = threading.Event()
+        self.lock = threading.Lock()
+        self.worker = None
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=8)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def sign(self, data: dict):
+        payload_bytes = json.dumps(data).encode()
+        return hmac.new(self.secret.encode(), payload_bytes, hashlib.sha256).hexdigest()
+
+    def get_delivery_path(self, folder: str, delivery_id: str):
+        return os.path.join(self.outbox_path, folder, f"{delivery_id}.json")
+
+    def write_delivery(self, folder: str, delivery: dict):
+        path = self.get_delivery_path(folder, delivery["id"])
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # write to a temporary file first so a crash never leaves a partial delivery
+        with open(f"{path}.tmp", "w") as file:
+            json.dump(delivery, file)
+        os.replace(f"{path}.tmp", path)
+
+    def move_delivery(self, delivery: dict, folder: str):
+        self.write_delivery(folder, delivery)
+        os.remove(self.get_delivery_path(PENDING_FOLDER, delivery["id"]))
+
+    def enqueue(self, url: str, data: dict, file_paths: list[str]):
+        """
+        Persists a delivery and wakes up the worker, returns the delivery id.
+        The signature is computed once here and reused for every attempt.
+        """
+        delivery = {
+            "id": str(uuid.uuid4()),
+            "url": url,
+            "data": data,
+            "files": file_paths,
+            "signature": self.sign(data),
+            "attempts": 0,
+            "next_attempt_at": time.time(),
+            "created_at": time.time(),
+            "last_error": None,
+        }
+        self.write_delivery(PENDING_FOLDER, delivery)
+        system_logger.info(f"Queued webhook {delivery['id']} to {url}")
+        self.wakeup.set()
+        return delivery["id"]
+
+    def start(self):
+        """Starts the background worker, pending deliveries from a previous run are resumed."""
+        with self.lock:
+            if self.worker is not None and self.worker.is_alive():
+                return
+            for folder in (PENDING_FOLDER, DELIVERED_FOLDER, FAILED_FOLDER):
+                os.makedirs(os.path.join(self.outbox_path, folder), exist_ok=True)
+            self.worker = threading.Thread(
+                target=self.run, name="webhook-outbox", daemon=True
+            )
+            self.worker.start()
+
+    def load_pending(self):
+        deliveries = []
+        pending_path = os.path.join(self.outbox_path, PENDING_FOLDER)
+        for filename in os.listdir(pending_path):
+            if not filename.endswith(".json"):
+                continue
+            with open(os.path.join(pending_path, filename), "r") as file:
+                deliveries.append(json.load(file))
+        return sorted(deliveries, key=lambda delivery: delivery["next_attempt_at"])
+
+    def run(self):
+        while True:
+            self.wakeup.clear()
+            next_attempt_at = None
+            for delivery in self.load_pending():
+                if delivery["next_attempt_at"] > time.time():
+                    next_attempt_at = delivery["next_attempt_at"]
+                    break
+                try:
+                    self.deliver(delivery)
+                except Exception as e:
+                    system_logger.error(f"Webhook {delivery['id']} crashed: {e}")
+
+            timeout = webhook_backoff_max
+            if next_attempt_at is not None:
+                timeout = max(0.0, next_attempt_at - time.time())
+            self.wakeup.wait(timeout)
+
+    def deliver(self, delivery: dict):
+        delivery["attempts"] += 1
+
+        files = []
+        try:
+            fields = [(key, str(value)) for key, value in delivery["data"].items()]
+            for file_path in delivery["files"]:
+                file = open(file_path, "rb")
+                files.append(file)
+                fields.append(
+                    (
+                        "files",  # Key must match FastAPI expectation
+                        (os.path.basename(file_path), file, "application/octet-stream"),
+                    )
+                )
+
+            encoder = MultipartEncoder(fields=fields)
+            response = self.session.post(
+                delivery["url"],
+                data=encoder,
+                headers={
+                    "Content-Type": encoder.content_type,
+                    "X-Signature": delivery["signature"],
+                },
+                timeout=(webhook_connect_timeout, webhook_read_timeout),
+            )
+            response.raise_for_status()
+
+        except FileNotFoundError as e:
+            # the archive is gone, retrying will not help
+            delivery["last_error"] = str(e)
+            system_logger.error(f"Webhook {delivery['id']} failed: {e}")
+            self.move_delivery(delivery, FAILED_FOLDER)
+            return
+
+        except Exception as e:
+            # network errors as well as unreadable archives or encoding errors,
+            # every failed attempt counts towards webhook_max_attempts
+            delivery["last_error"] = str(e)
+            if delivery["attempts"] >= webhook_max_attempts:
+                system_logger.error(
+                    f"Webhook {delivery['id']} failed after {delivery['attempts']} attempts: {e}"
+                )
+                self.move_delivery(delivery, FAILED_FOLDER)
+                return
+
+            backoff = min(
+                webhook_backoff_max,
+                webhook_backoff_base * 2 ** (delivery["attempts"] - 1),
+            )
+            delivery["next_attempt_at"] = time.time() + backoff * random.uniform(
+                0.8, 1.2
+            )
+            system_logger.info(
+                f"Webhook {delivery['id']} attempt {delivery['attempts']} failed, retrying in {backoff:.0f}s: {e}"
+            )
+            self.write_delivery(PENDING_FOLDER, delivery)
+            return
+
+        finally:
+            for file in files:
+                file.close()
+
+        system_logger.info(
+            f"Webhook {delivery['id']} delivered to {delivery['url']}: {response.status_code}"
+        )
+        self.move_delivery(delivery, DELIVERED_FOLDER)
+
+
+webhook_outbox = WebhookOutbox(webhook_outbox_path, webhook_secret)
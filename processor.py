@@ -1,3 +1,4 @@
+from concurrent.futures import Future
 import os
 from queue import Queue
 import threading
@@ -7,15 +8,20 @@ from typing import Literal, cast
 from database.models import Inference
 from exporters.export_circuit_data import export_circuit_data
 from exporters.export_dtc_data import export_dtc_data
+from database.connection import pool_metrics
+from graphs.prompts import get_prompt_usage, log_prompt_usage
+from inflow.blob_store import load_input_manifest
+from outflow.archiver import archive_folder_async
+from outflow.change_tracker import ChangeTracker
 from outflow.exporter import DataExporter
-import shutil
 
 
-from inflow.base_config import BaseConfig  # imports the pymupdf library
+from inflow.base_config import get_server_circuits, load_base_configs
 from database.database import (
     driver,
     get_all_components,
     get_app_state,
+    get_component_filter,
     get_dtc_with_components,
 )  # imports the driver from the database module
 
@@ -24,8 +30,7 @@ import os
 from logger import (
     system_logger,
     audit_logger as logger,
-    get_audit_log_messages as get_log_messages,
-    remove_audit_log_handlers as remove_log_handlers,
+    AuditLogSink,
     setup_loggers,
 )
 from langgraph.graph import StateGraph, START, END
@@ -44,9 +49,6 @@ from processors.io_mapping_processor import process_io_mapping
 from processors.system_information_processor import process_system_information
 from state import State
 
-from utils import (
-    get_system_config_using_server_can,
-)
 from config import (
     data_root_folder,
     input_root_folder,
@@ -55,6 +57,8 @@ from config import (
     output_root_folder,
     logs_output_folder,
     root_archive_folder,
+    archive_manifests_folder,
+    change_manifest_name,
     input_archive_name,
     output_archive_name,
     system_config,
@@ -64,12 +68,13 @@ from state import State
 
 class Processor:
 
-    # Lock for thread-safe database writes
-    all_base_config_circuits: list[str] = []
     inference: Inference
 
     state: State
     graph: CompiledStateGraph
+    audit_log_sink: AuditLogSink
+    input_archive: Future
+    prompt_usage_before: dict
     server_can: str | None = None
 
     def __init__(
@@ -105,84 +110,110 @@ class Processor:
                 ),
                 update_queue=update_queue,
                 app_state=app_state,
-                all_base_config_circuits=[],
-                all_self_server_circuits=[],
-                all_other_server_circuits=[],
             )
-
-        self.server_can = server_can
-
-        self.load_base_configs()
-
-        if self.server_can is None:
-            logger.info(
-                "Could not find the server can for the specified ECU system execution we cannot process the data further"
+            self.state.input_manifest = load_input_manifest(
+                self.state.inference_base_folder
             )
-            raise ValueError(
-                "Could not find the server can for the specified ECU system execution we cannot process the data further"
+            self.state.change_tracker = ChangeTracker(
+                os.path.join(self.state.inference_base_folder, output_root_folder),
+                ecu_system_execution,
             )
-            return
 
-        self.state.server_can = self.server_can
+        # the input does not change during the inference, archive it in the background
+        self.input_archive = self.archive_async(input_root_folder, input_archive_name)
 
-    def load_base_configs(self):
-        self.state.base_configs = []
-        base_config_path = os.path.join(
-            self.state.inference_base_folder,
-            input_root_folder,
-            base_configs_folder,
-        )
-        if not os.path.exists(base_config_path):
-            logger.info(
-                f"Could not find the specified path for base configurations: {base_config_path}"
+        # stream the audit log of this inference to the output logs folder
+        self.audit_log_sink = AuditLogSink(
+            os.path.join(
+                self.state.inference_base_folder,
+                output_root_folder,
+                logs_output_folder,
             )
-            return
-        for filename in os.listdir(base_config_path):
-            with open(f"{base_config_path}/{filename}", "r") as file:
-                base_config = BaseConfig(f"{base_config_path}/{filename}")
-                current_server_config = get_system_config_using_server_can(
-                    base_config.server_can
-                )
+        )
+        self.audit_log_sink.start()
 
-                if current_server_config is not None:
-                    if current_server_config.family != self.state.ecu_system_family:
-                        logger.info(
-                            f"Skipping {filename} as it does not belong to the {self.state.ecu_system_family} family"
-                        )
-                        continue
-
-                    if (
-                        current_server_config.execution
-                        != self.state.ecu_system_execution
-                    ):
-                        logger.info(
-                            f"Skipping {filename} as it does not belong to the {self.state.ecu_system_execution} system"
-                        )
-                        continue
-
-                self.state.base_configs.append(base_config)
-
-        self.all_base_config_circuits = [
-            circuit
-            for base_config in self.state.base_configs
-            for circuit in base_config.base_config_circuits
-        ]
+        try:
+            self.server_can = server_can
 
-        self.state.all_base_config_circuits = self.all_base_config_circuits
+            self.load_base_configs()
 
-        self.state.all_self_server_circuits = [
-            circuit
-            for base_config in self.state.base_configs
-            for circuit in base_config.hero_circuits
-        ]
+            if self.server_can is None:
+                logger.info(
+                    "Could not find the server can for the specified ECU system execution we cannot process the data further"
+                )
+                raise ValueError(
+                    "Could not find the server can for the specified ECU system execution we cannot process the data further"
+                )
 
-        self.state.all_other_server_circuits = [
-            circuit
-            for base_config in self.state.base_configs
-            for circuit in base_config.other_server_circuits
-            if circuit not in self.state.all_self_server_circuits
+            self.state.server_can = self.server_can
+        except Exception:
+            # process() never runs, detach the sink so later inferences do not log into this file
+            self.audit_log_sink.stop()
+            raise
+
+    def get_previous_archives(self, archive_name: str):
+        """
+        Returns the (archive, manifest) paths of the earlier versions of this ECU,
+        latest version first.
+        """
+        ecu_folder = os.path.dirname(self.state.inference_base_folder)
+        versions = [
+            int(version)
+            for version in os.listdir(ecu_folder)
+            if version.isdigit() and int(version) < int(self.inference.version)  # type: ignore
+        ]
+        return [
+            (
+                os.path.join(
+                    ecu_folder, str(version), root_archive_folder, f"{archive_name}.zip"
+                ),
+                os.path.join(
+                    ecu_folder, str(version), archive_manifests_folder, f"{archive_name}.json"
+                ),
+            )
+            for version in sorted(versions, reverse=True)
         ]
 
+    def archive_async(self, source_folder: str, archive_name: str):
+        return archive_folder_async(
+            os.path.join(self.state.inference_base_folder, source_folder),
+            os.path.join(
+                self.state.inference_base_folder,
+                root_archive_folder,
+                f"{archive_name}.zip",
+            ),
+            os.path.join(
+                self.state.inference_base_folder,
+                archive_manifests_folder,
+                f"{archive_name}.json",
+            ),
+            self.get_previous_archives(archive_name),
+        )
+
+    def load_base_configs(self):
+        self.state.base_configs = load_base_configs(
+            os.path.join(
+                self.state.inference_base_folder,
+                input_root_folder,
+                base_configs_folder,
+            ),
+            self.state.ecu_system_family,
+            self.state.ecu_system_execution,
+        )
+        (
+            self.state.all_base_config_circuits,
+            self.state.all_self_server_circuits,
+            self.state.all_other_server_circuits,
+        ) = get_server_circuits(self.state.base_configs)
+
+        # the exclusions do not change during the inference, so neither does the qdrant filter
+        self.state.excluded_components = (
+            self.state.all_base_config_circuits | self.state.all_other_server_circuits
+        )
+        self.state.component_filter = get_component_filter(
+            self.state.ecu_system_execution, self.state.excluded_components
+        )
+
         # we try to get the server can from the base configurations
         # this is temprorary until we get all the server cans for all systems
         if len(self.state.base_configs) > 0:
@@ -235,41 +266,30 @@ class Processor:
 
         def export_artifacts(state: State):
             logger.info("Processing complete")
+            # the usage is counted per process, log only this inference
+            log_prompt_usage(since=self.prompt_usage_before)
+            pool_metrics.log()
+
+            # the change manifest lists the artifacts written by this inference,
+            # it is shipped in the output archive
+            if self.state.change_tracker is not None:
+                self.state.change_tracker.flush()
+                self.state.change_tracker.write_manifest(
+                    os.path.join(
+                        self.state.inference_base_folder,
+                        output_root_folder,
+                        change_manifest_name,
+                    )
+                )
 
-            logs = get_log_messages()
-            remove_log_handlers()
-
-            logs_output_path = os.path.join(
-                self.state.inference_base_folder, output_root_folder, logs_output_folder
-            )
-
-            # create the logs output folder
-            if not os.path.exists(logs_output_path):
-                os.makedirs(logs_output_path)
-            # overwrite the logs to the specified path
-            with open(f"{logs_output_path}/process.log", "w") as file:
-                file.write(logs)
+            # flush and close the audit log before it gets archived
+            self.audit_log_sink.stop()
 
-            # zip the output and input folders
-            shutil.make_archive(
-                os.path.join(
-                    self.state.inference_base_folder,
-                    root_archive_folder,
-                    input_archive_name,
-                ),
-                "zip",
-                os.path.join(self.state.inference_base_folder, input_root_folder),
-            )
-
-            shutil.make_archive(
-                os.path.join(
-                    self.state.inference_base_folder,
-                    root_archive_folder,
-                    output_archive_name,
-                ),
-                "zip",
-                os.path.join(self.state.inference_base_folder, output_root_folder),
-            )
+            # zip the output folder, the input archive has been built in the
+            # background since the start of the inference
+            output_archive = self.archive_async(output_root_folder, output_archive_name)
+            self.input_archive.result()
+            output_archive.result()
 
         # Build the graph
         builder = StateGraph(State)
@@ -318,4 +338,8 @@ class Processor:
 
     def process(self):
         logger.info("Starting processing")
-        self.graph.invoke(self.state)
+        self.prompt_usage_before = get_prompt_usage()
+        try:
+            self.graph.invoke(self.state)
+        finally:
+            self.audit_log_sink.stop()
@@ -1,20 +1,22 @@
-import hashlib
 import os
+from concurrent.futures import ThreadPoolExecutor
 
 import pymupdf
-from graphs import circuit_extractor
+from inflow.blob_store import get_input_file_hash
+from inflow.circuit_diagram_reader import get_diagram_chunks, parse_legend
 from logger import (
     audit_logger as logger,
 )
+from database.connection import unit_of_work
 from database.database import (
     create_component,
-    driver,
     link_component_to_circuit_diagram,
-    save_app_state,
+    write_app_state,
 )
 from config import (
     input_root_folder,
     circuit_diagrams_folder,
+    max_parallel_workers,
 )
 
 from state import State
@@ -58,34 +60,26 @@ def process_circuit_diagrams(state: State):
     for filename in files:
         state.update_queue.put(f"Processing {filename}")
         logger.info(f"Processing{ filename}")
-        with open(f"{circuit_diagrams_path}/{filename}", "rb") as file:
-            # create a hash of the file
-            file_id = hashlib.md5(file.read()).hexdigest()
+        # the hash of the file is taken from the upload manifest when available
+        file_id = get_input_file_hash(
+            state.input_manifest,
+            circuit_diagrams_folder,
+            filename,
+            f"{circuit_diagrams_path}/{filename}",
+        )
         # open the pdf file
         pdf_file = pymupdf.open(f"{circuit_diagrams_path}/{filename}")
 
-        has_been_processed = False
-        for app_state_file in state.app_state.circuit_diagrams:
-            if (
-                file_id == app_state_file["hash"]
-                and app_state_file["ecu_system"] == state.ecu_system_execution
-            ):
-                logger.info(f"Skipping {filename} as it has already been processed")
-                has_been_processed = True
-                break
-
-        if has_been_processed:
+        if state.app_state.has_file(
+            "circuit_diagrams", file_id, state.ecu_system_execution
+        ):
+            logger.info(f"Skipping {filename} as it has already been processed")
             continue
 
         else:
             # we need to remove the system information from the app state
             # becasue we are going to reprocess the system information
-            state.app_state.system_descriptions = []
-            with driver.session() as session:
-                session.execute_write(
-                    save_app_state,
-                    state.app_state,
-                )
+            state.app_state.clear_files("system_descriptions")
 
         # get the first page
         page = pdf_file[0]
@@ -109,71 +103,109 @@ def process_circuit_diagrams(state: State):
         if not validate_system_details(state, current_system_config):
             continue
 
-        # Run the graph until the first interruption
-        for event in circuit_extractor.stream(
-            {
-                "diagram_content": text,
-            },
-            stream_mode="updates",
-        ):
-            if "components" in event:
-                for component in event["components"]:
-                    logger.info(f"Component Name:{component.name}")
-                    logger.info(f"Component Description:{component.description}")
-
-                    control_system_names_without_numbers = [
-                        "".join(c for c in state.ecu_system_family if not c.isdigit()),
-                        "".join(
-                            c for c in state.ecu_system_execution if not c.isdigit()
-                        ),
-                    ]
-
-                    # check if control unit and name options present in in the description
-                    if "control unit" in component.description.lower() and any(
-                        code in component.description
-                        for code in control_system_names_without_numbers
-                    ):
-                        logger.info(
-                            f"Skipping component {component.name} as it is a control unit for current system as the description is {component.description}"
-                        )
-                        continue
-
-                    if (
-                        component.description.lower()
-                        == f"control unit, {state.ecu_system_family}".lower()
-                    ):
-                        logger.info(
-                            f"Skipping component {component.name} as it is a control unit for {state.ecu_system_family}"
-                        )
-                        continue
-                    # expand the components if they have a slash in the name
-                    if "/" in component.name:
-                        expanded_components = component.name.split("/")
-                        for expanded_component in expanded_components:
-                            add_component(
-                                state,
-                                expanded_component,
-                                component.description,
-                                file_id,
-                            )
-                    else:
-                        add_component(
-                            state, component.name, component.description, file_id
-                        )
+        components = extract_diagram_components(filename, pdf_file)
+        logger.info(f"Extracted {len(components)} components from {filename}")
+
+        for component in components:
+            logger.info(f"Component Name:{component.name}")
+            logger.info(f"Component Description:{component.description}")
+
+            control_system_names_without_numbers = [
+                "".join(c for c in state.ecu_system_family if not c.isdigit()),
+                "".join(c for c in state.ecu_system_execution if not c.isdigit()),
+            ]
+
+            # check if control unit and name options present in in the description
+            if "control unit" in component.description.lower() and any(
+                code in component.description
+                for code in control_system_names_without_numbers
+            ):
+                logger.info(
+                    f"Skipping component {component.name} as it is a control unit for current system as the description is {component.description}"
+                )
+                continue
+
+            if (
+                component.description.lower()
+                == f"control unit, {state.ecu_system_family}".lower()
+            ):
+                logger.info(
+                    f"Skipping component {component.name} as it is a control unit for {state.ecu_system_family}"
+                )
+                continue
+            # expand the components if they have a slash in the name
+            if "/" in component.name:
+                expanded_components = component.name.split("/")
+                for expanded_component in expanded_components:
+                    add_component(
+                        state,
+                        expanded_component,
+                        component.description,
+                        file_id,
+                    )
+            else:
+                add_component(state, component.name, component.description, file_id)
 
         # add the file to the app state
-        state.app_state.circuit_diagrams.append(
-            {
-                "hash": file_id,
-                "file_name": filename,
-                "ecu_system": state.ecu_system_execution,
-            }
+        state.app_state.add_file(
+            "circuit_diagrams", file_id, filename, state.ecu_system_execution
         )
-        with driver.session() as session:
-            session.execute_write(
-                save_app_state,
-                state.app_state,
-            )
+        write_app_state(state.app_state)
+
+
+def extract_chunk_components(chunk: str):
+    result = circuit_extractor.invoke({"diagram_content": chunk})
+    return result.get("components") or []
+
+
+def merge_components(components: dict, new_components):
+    """
+    Merges the components by designator, the first non empty description wins.
+    """
+    for component in new_components:
+        name = component.name.strip()
+        if not name:
+            continue
+        component.name = name
+        if name not in components or not components[name].description:
+            components[name] = component
+
+
+def extract_components(chunks: list[str]):
+    """
+    Extracts the components of every chunk concurrently and merges them by
+    designator. Chunks overlap, so the same component is usually returned twice.
+    """
+    components = {}
+    with ThreadPoolExecutor(max_workers=max_parallel_workers) as executor:
+        for chunk_components in executor.map(extract_chunk_components, chunks):
+            merge_components(components, chunk_components)
+    return list(components.values())
+
+
+def extract_diagram_components(filename, pdf_file):
+    """
+    Reads the legend tables of the circuit diagram directly from the pdf, only
+    the pages the table parser cannot handle confidently go to the llm.
+    """
+    components = {}
+    fallback_pages = []
+    for page in pdf_file:
+        page_components, confident = parse_legend(page)
+        if confident:
+            merge_components(components, page_components)
+        elif (page.get_text() or "").strip():  # type: ignore
+            fallback_pages.append(page)
+
+    logger.info(
+        f"Parsed the legend of {len(pdf_file) - len(fallback_pages)} pages of {filename}, {len(fallback_pages)} pages go to the llm"
+    )
+    if fallback_pages:
+        chunks = get_diagram_chunks(fallback_pages)
+        logger.info(f"Extracting components of {filename} from {len(chunks)} chunks")
+        merge_components(components, extract_components(chunks))
+
+    return list(components.values())
 
 
 def add_component(state, name, description, file_id):
@@ -183,20 +215,15 @@ def add_component(state, name, description, file_id):
         )
         return
 
-    with driver.session() as session:
-        session.execute_write(
-            create_component,
-            name,
-            description,
-            state.ecu_system_execution,
-        )
-
-        session.execute_write(
+    unit_of_work(
+        (create_component, name, description, state.ecu_system_execution),
+        (
             link_component_to_circuit_diagram,
             name,
             file_id,
             state.ecu_system_execution,
-        )
+        ),
+    )
 
 
 def validate_system_details(state, current_system_config):
@@ -12,14 +12,9 @@ from pathlib import Path
 from typing import List, Tuple, Optional, Dict
 
 from lxml import etree
-from neo4j import GraphDatabase
 from pydantic_xml import BaseXmlModel, attr, element
 
-from database.database import (
-    neo4j_connection,
-    neo4j_user,
-    neo4j_password,
-)
+from database.connection import driver
 from processors.function_parameters.llm.iolist_conversion import (
    select_physical_quantity_description_for_io
 )
@@ -95,13 +90,8 @@ class PtIOList(BaseXmlModel, tag="PtIOList"):
         }
 
 # ---------------------------------------------------------------------- helpers
-_DRIVER = GraphDatabase.driver(
-    neo4j_connection, auth=(neo4j_user, neo4j_password)
-)
-
-
 def get_ecu_info(system_name: str) -> Dict[str, str]:
-    with _DRIVER.session() as s:
+    with driver.session() as s:
         rec = s.run(
             """
             MATCH (f:ECUFamily)-[:HAS_SYSTEM]->(s:ECUSystem {name: $system})
@@ -116,7 +106,7 @@ def get_ecu_info(system_name: str) -> Dict[str, str]:
 
 
 def get_physical_quantity_by_unit(unit_name: str) -> List[str]:
-    with _DRIVER.session() as s:
+    with driver.session() as s:
         result = s.run(
             """
             MATCH (u:Unit {name: $unit})<-[:HAS_UNIT]-(pq:PhysicalQuantity)
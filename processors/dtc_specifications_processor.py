@@ -1,9 +1,11 @@
 from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import asdict, dataclass
 import hashlib
 import os
-import pandas as pd
 from pypdf import PdfReader
 from graphs.dtc_extractor import graph as dtc_extractor
+from inflow.blob_store import get_input_file_hash
+from progress import ProgressUpdate
 from state import State
 
 from logger import (
@@ -19,29 +21,121 @@ from config import (
 from utils import get_system_config_by_filename, get_system_config_using_dtc
 
 from database.database import (
-    create_dtc,
-    create_relationship_if_component_exists,
+    create_dtcs,
     driver,
-    save_app_state,
+    get_dtc_page_extractions,
+    get_existing_dtc_codes,
+    save_dtc_page_extraction,
+    write_app_state,
 )
 
+# verified DTCs are written to Neo4j in batches of this size while the pages finish
+DTC_WRITE_BATCH_SIZE = 50
+
+# bump when the DTC extraction changes enough that recorded pages must be redone
+DTC_PAGE_LEDGER_VERSION = 1
+
+
+@dataclass(slots=True)
+class DTCRecord:
+    error_code: str
+    components: str
+    heading: str
+    detection: str
+    cause: str
+    system_reaction: str
+    symptom: str
+
+    @classmethod
+    def from_specification(cls, specification: dict):
+        return cls(
+            error_code=specification["error_code"],
+            components=specification["components"],
+            heading=specification["heading"],
+            detection=specification["detection"],
+            cause=specification["cause"],
+            system_reaction=specification["system_reaction"],
+            symptom=specification["symptom"],
+        )
+
+    def get_component_names(self):
+        return [
+            component.strip()
+            for component in self.components.split(",")
+            if component.strip()
+        ]
+
+
+class DTCWriter:
+    """
+    Writes verified DTCs and their AFFECTS relationships to Neo4j in batches
+    while the pages are still being extracted, so only one batch is kept in memory.
+    """
+
+    def __init__(self, ecu_system: str, batch_size: int = DTC_WRITE_BATCH_SIZE):
+        self.ecu_system = ecu_system
+        self.batch_size = batch_size
+        self.records: list[DTCRecord] = []
+        self.written = 0
+
+    def add(self, record: DTCRecord):
+        self.records.append(record)
+        if len(self.records) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self.records:
+            return
+
+        rows = []
+        for record in self.records:
+            logger.info(
+                f"Creating DTC {record.error_code} affecting {', '.join(record.get_component_names())}"
+            )
+            rows.append(
+                {**asdict(record), "component_names": record.get_component_names()}
+            )
+
+        with driver.session() as session:
+            session.execute_write(create_dtcs, rows, self.ecu_system)
+        self.written += len(rows)
+        self.records = []
+
 
-def process_dtc_page(state: State, index, page, filename, pdf_file):
-    """Extracts text and runs optimizer workflow on a single page."""
-    print(f"Processing {filename} - Page {index} of {len(pdf_file.pages)}")
+def get_dtc_page_hash(text: str):
+    """
+    Key of the page in the extraction ledger, the version is part of the key
+    so a change of the extraction invalidates the recorded verdicts.
+    """
+    return hashlib.sha256(
+        f"{DTC_PAGE_LEDGER_VERSION}\n{text}".encode()
+    ).hexdigest()
+
+
+def process_dtc_page(state: State, index, text, page_hash, filename, total_pages):
+    """Runs the extraction workflow on the text of a single page."""
+    print(f"Processing {filename} - Page {index} of {total_pages}")
     state.update_queue.put(
-        f"Processing {filename} - Page {index} of {len(pdf_file.pages)}"
+        ProgressUpdate(
+            stage="dtc_specifications",
+            message=f"Processing {filename} - Page {index} of {total_pages}",
+        )
     )
 
-    # Extract text
-    text = page.extract_text()
-
     # Run the workflow on the text
+    has_error_details = None
     unverified_extraction = None
     verified_extraction = None
     for event in dtc_extractor.stream(
         {"page_text": text, "attempt": 0}, stream_mode="updates"
     ):
+        if "verify_error_presence" in event:
+            has_error_details = (
+                event["verify_error_presence"][
+                    "error_classification_evaluation"
+                ].has_error_details.lower()
+                == "yes"
+            )
         if "extract_error_codes" in event:
             unverified_extraction = event["extract_error_codes"]["dtc_specification"]
         if (
@@ -56,27 +150,25 @@ def process_dtc_page(state: State, index, page, filename, pdf_file):
                 print("we have a verified extraction")
                 verified_extraction = unverified_extraction
 
+    # only final verdicts are recorded, a failed extraction is retried next run
     if verified_extraction:
         logger.info(f"Extracted DTC from page{index}: {verified_extraction.dict()}")
+        record_dtc_page(page_hash, verified_extraction.dict())
         return verified_extraction.dict()
 
+    if has_error_details is False:
+        record_dtc_page(page_hash, None)
+
     return None  # Return None if extraction failed
 
 
+def record_dtc_page(page_hash, specification):
+    with driver.session() as session:
+        session.execute_write(save_dtc_page_extraction, page_hash, specification)
+
+
 def process_dtc_specifications(state: State):
     logger.info("Processing DTC Specifications")
-    errors_df = pd.DataFrame(
-        columns=[
-            "error_code",
-            "components",
-            "heading",
-            "detection",
-            "cause",
-            "system_reaction",
-            "symptom",
-        ]
-    )
-
     dtc_specifications_path = os.path.join(
         state.inference_base_folder,
         input_root_folder,
@@ -98,23 +190,19 @@ def process_dtc_specifications(state: State):
         )
     for filename in files:
         state.update_queue.put(f"Processing {filename}")
-        with open(f"{dtc_specifications_path}/{filename}", "rb") as file:
-            # create a hash of the file
-            file_id = hashlib.md5(file.read()).hexdigest()
+        # the hash of the file is taken from the upload manifest when available
+        file_id = get_input_file_hash(
+            state.input_manifest,
+            dtc_specifications_folder,
+            filename,
+            f"{dtc_specifications_path}/{filename}",
+        )
 
         # check if the file has already been processed
-        has_been_processed = False
-
-        for app_state_file in state.app_state.dtc_specifications:
-            if (
-                file_id == app_state_file["hash"]
-                and app_state_file["ecu_system"] == state.ecu_system_execution
-            ):
-                logger.info(f"Skipping {filename} as it has already been processed")
-                has_been_processed = True
-                break
-
-        if has_been_processed:
+        if state.app_state.has_file(
+            "dtc_specifications", file_id, state.ecu_system_execution
+        ):
+            logger.info(f"Skipping {filename} as it has already been processed")
             continue
 
         logger.info(f"Processing {filename}")
@@ -124,11 +212,13 @@ def process_dtc_specifications(state: State):
         pdf_file = PdfReader(f"{dtc_specifications_path}/{filename}")
 
         current_system_config = None
+        # the text of every page is extracted once and reused for the ledger
+        page_texts = [page.extract_text() for page in pdf_file.pages]
 
         #  loop throght the pages to find the system informaiton
-        for page in pdf_file.pages:
+        for text in page_texts:
             # load the circuit diagram family name
-            current_system_config = get_system_config_using_dtc(page.extract_text())
+            current_system_config = get_system_config_using_dtc(text)
             if current_system_config is not None:
                 break
 
@@ -141,6 +231,42 @@ def process_dtc_specifications(state: State):
         if not validate_system_details(state, current_system_config):
             continue
 
+        page_hashes = [get_dtc_page_hash(text) for text in page_texts]
+        with driver.session() as session:
+            ledger = session.execute_read(
+                get_dtc_page_extractions, list(set(page_hashes))
+            )
+
+        state.update_queue.put(
+            ProgressUpdate(stage="dtc_specifications", total=len(pdf_file.pages))
+        )
+
+        # pages with a recorded verdict are not sent to the llm again, their
+        # DTCs are only written when they are missing for this ECU system
+        cached_results = [
+            ledger[page_hash]["specification"]
+            for page_hash in page_hashes
+            if page_hash in ledger and ledger[page_hash]["has_dtc"]
+        ]
+        cached_pages = sum(1 for page_hash in page_hashes if page_hash in ledger)
+        logger.info(
+            f"{cached_pages} of {len(page_hashes)} pages of {filename} are already extracted"
+        )
+        state.update_queue.put(
+            ProgressUpdate(stage="dtc_specifications", advance=cached_pages)
+        )
+        dtc_writer = DTCWriter(state.ecu_system_execution)
+        if cached_results:
+            with driver.session() as session:
+                existing_dtc_codes = session.execute_read(
+                    get_existing_dtc_codes,
+                    [result["error_code"] for result in cached_results],
+                    state.ecu_system_execution,
+                )
+            for result in cached_results:
+                if result["error_code"] not in existing_dtc_codes:
+                    dtc_writer.add(DTCRecord.from_specification(result))
+
         # # Use ThreadPoolExecutor to process 4 pages in parallel
         with ThreadPoolExecutor(max_workers=max_parallel_workers) as executor:
             future_to_page = {
@@ -148,65 +274,32 @@ def process_dtc_specifications(state: State):
                     process_dtc_page,
                     state,
                     index,
-                    page,
+                    text,
+                    page_hash,
                     filename,
-                    pdf_file,
-                ): page
-                for index, page in enumerate(
-                    pdf_file.pages, start=1
-                )  # @TODO: Remove the slicing here
+                    len(pdf_file.pages),
+                ): index
+                for index, (text, page_hash) in enumerate(
+                    zip(page_texts, page_hashes), start=1
+                )
+                if page_hash not in ledger
             }
 
             for future in as_completed(future_to_page):
                 result = future.result(timeout=30)
+                state.update_queue.put(
+                    ProgressUpdate(stage="dtc_specifications", advance=1)
+                )
                 if result:
-                    errors_df.loc[len(errors_df)] = result
+                    dtc_writer.add(DTCRecord.from_specification(result))
 
-        # save the dataframe to the specified path
-        with driver.session() as session:
-            for index, row in errors_df.iterrows():
-                print(f"Processing DTC {row['error_code']}")
-                session.execute_write(
-                    create_dtc,
-                    row["error_code"],
-                    row["heading"],
-                    row["components"],
-                    row["detection"],
-                    row["cause"],
-                    row["system_reaction"],
-                    row["symptom"],
-                    state.ecu_system_execution,
-                )
-                # create relationships between the DTC and the components
-                components = row["components"].split(",")
-                for component in components:
-                    logger.info(
-                        f"Creating relationship between {row['error_code']} and {component.strip()}"
-                    )
-                    session.execute_write(
-                        create_relationship_if_component_exists,
-                        row["error_code"],
-                        component,
-                        "AFFECTS",
-                        state.ecu_system_execution,
-                    )
+        dtc_writer.flush()
 
         # add the file to the app state
-        state.app_state.dtc_specifications.append(
-            {
-                "hash": file_id,
-                "file_name": filename,
-                "ecu_system": state.ecu_system_execution,
-            }
+        state.app_state.add_file(
+            "dtc_specifications", file_id, filename, state.ecu_system_execution
         )
-        with driver.session() as session:
-            session.execute_write(
-                save_app_state,
-                state.app_state,
-            )
-
-        # clear the dataframe
-        errors_df = errors_df.iloc[0:0]
+        write_app_state(state.app_state)
 
 
 def validate_system_details(state: State, current_system_config):
@@ -6,6 +6,7 @@ from models.input.pt_imported_simple_parameter import PtImportedSimpleParameter
 from pydantic import BaseModel, Field
 
 from config import openai_api_key, openai_api_base
+from graphs.prompts import record_usage
 
 client = OpenAI(
     api_key=openai_api_key,
@@ -79,6 +80,7 @@ def create_function_group(
             "top_p": 0.95,
         },
     )
+    record_usage("function_parameters.create_function_group", chat_response)
 
     return FunctionGroupCreate.model_validate_json(
         chat_response.choices[0].message.content  # type: ignore
@@ -6,6 +6,7 @@ from models.input.pt_imported_simple_parameter import PtImportedSimpleParameter
 from pydantic import BaseModel, Field
 
 from config import openai_api_key, openai_api_base
+from graphs.prompts import PromptTemplate
 
 client = OpenAI(
     api_key=openai_api_key,
@@ -25,57 +26,53 @@ class FunctionGroupUpdate(BaseModel):
     reason: str = Field(..., description="The reason for the decision")
 
 
-def update_function_group(
-    function_parameter: PtImportedSimpleParameter,
-    function_group_details: str,
-):
-    chat_response = client.chat.completions.create(
-        model="NovaSky-AI/Sky-T1-32B-Flash",
-        messages=[
-            {
-                "role": "system",
-                "content": f"""
-            You are a technical writer for an automotive company. You are familiar with various terms used in automotive documentation.
-            Given a function parameter details, and a funciton group details, you need to decide if we can add this function parameter to one of the function groups or create a new function group.
-            Return the name of the function group to which this function parameter belongs or return none if it is not related to any function group.
-            You also need to provide the type of the function group, either existing or none.
-            Provide a small reason for your decision.
+update_function_group_prompt = PromptTemplate(
+    "function_parameters.update_function_group",
+    """
+    You are a technical writer for an automotive company. You are familiar with various terms used in automotive documentation.
+    Given a function parameter details, and a funciton group details, you need to decide if we can add this function parameter to one of the function groups or create a new function group.
+    Return the name of the function group to which this function parameter belongs or return none if it is not related to any function group.
+    You also need to provide the type of the function group, either existing or none.
+    Provide a small reason for your decision.
 
-            ========================================
-            funciton group details
-            {function_group_details}
-            ========================================
+    RULES:
 
-            RULES:
+    1. Return the name of the function group to which this function parameter belongs, or you can return a new function group name.
+    2. If the function parameter is not related to any function group, return a new function group name.
 
-            1. Return the name of the function group to which this function parameter belongs, or you can return a new function group name.
-            2. If the function parameter is not related to any function group, return a new function group name.
+    OUTPUT:
+    Only return following items in JSON format:
+    1. function_group_name: The name of the function group to which this function parameter belongs, it can be a new function group name or an existing function group name.
+    2. function_group_type: new / existing - 
+        new: if the function group is new and does not exist in the database.
+        existing: if the function group already exists in the database.
+    3. reason: The reason for the decision.
 
-            OUTPUT:
-            Only return following items in JSON format:
-            1. function_group_name: The name of the function group to which this function parameter belongs, it can be a new function group name or an existing function group name.
-            2. function_group_type: new / existing - 
-                new: if the function group is new and does not exist in the database.
-                existing: if the function group already exists in the database.
-            3. reason: The reason for the decision.
+    OUTPUT FORMAT:
+    The output should be in JSON format with the following keys:
+    1. function_group_name: The name of the function group to which this function parameter belongs, it can be a new function group name or an existing function group name.
+    2. function_group_type: new / existing - 
+        new: if the function group is new and does not exist in the database.
+        existing: if the function group already exists in the database.
+    3. reason: The reason for the decision.
+    """,
+)
 
-            OUTPUT FORMAT:
-            The output should be in JSON format with the following keys:
-            1. function_group_name: The name of the function group to which this function parameter belongs, it can be a new function group name or an existing function group name.
-            2. function_group_type: new / existing - 
-                new: if the function group is new and does not exist in the database.
-                existing: if the function group already exists in the database.
-            3. reason: The reason for the decision.
 
-            """,
-            },
-            {
-                "role": "user",
-                "content": f"""
-                function_parameter: { function_parameter.model_dump_json(indent=2)}
-                    """,
-            },
-        ],
+def update_function_group(
+    function_parameter: PtImportedSimpleParameter,
+    function_group_details: str,
+):
+    # the function group details change with every call, so they go after the
+    # static instructions to keep the prompt prefix cacheable
+    chat_response = update_function_group_prompt.complete(
+        client,
+        "========================================\n"
+        "funciton group details\n"
+        f"{function_group_details}\n"
+        "========================================\n\n"
+        f"function_parameter: {function_parameter.model_dump_json(indent=2)}",
+        model="NovaSky-AI/Sky-T1-32B-Flash",
         temperature=0.5,
         extra_body={
             "guided_json": FunctionGroupUpdate.model_json_schema(),
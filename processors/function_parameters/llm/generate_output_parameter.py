@@ -6,6 +6,7 @@ from models.input.pt_imported_simple_parameter import PtImportedSimpleParameter
 from pydantic import BaseModel
 
 from config import openai_api_key, openai_api_base
+from graphs.prompts import record_usage
 
 client = OpenAI(
     api_key=openai_api_key,
@@ -70,6 +71,7 @@ def generate_output_parameter(
             "top_p": 0.95,
         },
     )
+    record_usage("function_parameters.generate_output_parameter", chat_response)
 
     return FunctionParameterDetails.model_validate_json(
         chat_response.choices[0].message.content  # type: ignore
@@ -6,6 +6,7 @@ from models.input.pt_imported_simple_parameter import PtImportedSimpleParameter
 from pydantic import BaseModel, Field
 
 from config import openai_api_key, openai_api_base
+from graphs.prompts import record_usage
 
 client = OpenAI(
     api_key=openai_api_key,
@@ -70,6 +71,7 @@ Available Physical Quantities: {physical_quantities}
             "top_p": 1
         }
     )
+    record_usage("function_parameters.select_physical_quantity", chat_response)
 
     return PhysicalQuantitySelection.model_validate_json(
         chat_response.choices[0].message.content  # type: ignore
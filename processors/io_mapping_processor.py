@@ -1,7 +1,7 @@
-from concurrent.futures import ThreadPoolExecutor
-import hashlib
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 import os
-from state import State
+import time
+from state import IORecord, State
 
 from logger import (
     system_logger,
@@ -10,10 +10,10 @@ from logger import (
 
 from database.database import (
     create_io,
-    create_io_mapping_with_component,
     driver,
-    mark_component_as_not_exported,
-    save_app_state,
+    get_all_components,
+    map_io_to_component,
+    write_app_state,
     update_io_file_io_mapping,
 )
 
@@ -22,17 +22,43 @@ from config import (
     input_root_folder,
     max_parallel_workers,
     io_lists_folder,
+    io_dense_retrieval_mode,
+    io_dense_score_threshold,
+    io_dense_candidate_limit,
+    io_embedding_batch_size,
+    io_item_max_attempts,
+    io_item_retry_backoff,
 )
 from xmltodict import parse
 
-from graphs.io_processor import graph as io_processor
-
-
-def process_io(state: State, index, io, total_io_count):
+from database.connection import unit_of_work
+from database.component_vector_index import ComponentVectorIndex, embed_texts
+from database.lexical_index import ComponentLexicalIndex
+from inflow.blob_store import get_input_file_hash
+from progress import ProgressUpdate
+
+from graphs.io_decision import io_decision_metrics
+from graphs.io_processor import get_io_data, graph as io_processor
+from utils import get_tokens_batch
+
+
+def process_io(
+    state: State,
+    index,
+    io,
+    total_io_count,
+    lexical_index=None,
+    dense_candidates=None,
+):
     """Process a single IO item independently"""
     print(f"Processing IO {index} of {total_io_count}")
     system_logger.info(f"Processing IO {index} of {total_io_count}")
-    state.update_queue.put(f"Processing IO {index} of {total_io_count}")
+    state.update_queue.put(
+        ProgressUpdate(
+            stage="io_mapping",
+            message=f"Processing IO {index} of {total_io_count}",
+        )
+    )
 
     io_description = ""
 
@@ -44,22 +70,16 @@ def process_io(state: State, index, io, total_io_count):
     if "Description" in io["IOService"] and "#text" in io["IOService"]["Description"]:
         io_description = io["IOService"]["Description"]["#text"]
 
-    # add the io in the database
-    with driver.session() as session:
-        session.execute_write(
-            create_io,
-            io_name,
-            io_description,
-            io_name_presentation,
-            state.ecu_system_execution,
-        )
     # Run IO processing workflow
+    matched_component = None
     for event in io_processor.stream(
         {
             "io_item": io,
             "ecu_system": state.ecu_system_execution,
-            "excluded_components": state.all_base_config_circuits
-            + state.all_other_server_circuits,
+            "excluded_components": state.excluded_components,
+            "component_filter": state.component_filter,
+            "lexical_index": lexical_index,
+            "dense_candidates": dense_candidates,
         },
         stream_mode="updates",
     ):
@@ -71,32 +91,142 @@ def process_io(state: State, index, io, total_io_count):
             system_logger.info(
                 "IO {} matched with component {}".format(io["Name"], component_name)
             )
+            matched_component = component_name
 
-            # Ensure thread-safe updates
-            with state.lock:  # Ensure thread-safe updates
-                if component_name in state.processable_components:
-                    state.processable_components[component_name].update(
-                        {
-                            "io": state.processable_components[component_name].get(
-                                "io", []
-                            )
-                            + [io]
-                        }
-                    )
-
-            with driver.session() as session:
-                # Create a relationship between the IO and the component
-                session.execute_write(
-                    create_io_mapping_with_component,
-                    io["Name"],
-                    component_name,
-                    state.ecu_system_execution,
+    # the IO and its mapping are written in one transaction
+    operations = [
+        (
+            create_io,
+            io_name,
+            io_description,
+            io_name_presentation,
+            state.ecu_system_execution,
+        )
+    ]
+    if matched_component is not None:
+        # the component is only re-exported when the mapping is new
+        operations.append(
+            (
+                map_io_to_component,
+                io_name,
+                matched_component,
+                state.ecu_system_execution,
+            )
+        )
+    unit_of_work(*operations)
+
+    # only after the write, so a retried IO is not added twice
+    if matched_component is not None:
+        with state.lock:  # Ensure thread-safe updates
+            if matched_component in state.processable_components:
+                state.processable_components[matched_component].ios.append(
+                    IORecord(name=io_name, description=io_description)
                 )
-                session.execute_write(
-                    mark_component_as_not_exported,
-                    component_name,
-                    state.ecu_system_execution,
-                )  # Mark component as not exported so we can re-export
+
+
+def get_dense_results(vector_index, io_list):
+    """
+    Scores every IO of the list against the component vectors at once.
+    Returns the dense candidates per IO, or None per IO when the IOs are
+    matched through Qdrant one by one.
+    """
+    if vector_index is None:
+        return [None] * len(io_list)
+
+    started_at = time.perf_counter()
+    # the whole list is tokenized at once, the tokens are made unique per IO
+    texts = [
+        " ".join(dict.fromkeys(tokens))
+        for tokens in get_tokens_batch([get_io_data(io)[1] for io in io_list])
+    ]
+    # IOs without tokens are not embedded, they are never matched
+    embedded_indices = [index for index, text in enumerate(texts) if text]
+
+    try:
+        query_vectors = embed_texts(
+            [texts[index] for index in embedded_indices], io_embedding_batch_size
+        )
+    except Exception as e:
+        system_logger.error(f"Error embedding the IO list, falling back to Qdrant: {e}")
+        return [None] * len(io_list)
+
+    results = [[] for _ in io_list]
+    if embedded_indices:
+        for index, candidates in zip(
+            embedded_indices,
+            vector_index.search(
+                query_vectors, io_dense_score_threshold, io_dense_candidate_limit
+            ),
+        ):
+            results[index] = candidates
+
+    system_logger.info(
+        f"Scored {len(io_list)} IOs against {len(vector_index)} components in {time.perf_counter() - started_at:.2f}s"
+    )
+    return results
+
+
+def process_io_with_retry(state: State, index, io, total_io_count, *args):
+    """Runs process_io, retrying the item with exponential backoff when it fails."""
+    for attempt in range(1, io_item_max_attempts + 1):
+        try:
+            return process_io(state, index, io, total_io_count, *args)
+        except Exception as e:
+            if attempt == io_item_max_attempts:
+                raise
+            backoff = io_item_retry_backoff * 2 ** (attempt - 1)
+            system_logger.info(
+                f"IO {io['Name']} failed on attempt {attempt}, retrying in {backoff}s: {e}"
+            )
+            time.sleep(backoff)
+
+
+def map_io_list(state: State, io_list, lexical_index, dense_results):
+    """
+    Maps the IOs with a sliding window, a new IO is started as soon as one
+    finishes so max_parallel_workers IOs are always in flight. A failed IO
+    does not stop the others, the failures are returned as (name, error).
+    """
+    started_at = time.perf_counter()
+    failures = []
+    items = iter(enumerate(io_list))
+    with ThreadPoolExecutor(max_workers=max_parallel_workers) as executor:
+        in_flight = {}
+
+        def submit_next():
+            for index, io in items:
+                future = executor.submit(
+                    process_io_with_retry,
+                    state,
+                    index + 1,
+                    io,
+                    len(io_list),
+                    lexical_index,
+                    dense_results[index],
+                )
+                in_flight[future] = io
+                return
+
+        for _ in range(max_parallel_workers):
+            submit_next()
+
+        while in_flight:
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                io = in_flight.pop(future)
+                try:
+                    future.result()
+                except Exception as e:
+                    system_logger.error(f"IO {io['Name']} failed: {e}")
+                    failures.append((io["Name"], str(e)))
+                state.update_queue.put(ProgressUpdate(stage="io_mapping", advance=1))
+                submit_next()
+
+    elapsed = time.perf_counter() - started_at
+    logger.info(
+        f"Mapped {len(io_list)} IOs in {elapsed:.1f}s ({len(io_list) / max(elapsed, 1e-9):.1f} IOs/s)"
+    )
+    return failures
 
 
 def process_io_mapping(state: State):
@@ -124,27 +254,36 @@ def process_io_mapping(state: State):
         )
         return
 
+    # build the lexical index once, the components do not change while mapping IOs
+    with driver.session() as session:
+        all_components = session.execute_read(
+            get_all_components, state.ecu_system_execution
+        )
+    lexical_index = ComponentLexicalIndex([dict(record) for record in all_components])
+    vector_index = None
+    if io_dense_retrieval_mode == "matrix":
+        vector_index = ComponentVectorIndex(
+            state.ecu_system_execution,
+            state.excluded_components,
+        )
+        logger.info(f"Loaded {len(vector_index)} component vectors for IO matching")
+
     # load the io mapping files
     for filename in files:
         file_id = None
         file_content = None
         # calculate the hash of the file
-        with open(f"{io_mapping_path}/{filename}", "rb") as file:
-            file_content = file.read()
-            file_id = hashlib.md5(file_content).hexdigest()
+        file_id = get_input_file_hash(
+            state.input_manifest,
+            io_lists_folder,
+            filename,
+            f"{io_mapping_path}/{filename}",
+        )
 
         # check if the file has already been processed
-        has_been_processed = False
-
-        for app_state_file in state.app_state.io_list_files:
-            if (
-                file_id == app_state_file["hash"]
-                and app_state_file["ecu_system"] == state.ecu_system_execution
-            ):
-                has_been_processed = True
-                break
-
-        if has_been_processed:
+        if state.app_state.has_file(
+            "io_list_files", file_id, state.ecu_system_execution
+        ):
             logger.info(f"Skipping {filename} as it has already been processed")
             continue
 
@@ -152,6 +291,8 @@ def process_io_mapping(state: State):
         logger.info(f"Processing {filename}")
 
         # parse the xml file content to a dictionary
+        with open(f"{io_mapping_path}/{filename}", "rb") as file:
+            file_content = file.read()
         pt_io_list = parse(file_content)
         io_list = []
 
@@ -184,32 +325,35 @@ def process_io_mapping(state: State):
             io_list.append(pt_io_list["PtIOList"]["IO"])
 
         logger.info(f"Processing IO Mapping - total IOs: {len(io_list)}")
-        state.update_queue.put(f"Processing IO Mapping - total IOs: {len(io_list)}")
-        # **Parallel Execution** of semantic IO matching
-        with ThreadPoolExecutor(max_workers=max_parallel_workers) as executor:
-            for batch_start in range(0, len(io_list), 50):
-                batch = io_list[batch_start : batch_start + 50]
-                futures = [
-                    executor.submit(process_io, state, idx + 1, io, len(io_list))
-                    for idx, io in enumerate(batch, start=batch_start)
-                ]
-                for future in futures:
-                    future.result(timeout=30)  # Force sequential processing per batch
-
-        # add the file to the app state
-        state.app_state.io_list_files.append(
-            {
-                "hash": file_id,
-                "file_name": filename,
-                "ecu_system": state.ecu_system_execution,
-            }
+        state.update_queue.put(
+            ProgressUpdate(
+                stage="io_mapping",
+                message=f"Processing IO Mapping - total IOs: {len(io_list)}",
+                total=len(io_list),
+            )
         )
-        with driver.session() as session:
-            session.execute_write(
-                save_app_state,
-                state.app_state,
+        dense_results = get_dense_results(vector_index, io_list)
+        decisions_before = io_decision_metrics.snapshot()
+
+        # **Parallel Execution** of semantic IO matching
+        failures = map_io_list(state, io_list, lexical_index, dense_results)
+
+        io_decision_metrics.log(since=decisions_before)
+
+        if failures:
+            # the file is not marked as processed so the failed IOs are retried next run
+            logger.info(
+                f"{len(failures)} of {len(io_list)} IOs of {filename} failed: "
+                + ", ".join(f"{name} ({error})" for name, error in failures)
+            )
+        else:
+            # add the file to the app state
+            state.app_state.add_file(
+                "io_list_files", file_id, filename, state.ecu_system_execution
             )
+            write_app_state(state.app_state)
 
+        with driver.session() as session:
             # add all io relation to the new file
             for io in io_list:
                 session.execute_write(
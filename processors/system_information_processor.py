@@ -1,32 +1,37 @@
 from concurrent.futures import ThreadPoolExecutor, as_completed
-import hashlib
 import os
+import re
 
 from pypdf import PdfReader
-from state import State
+from inflow.blob_store import get_input_file_hash
+from progress import ProgressUpdate
+from state import ComponentRecord, State
 
 from logger import (
     audit_logger as logger,
 )
 from graphs.system_information_extractor import graph as system_information_extractor
-from graphs.system_information_extractor import graph as system_information_extractor
+from graphs.system_information_extractor import (
+    page_graph as page_information_extractor,
+)
 
 from config import (
     input_root_folder,
     max_parallel_workers,
     system_descriptions_folder,
+    system_information_extraction_mode,
 )
 from graphs.component_details_processor import graph as component_details_processor
 
 from database.database import (
-    add_component_fields,
+    add_components_fields,
     create_component_meta,
     driver,
     find_unlinked_components,
     get_all_components,
-    get_component_meta,
+    get_component_metas,
     link_component_to_system,
-    save_app_state,
+    write_app_state,
 )
 from utils import (
     get_system_config_by_filename,
@@ -40,11 +45,83 @@ def process_system_information_page(
     """Function to process a single page independently"""
     logger.info(f"Processing page {index} of {len(pdf_file.pages)} in {filename}")
     state.update_queue.put(
-        f"Processing page {index} of {len(pdf_file.pages)} in {filename}"
+        ProgressUpdate(
+            stage="system_information",
+            message=f"Processing page {index} of {len(pdf_file.pages)} in {filename}",
+        )
     )
 
     text = page.extract_text()
 
+    if system_information_extraction_mode == "page":
+        process_page_components(state, pdf_file, text, component_names, index)
+    else:
+        process_page_per_component(state, pdf_file, text, component_names, index)
+
+
+def save_component_meta(state: State, pdf_file, component, description):
+    with state.lock:  # Ensure thread-safe DB access
+        with driver.session() as session:
+            session.execute_write(
+                create_component_meta,
+                component,
+                description,
+                hash(pdf_file),
+                state.ecu_system_execution,
+            )
+        state.updated_components.append(component)
+
+
+def process_page_components(state: State, pdf_file, text, component_names, index):
+    """
+    Extracts the descriptions of all the components mentioned on the page with a
+    single LLM call, followed by a single batched verification call.
+    """
+    # only the components whose designator appears on the page can be described there
+    candidates = [
+        component
+        for component in component_names
+        if re.search(rf"(?<![A-Za-z0-9]){re.escape(component)}(?![A-Za-z0-9])", text)
+    ]
+    if len(candidates) == 0:
+        return
+
+    descriptions = {}
+    for event in page_information_extractor.stream(
+        {"components": candidates, "page_text": text},
+        stream_mode="updates",
+    ):
+        if "extract_page_components" in event:
+            descriptions = {
+                extraction.component: extraction.description
+                for extraction in event["extract_page_components"][
+                    "page_component_descriptions"
+                ].components
+            }
+
+        if "verify_page_components" in event:
+            for verification in event["verify_page_components"][
+                "page_component_verifications"
+            ].verifications:
+                if (
+                    verification.verified != "yes"
+                    or verification.component not in descriptions
+                ):
+                    continue
+
+                logger.info(
+                    f"Found details on component {verification.component} on page {index} of {len(pdf_file.pages)} with description: {descriptions[verification.component]}"
+                )
+                save_component_meta(
+                    state,
+                    pdf_file,
+                    verification.component,
+                    descriptions.pop(verification.component),
+                )
+
+
+def process_page_per_component(state: State, pdf_file, text, component_names, index):
+    """Asks the LLM about every component separately, one or two calls per component."""
     # Extract components
     for component in component_names:
         # logger.info(
@@ -84,16 +161,9 @@ def process_system_information_page(
                     logger.info(
                         f"Found details on component {component} on page {index} of {len(pdf_file.pages)} with description: {unverified_extraction.description}"
                     )
-                    with state.lock:  # Ensure thread-safe DB access
-                        with driver.session() as session:
-                            session.execute_write(
-                                create_component_meta,
-                                component,
-                                unverified_extraction.description,
-                                hash(pdf_file),
-                                state.ecu_system_execution,
-                            )
-                    state.updated_components.append(component)
+                    save_component_meta(
+                        state, pdf_file, component, unverified_extraction.description
+                    )
                     unverified_extraction = None
 
 
@@ -141,9 +211,13 @@ def process_system_information(state: State):
         logger.info(f"Processing {filename}")
         state.update_queue.put(f"Processing {filename}")
 
-        with open(f"{system_descriptions_path}/{filename}", "rb") as file:
-            # create a hash of the file
-            file_id = hashlib.md5(file.read()).hexdigest()
+        # the hash of the file is taken from the upload manifest when available
+        file_id = get_input_file_hash(
+            state.input_manifest,
+            system_descriptions_folder,
+            filename,
+            f"{system_descriptions_path}/{filename}",
+        )
 
         # check if the file has already been processed
         has_been_processed = False
@@ -192,6 +266,9 @@ def process_system_information(state: State):
             continue
         # get the first page
         state.updated_components = []
+        state.update_queue.put(
+            ProgressUpdate(stage="system_information", total=len(pdf_file.pages))
+        )
         # Use ThreadPoolExecutor for parallel page processing
         with ThreadPoolExecutor(max_workers=max_parallel_workers) as executor:
             future_to_page = {
@@ -206,21 +283,16 @@ def process_system_information(state: State):
                 ): page
                 for index, page in enumerate(pdf_file.pages, start=1)
             }
-            state.app_state.system_descriptions.append(
-                {
-                    "hash": file_id,
-                    "file_name": filename,
-                    "ecu_system": state.ecu_system_execution,
-                }
+            state.app_state.add_file(
+                "system_descriptions", file_id, filename, state.ecu_system_execution
             )
-            with driver.session() as session:
-                session.execute_write(
-                    save_app_state,
-                    state.app_state,
-                )
+            write_app_state(state.app_state)
 
             for future in as_completed(future_to_page):
                 result = future.result(timeout=30)
+                state.update_queue.put(
+                    ProgressUpdate(stage="system_information", advance=1)
+                )
 
         # mark the components as linked to the system
         for component in unlinked_components:
@@ -232,78 +304,99 @@ def process_system_information(state: State):
                     state.ecu_system_execution,
                 )
 
-        # process the updated components
-        for component in state.updated_components:
-            with driver.session() as session:
-                result = session.execute_read(
-                    get_component_meta, component, state.ecu_system_execution
+        # process the updated components, pages are processed in parallel so
+        # the same component can be reported more than once
+        enrich_components(
+            state,
+            list(dict.fromkeys(state.updated_components)),
+            {component["name"]: component for component in components},
+        )
+
+
+def summarize_component_meta(record, target_component_details):
+    """
+    Runs the component details processor on the collected meta descriptions,
+    returns the verified fields or None if nothing could be verified.
+    """
+    logger.info(f"Component Name: {record['name']}")
+    unverified_extraction = None
+
+    # process the metadata
+    for event in component_details_processor.stream(
+        {
+            "component": record["name"],
+            "short_description": target_component_details["description"],
+            "extra_information": ",".join(record["meta_description"]),
+        },
+        stream_mode="updates",
+    ):
+        if "extract_component_details" in event:
+            unverified_extraction = event["extract_component_details"][
+                "component_extraction_details"
+            ]
+        if "verify_component_details" in event:
+            if unverified_extraction is None:
+                logger.info(f"Could not find details on component {record['name']}")
+                continue
+
+            verification = event["verify_component_details"][
+                "component_extraction_verification"
+            ]
+            if verification.verified_description == "yes":
+                target_component_details["more_description"] = (
+                    unverified_extraction.description
                 )
-                for record in result:
-                    logger.info(f"Component Name: {record['name']}")
-                    unverified_extraction = None
 
-                    target_component_details = None
-                    for component_details in components:
-                        if component_details["name"] == record["name"]:
-                            target_component_details = component_details
+            if verification.verified_purpose == "yes":
+                target_component_details["purpose"] = unverified_extraction.purpose
 
-                    if target_component_details is None:
-                        logger.info(
-                            f"Could not find details for component {record['name']}"
-                        )
-                        continue
+            return {
+                "name": record["name"],
+                "more_description": target_component_details.get("more_description"),
+                "purpose": target_component_details.get("purpose"),
+            }
+
+    return None
+
+
+def enrich_components(state: State, component_names: list, components: dict):
+    """
+    Fetches the metas of all updated components in one query, summarizes them
+    concurrently and writes the verified fields back in one UNWIND write.
+    """
+    if len(component_names) == 0:
+        return
+
+    with driver.session() as session:
+        records = session.execute_read(
+            get_component_metas, component_names, state.ecu_system_execution
+        )
 
-                    # process the metadata
-                    for event in component_details_processor.stream(
-                        {
-                            "component": record["name"],
-                            "short_description": target_component_details[
-                                "description"
-                            ],
-                            "extra_information": ",".join(record["meta_description"]),
-                        },
-                        stream_mode="updates",
-                    ):
-                        if "component_extraction_details" in event:
-                            unverified_extraction = event
-                        if "component_extraction_verification" in event:
-                            if unverified_extraction is None:
-                                logger.info(
-                                    f"Could not find details on component {record['name']}"
-                                )
-                                continue
-                            if (
-                                event[
-                                    "component_extraction_verification"
-                                ].verified_description
-                                == "yes"
-                            ):
-                                target_component_details["more_description"] = (
-                                    unverified_extraction[
-                                        "component_extraction_details"
-                                    ].description
-                                )
-
-                            if (
-                                event[
-                                    "component_extraction_verification"
-                                ].verified_purpose
-                                == "yes"
-                            ):
-                                target_component_details["purpose"] = (
-                                    unverified_extraction[
-                                        "component_extraction_details"
-                                    ].purpose
-                                )
-
-                            with driver.session() as session:
-                                session.execute_write(
-                                    add_component_fields,
-                                    record["name"],
-                                    target_component_details["more_description"],
-                                    target_component_details["purpose"],
-                                    state.ecu_system_execution,
-                                )
+    rows = []
+    with ThreadPoolExecutor(max_workers=max_parallel_workers) as executor:
+        futures = []
+        for record in records:
+            target_component_details = components.get(record["name"])
+            if target_component_details is None:
+                logger.info(f"Could not find details for component {record['name']}")
+                continue
+            futures.append(
+                executor.submit(
+                    summarize_component_meta, record, target_component_details
+                )
+            )
+
+        for future in as_completed(futures):
+            row = future.result()
+            if row is not None:
+                rows.append(row)
+
+    if len(rows) == 0:
+        return
+
+    with driver.session() as session:
+        session.execute_write(add_components_fields, rows, state.ecu_system_execution)
+    logger.info(f"Updated the details of {len(rows)} components")
 
 
 def validate_system_details(state: State, current_system_config):
@@ -323,6 +416,8 @@ def validate_system_details(state: State, current_system_config):
 
 
 def load_processable_components(state: State):
+    # the IOs matched earlier in this inference are kept for the reloaded components
+    previous_components = state.processable_components
     state.processable_components = {}  # Dictionary for uniqueness
 
     # Fetch components from the database
@@ -333,8 +428,8 @@ def load_processable_components(state: State):
 
     # Identify components not in base_config_circuits
     for component in all_components:
-        if (
-            component["name"] not in state.all_base_config_circuits
-            and component["name"] not in state.all_other_server_circuits
-        ):
-            state.processable_components[component["name"]] = dict(component)
+        if component["name"] not in state.excluded_components:
+            record = ComponentRecord.from_record(component)
+            if component["name"] in previous_components:
+                record.ios = previous_components[component["name"]].ios
+            state.processable_components[component["name"]] = record
@@ -0,0 +1,281 @@
+import json
+import queue
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Optional
+
+from neomodel import db
+
+from config import (
+    progress_flush_interval,
+    progress_batch_size,
+    progress_max_messages,
+    progress_event_buffer_size,
+)
+from database.models import Inference, InferenceMessageBatch
+
+
+@dataclass(frozen=True, slots=True)
+class ProgressUpdate:
+    """
+    Structured update put on the update queue.
+
+    :param stage: the pipeline stage the update belongs to, e.g. io_mapping
+    :param message: human readable message, None for a silent counter update
+    :param total: number of items added to the stage total, e.g. the pages of a file
+    :param advance: number of items completed since the last update
+    """
+
+    stage: str
+    message: Optional[str] = None
+    total: Optional[int] = None
+    advance: int = 0
+
+
+@dataclass(slots=True)
+class ProgressChannel:
+    """Events of a single running inference and the queues of its subscribers."""
+
+    events: deque
+    subscribers: list = field(default_factory=list)
+    next_id: int = 1
+    closed: bool = False
+
+
+class ProgressBroker:
+    """
+    In-process pub/sub for the progress events of running inferences.
+
+    The most recent events are kept in a ring buffer per inference so clients
+    can resume a stream with the id of the last event they received.
+    """
+
+    def __init__(self, buffer_size: int):
+        self.buffer_size = buffer_size
+        self.lock = threading.Lock()
+        self.channels: dict[str, ProgressChannel] = {}
+
+    def open(self, uid: str):
+        """Opens the channel of the inference, an already open channel is kept."""
+        with self.lock:
+            if uid not in self.channels:
+                self.channels[uid] = ProgressChannel(
+                    events=deque(maxlen=self.buffer_size)
+                )
+
+    def publish(self, uid: str, event: dict):
+        with self.lock:
+            channel = self.channels.get(uid)
+            if channel is None:
+                return
+            event = {"id": channel.next_id, **event}
+            channel.next_id += 1
+            channel.events.append(event)
+            for subscriber in channel.subscribers:
+                subscriber.put(event)
+
+    def close(self, uid: str):
+        with self.lock:
+            channel = self.channels.pop(uid, None)
+            if channel is None:
+                return
+            channel.closed = True
+            for subscriber in channel.subscribers:
+                subscriber.put(None)
+
+    def subscribe(self, uid: str, last_event_id: Optional[int] = None):
+        """
+        Returns the buffered events after last_event_id and a queue receiving the
+        live events, or None if the inference is not running in this process.
+        """
+        with self.lock:
+            channel = self.channels.get(uid)
+            if channel is None:
+                return None
+            backlog = [
+                event
+                for event in channel.events
+                if last_event_id is None or event["id"] > last_event_id
+            ]
+            subscriber = queue.Queue()
+            channel.subscribers.append(subscriber)
+            return backlog, subscriber
+
+    def unsubscribe(self, uid: str, subscriber: queue.Queue):
+        with self.lock:
+            channel = self.channels.get(uid)
+            if channel is not None and subscriber in channel.subscribers:
+                channel.subscribers.remove(subscriber)
+
+
+progress_broker = ProgressBroker(progress_event_buffer_size)
+
+
+def get_stage_eta(counters: dict):
+    """Estimates the seconds left for a stage from its completion rate so far."""
+    done = counters.get("done") or 0
+    total = counters.get("total")
+    if not total or done <= 0:
+        return None
+    elapsed = time.time() - counters["started_at"]
+    return max(0.0, (total - done) * elapsed / done)
+
+
+def format_sse_event(event: dict):
+    return f"id: {event['id']}\nevent: progress\ndata: {json.dumps(event)}\n\n"
+
+
+class ProgressRecorder:
+    """
+    Consumes the update queue of an inference and persists it in batches.
+
+    Messages are coalesced over a time window and stored as append-only
+    InferenceMessageBatch nodes, the oldest batches are dropped once the
+    inference holds more than progress_max_messages messages. Stage counters
+    are kept on the Inference node and saved once per flush.
+    """
+
+    def __init__(self, inference: Inference):
+        self.inference = inference
+        self.pending: list[str] = []
+        self.last_flush = time.monotonic()
+        self.current_stage: Optional[str] = None
+        self.progress: dict = dict(inference.progress or {})  # type: ignore
+        self.message_count = int(inference.message_count or 0)  # type: ignore
+
+    def record(self, data):
+        """Records a single queue item, either a plain string or a ProgressUpdate."""
+        message = data
+        if isinstance(data, ProgressUpdate):
+            message = data.message
+            self.update_counters(data)
+
+        if message is not None:
+            self.pending.append(str(message))
+
+        self.publish(message)
+
+        if (
+            len(self.pending) >= progress_batch_size
+            or time.monotonic() - self.last_flush >= progress_flush_interval
+        ):
+            self.flush()
+
+    def update_counters(self, update: ProgressUpdate):
+        self.current_stage = update.stage
+        counters = self.progress.setdefault(
+            update.stage, {"done": 0, "total": None, "started_at": time.time()}
+        )
+        if update.total is not None:
+            counters["total"] = (counters["total"] or 0) + update.total
+        counters["done"] += update.advance
+        counters["updated_at"] = time.time()
+
+    def publish(self, message):
+        counters = self.progress.get(self.current_stage, {})
+        progress_broker.publish(
+            str(self.inference.uid),
+            {
+                "stage": self.current_stage,
+                "message": message,
+                "done": counters.get("done"),
+                "total": counters.get("total"),
+                "eta": get_stage_eta(counters) if counters else None,
+            },
+        )
+
+    def flush(self):
+        self.last_flush = time.monotonic()
+
+        if self.pending:
+            batch = InferenceMessageBatch(
+                offset=self.message_count,
+                messages=self.pending,
+            ).save()
+            self.inference.message_batches.connect(batch)  # type: ignore
+            self.message_count += len(self.pending)
+            self.pending = []
+            self.drop_old_batches()
+
+        self.inference.progress = self.progress
+        self.inference.message_count = self.message_count
+        self.inference.save()
+
+    def drop_old_batches(self):
+        # batches are append-only, so capping only ever removes whole old batches
+        db.cypher_query(
+            """
+            MATCH (i:Inference {uid: $uid})-[:HAS_MESSAGE_BATCH]->(b:InferenceMessageBatch)
+            WHERE b.offset + size(b.messages) <= $message_count - $max_messages
+            DETACH DELETE b
+            """,
+            {
+                "uid": self.inference.uid,
+                "message_count": self.message_count,
+                "max_messages": progress_max_messages,
+            },
+        )
+
+    def consume(self, update_queue: queue.Queue):
+        """
+        Reads the queue until the end of stream marker (None) is received.
+        Reuses the channel opened when the inference was started, if any.
+        """
+        progress_broker.open(str(self.inference.uid))
+        try:
+            while True:
+                try:
+                    data = update_queue.get(timeout=progress_flush_interval)
+                except queue.Empty:
+                    if self.pending:
+                        self.flush()
+                    continue
+
+                if data is None:
+                    break
+                self.record(data)
+
+            self.flush()
+        finally:
+            progress_broker.close(str(self.inference.uid))
+
+
+def get_message_count(inference: Inference):
+    """
+    The number of persisted messages. Inferences from before the message
+    batches only have their log in the messages array.
+    """
+    message_count = int(inference.message_count or 0)  # type: ignore
+    if message_count == 0:
+        return len(inference.messages or [])  # type: ignore
+    return message_count
+
+
+def get_inference_messages(inference: Inference, offset: int, limit: int):
+    """
+    Returns a page of the persisted messages of an inference, ordered by their
+    position in the stream.
+    """
+    if not inference.message_count and inference.messages:
+        return [
+            {"position": position, "message": message}
+            for position, message in enumerate(
+                inference.messages[offset : offset + limit], start=offset  # type: ignore
+            )
+        ]
+
+    results, _ = db.cypher_query(
+        """
+        MATCH (i:Inference {uid: $uid})-[:HAS_MESSAGE_BATCH]->(b:InferenceMessageBatch)
+        WHERE b.offset + size(b.messages) > $offset AND b.offset < $offset + $limit
+        UNWIND range(0, size(b.messages) - 1) AS index
+        WITH b.offset + index AS position, b.messages[index] AS message
+        WHERE position >= $offset AND position < $offset + $limit
+        RETURN position, message
+        ORDER BY position
+        """,
+        {"uid": inference.uid, "offset": offset, "limit": limit},
+    )
+    return [{"position": position, "message": message} for position, message in results]
@@ -1,11 +1,44 @@
+from dataclasses import dataclass, field
 from threading import RLock
 from typing import Literal, Optional, TypedDict
 
 from pydantic import BaseModel, ConfigDict, Field
+from qdrant_client import models
 from queue import Queue
 from database.app_state import AppState
 from inflow.base_config import BaseConfig
 from database.models import Inference
+from outflow.change_tracker import ChangeTracker
+
+
+@dataclass(slots=True)
+class IORecord:
+    """The fields of a matched IO the exporter needs, not the whole parsed IO list entry."""
+
+    name: str
+    description: str = ""
+
+
+@dataclass(slots=True)
+class ComponentRecord:
+    """A processable component with the IOs matched to it during this inference."""
+
+    name: str
+    description: str = ""
+    purpose: str = ""
+    more_description: str = ""
+    file_id: Optional[str] = None
+    ios: list[IORecord] = field(default_factory=list)
+
+    @classmethod
+    def from_record(cls, record):
+        return cls(
+            name=record["name"],
+            description=record["description"] or "",
+            purpose=record["purpose"] or "",
+            more_description=record["more_description"] or "",
+            file_id=record["file_id"],
+        )
 
 
 class State(BaseModel):
@@ -19,10 +52,17 @@ class State(BaseModel):
     inference_base_folder: str
     update_queue: Queue
     app_state: AppState
-    all_base_config_circuits: list
-    all_self_server_circuits: list
-    all_other_server_circuits: list
+    all_base_config_circuits: frozenset[str] = frozenset()
+    all_self_server_circuits: frozenset[str] = frozenset()
+    all_other_server_circuits: frozenset[str] = frozenset()
+    # base configuration and other server circuits, never matched or exported as components
+    excluded_components: frozenset[str] = frozenset()
+    # qdrant filter for the components which are not excluded, built once per inference
+    component_filter: Optional[models.Filter] = None
     lock: RLock = Field(default_factory=RLock)
-    processable_components: dict[str, dict] = {}
+    processable_components: dict[str, ComponentRecord] = {}
     updated_components: list[str] = []
     base_configs: list[BaseConfig] = []
+    input_manifest: dict = {}
+    # set by the processor, writes the exported artifacts only when they changed
+    change_tracker: Optional[ChangeTracker] = None
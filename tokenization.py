@@ -0,0 +1,48 @@
+import re
+from functools import lru_cache
+from wordsegment import UNIGRAMS, load, segment
+
+load()
+
+# splits acronyms, camelCase / PascalCase words and digits, anything else
+# (underscores, dashes, punctuation) acts as a separator
+SPLIT_REGEX = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|\d+")
+
+
+@lru_cache(maxsize=65536)
+def segment_word(word):
+    """
+    Segments a single lowercase word, the slow wordsegment Viterbi is only run
+    for words which are not known unigrams and the result is memoized.
+    """
+    if word in UNIGRAMS:
+        return (word,)
+    return tuple(segment(word))
+
+
+@lru_cache(maxsize=16384)
+def _get_tokens(text):
+    tokens = []
+    for part in SPLIT_REGEX.findall(text):
+        if part.isdigit():
+            tokens.append(part)
+        else:
+            tokens.extend(segment_word(part.lower()))
+    return tuple(tokens)
+
+
+def get_tokens(text):
+    """
+    Splits text on separators, camelCase boundaries and numbers, and further
+    segments each word using wordsegment.
+    """
+    return list(_get_tokens(text))
+
+
+def get_tokens_batch(texts):
+    """
+    Tokenizes a list of texts, repeated texts are only tokenized once.
+    """
+    tokens = {text: _get_tokens(text) for text in dict.fromkeys(texts)}
+    return [list(tokens[text]) for text in texts]
+
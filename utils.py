@@ -1,24 +1,6 @@
 import re
-from wordsegment import load, segment
 from config import system_config
-
-load()
-
-
-def get_tokens(text):
-    """
-    Splits text first by spaces, then numbers, and further segments each substring
-    using wordsegment.
-    """
-    tokens = []
-    for part in text.split():
-        substrings = re.findall(r"\D+|\d+", part)
-        for substring in substrings:
-            if substring.isdigit():
-                tokens.append(substring)
-            else:
-                tokens.extend(segment(substring))
-    return tokens
+from tokenization import get_tokens, get_tokens_batch
 
 
 def get_clean_io_name(input_string):